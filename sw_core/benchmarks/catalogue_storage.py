@@ -0,0 +1,293 @@
+"""
+Compares the storage taken by scraped products when every batch holds full
+product rows, as SearchedProduct used to, with batches holding membership rows
+of a shared product catalogue with dictionary encoded URL prefixes.
+
+    python -m benchmarks.catalogue_storage --queries 500 --batches 2
+
+Both layouts are written to their own SQLite file from the same generated
+searches. Each shop has a catalogue of products, which queries find with a
+skew towards popular products, so the same product is found by many queries.
+Each query keeps --batches batches, with --price-changes of the prices
+changed from one to the next. Reports table and index sizes from dbstat.
+"""
+
+import argparse
+import os
+import random
+import sqlite3
+import tempfile
+
+import django
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings")
+django.setup()
+
+from shopwiz.tools.product_catalogue import identity_of, split_url
+from shopwiz.tools.scraper_factory.product_record import ProductRecord
+from .shop_markup import SAMPLE_PRODUCTS
+
+BRANDS = ["Avonmore", "Tesco", "Aldi Specially Selected", "SuperValu", "Kerrygold"]
+UNIT_TYPES = ["KG", "L", "EACH", "HUNDRED_SHEETS"]
+
+# Same columns and indexes as the SQLite tables Django creates for the models
+FLAT_SCHEMA = """
+CREATE TABLE core_searchedproduct (
+    id integer NOT NULL PRIMARY KEY AUTOINCREMENT,
+    name varchar(300) NOT NULL,
+    price decimal NOT NULL,
+    price_per_unit decimal NOT NULL,
+    unit_type varchar(50) NOT NULL,
+    unit_measurement decimal NOT NULL,
+    img_src varchar(200) NULL,
+    product_url varchar(200) NULL,
+    shop_name varchar(300) NOT NULL,
+    upload_date date NOT NULL,
+    batch_id bigint NOT NULL
+);
+CREATE INDEX core_searchedproduct_batch_id ON core_searchedproduct (batch_id);
+"""
+CATALOGUE_SCHEMA = """
+CREATE TABLE core_urlprefix (
+    id integer NOT NULL PRIMARY KEY AUTOINCREMENT,
+    prefix varchar(200) NOT NULL UNIQUE
+);
+CREATE TABLE core_product (
+    id integer NOT NULL PRIMARY KEY AUTOINCREMENT,
+    shop_name varchar(300) NOT NULL,
+    identity bigint NOT NULL,
+    name varchar(300) NOT NULL,
+    product_url_prefix_id bigint NULL,
+    product_url_path varchar(200) NOT NULL,
+    img_src_prefix_id bigint NULL,
+    img_src_path varchar(200) NOT NULL
+);
+CREATE UNIQUE INDEX unique_shop_product ON core_product (shop_name, identity);
+CREATE INDEX core_product_product_url_prefix_id
+    ON core_product (product_url_prefix_id);
+CREATE INDEX core_product_img_src_prefix_id ON core_product (img_src_prefix_id);
+CREATE TABLE core_searchedproduct (
+    id integer NOT NULL PRIMARY KEY AUTOINCREMENT,
+    price decimal NOT NULL,
+    price_per_unit decimal NOT NULL,
+    unit_type varchar(50) NOT NULL,
+    unit_measurement decimal NOT NULL,
+    upload_date date NOT NULL,
+    batch_id bigint NOT NULL,
+    product_id bigint NOT NULL
+);
+CREATE INDEX core_searchedproduct_batch_id ON core_searchedproduct (batch_id);
+CREATE INDEX core_searchedproduct_product_id ON core_searchedproduct (product_id);
+"""
+
+
+def shop_urls(shop_name, rng, index, slug):
+    sku = rng.randrange(10**12, 10**13)
+    if shop_name == "TESCO":
+        return (
+            f"https://www.tesco.ie/groceries/en-IE/products/{sku % 10**9}",
+            f"https://digitalcontent.api.tesco.com/v2/media/ghs/{sku:x}/"
+            f"{sku % 10**9}.jpeg?h=225&w=225",
+        )
+    if shop_name == "ALDI":
+        return (
+            f"https://groceries.aldi.ie/en-GB/p-{slug}/{sku}",
+            f"https://d2j6dbq0eux0bg.cloudfront.net/images/{sku}_{index}.jpg",
+        )
+    return (
+        f"https://shop.supervalu.ie/sm/delivery/rsid/5550/product/{slug}-id-{sku}",
+        f"https://cdn.mercatus.com/{sku:x}/{slug}.jpg",
+    )
+
+
+def shop_catalogue(shop_name, size, rng):
+    products = []
+    for index in range(size):
+        name, price, _, _ = rng.choice(SAMPLE_PRODUCTS)
+        name = f"{rng.choice(BRANDS)} {name} {index}"
+        product_url, img_src = shop_urls(
+            shop_name, rng, index, name.lower().replace(" ", "-")
+        )
+        products.append(
+            ProductRecord(
+                name=name,
+                price=price,
+                price_per_unit=round(price * rng.uniform(0.5, 4), 2),
+                unit_type=rng.choice(UNIT_TYPES),
+                unit_measurement=round(rng.uniform(0.1, 3), 3),
+                img_src=img_src,
+                product_url=product_url,
+                shop_name=shop_name,
+            )
+        )
+    return products
+
+
+def generate_batches(args):
+    """Batches of products per query, oldest first, as lists of records."""
+    rng = random.Random(args.seed)
+    catalogues = {
+        shop_name: shop_catalogue(shop_name, args.catalogue_size, rng)
+        for shop_name in ("TESCO", "ALDI", "SUPERVALU")
+    }
+    # Popular products are found by many queries
+    weights = [1 / (rank + 1) ** 0.8 for rank in range(args.catalogue_size)]
+    batches = []
+    for _ in range(args.queries):
+        found = {
+            shop_name: rng.choices(catalogue, weights, k=rng.randint(24, 48))
+            for shop_name, catalogue in catalogues.items()
+        }
+        for _ in range(args.batches):
+            batches.append(
+                [product for products in found.values() for product in products]
+            )
+            for products in found.values():
+                for index, product in enumerate(products):
+                    if rng.random() < args.price_changes:
+                        products[index] = ProductRecord(
+                            **{
+                                field: getattr(product, field)
+                                for field in ProductRecord.__slots__
+                            }
+                        )
+                        products[index].price = round(product.price * 1.1, 2)
+    return batches
+
+
+def write_flat(connection, batches):
+    rows = [
+        (
+            product.name,
+            product.price,
+            product.price_per_unit,
+            product.unit_type,
+            product.unit_measurement,
+            product.img_src,
+            product.product_url,
+            product.shop_name,
+            "2026-01-01",
+            batch_id,
+        )
+        for batch_id, products in enumerate(batches, 1)
+        for product in products
+    ]
+    connection.executemany(
+        "INSERT INTO core_searchedproduct (name, price, price_per_unit, unit_type, "
+        "unit_measurement, img_src, product_url, shop_name, upload_date, batch_id) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        rows,
+    )
+
+
+def write_catalogue(connection, batches):
+    prefix_ids = {}
+    product_ids = {}
+
+    def prefix_id(prefix):
+        if prefix is not None and prefix not in prefix_ids:
+            prefix_ids[prefix] = connection.execute(
+                "INSERT INTO core_urlprefix (prefix) VALUES (?)", (prefix,)
+            ).lastrowid
+        return prefix_ids.get(prefix)
+
+    rows = []
+    for batch_id, products in enumerate(batches, 1):
+        for product in products:
+            key = (product.shop_name, identity_of(product))
+            if key not in product_ids:
+                product_url_prefix, product_url_path = split_url(product.product_url)
+                img_src_prefix, img_src_path = split_url(product.img_src)
+                product_ids[key] = connection.execute(
+                    "INSERT INTO core_product (shop_name, identity, name, "
+                    "product_url_prefix_id, product_url_path, img_src_prefix_id, "
+                    "img_src_path) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        *key,
+                        product.name,
+                        prefix_id(product_url_prefix),
+                        product_url_path,
+                        prefix_id(img_src_prefix),
+                        img_src_path,
+                    ),
+                ).lastrowid
+            rows.append(
+                (
+                    product.price,
+                    product.price_per_unit,
+                    product.unit_type,
+                    product.unit_measurement,
+                    "2026-01-01",
+                    batch_id,
+                    product_ids[key],
+                )
+            )
+    connection.executemany(
+        "INSERT INTO core_searchedproduct (price, price_per_unit, unit_type, "
+        "unit_measurement, upload_date, batch_id, product_id) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?)",
+        rows,
+    )
+
+
+def measure(schema, write, batches, directory, name):
+    """Bytes per table, its indexes included, and rows per table."""
+    path = os.path.join(directory, f"{name}.sqlite3")
+    connection = sqlite3.connect(path)
+    connection.executescript(schema)
+    write(connection, batches)
+    connection.commit()
+    connection.execute("VACUUM")
+
+    table_of = dict(
+        connection.execute("SELECT name, tbl_name FROM sqlite_master").fetchall()
+    )
+    sizes = {}
+    for name, size in connection.execute(
+        "SELECT name, SUM(pgsize) FROM dbstat GROUP BY name"
+    ):
+        table = table_of.get(name, name)
+        if table.startswith("sqlite_"):
+            continue
+        sizes[table] = sizes.get(table, 0) + size
+    counts = {
+        table: connection.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+        for table in sizes
+    }
+    connection.close()
+    return sizes, counts, os.path.getsize(path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--batches", type=int, default=2, help="Kept per query")
+    parser.add_argument("--catalogue-size", type=int, default=4000, help="Per shop")
+    parser.add_argument("--price-changes", type=float, default=0.1)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    batches = generate_batches(args)
+    with tempfile.TemporaryDirectory() as directory:
+        results = {
+            "flat": measure(FLAT_SCHEMA, write_flat, batches, directory, "flat"),
+            "catalogue": measure(
+                CATALOGUE_SCHEMA, write_catalogue, batches, directory, "catalogue"
+            ),
+        }
+
+    for layout, (sizes, counts, _) in results.items():
+        print(f"{layout}:")
+        for table, size in sorted(sizes.items()):
+            print(f"  {table}: {counts[table]} rows, {size / 2**20:.2f} MiB")
+    flat_size = results["flat"][2]
+    catalogue_size = results["catalogue"][2]
+    print(
+        f"{len(batches)} batches, {flat_size / 2**20:.2f} MiB flat, "
+        f"{catalogue_size / 2**20:.2f} MiB with the catalogue "
+        f"({1 - catalogue_size / flat_size:.0%} smaller)"
+    )
+
+
+if __name__ == "__main__":
+    main()
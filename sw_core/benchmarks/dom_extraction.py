@@ -0,0 +1,94 @@
+"""
+Compares the time taken to pull product fields out of a results page with one
+round trip per field (how _parse_page used to work) against a single
+page.evaluate call.
+
+    python -m benchmarks.dom_extraction --items 48 --repeat 20
+"""
+
+import argparse
+import os
+import statistics
+import time
+
+import django
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings")
+django.setup()
+
+from playwright.sync_api import sync_playwright, Page
+
+from shopwiz.tools.scraper_factory.scraper_factory import ScraperFactory
+from shopwiz.tools.scraper_factory.shop_scrapers.shop_scraper import (
+    EXTRACT_PRODUCTS_JS,
+)
+from .shop_markup import render_results_page, sample_products
+
+
+def extract_per_element(page: Page, product_selectors):
+    records = []
+    for tile in page.query_selector_all(product_selectors["tile"]):
+        record = {}
+        for name, (selector, attribute) in product_selectors["fields"].items():
+            element = tile.query_selector(selector)
+            if not element:
+                record[name] = None
+            elif attribute:
+                record[name] = element.get_attribute(attribute)
+            else:
+                record[name] = element.text_content()
+        records.append(record)
+    return records
+
+
+def extract_single_round_trip(page: Page, product_selectors):
+    return page.evaluate(EXTRACT_PRODUCTS_JS, product_selectors)
+
+
+def time_extraction(extract, page, product_selectors, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        records = extract(page, product_selectors)
+        timings.append(time.perf_counter() - start)
+    return records, timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--items", type=int, default=48)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    factory = ScraperFactory()
+    products = sample_products(args.items)
+
+    with sync_playwright() as p:
+        browser = p.chromium.launch()
+        page = browser.new_page()
+
+        for scraper_name in factory.scrapers:
+            scraper = factory.create(scraper_name)
+            page.set_content(render_results_page(scraper.shop_name, "milk", products))
+
+            before, before_timings = time_extraction(
+                extract_per_element, page, scraper.product_selectors, args.repeat
+            )
+            after, after_timings = time_extraction(
+                extract_single_round_trip, page, scraper.product_selectors, args.repeat
+            )
+            assert before == after, f"{scraper_name} extraction results differ"
+
+            before_ms = statistics.median(before_timings) * 1000
+            after_ms = statistics.median(after_timings) * 1000
+            print(
+                f"{scraper.shop_name}: {len(after)} tiles, "
+                f"per element {before_ms:.1f}ms, single round trip {after_ms:.1f}ms "
+                f"({before_ms / after_ms:.1f}x)"
+            )
+
+        browser.close()
+
+
+if __name__ == "__main__":
+    main()
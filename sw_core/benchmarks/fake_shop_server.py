@@ -0,0 +1,145 @@
+"""
+Local stand-in for the Tesco, Aldi and SuperValu search pages, so the scraping
+pipeline can be load tested offline. Every shop is served under its own path
+prefix, point the scrapers at it through SCRAPER_BASE_URL_OVERRIDES:
+
+    python -m benchmarks.fake_shop_server --port 8765 --pages 3 --latency-ms 150
+
+    SCRAPER_BASE_URL_OVERRIDES = {
+        "TESCO": "http://127.0.0.1:8765/tesco",
+        "ALDI": "http://127.0.0.1:8765/aldi",
+        "SUPERVALU": "http://127.0.0.1:8765/supervalu",
+    }
+"""
+
+import argparse
+import random
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+
+from .shop_markup import render_results_page, sample_products
+
+# Path prefix, query parameter and page size of every shop
+SHOPS = {
+    "tesco": ("TESCO", "query", 48),
+    "aldi": ("ALDI", "keywords", 36),
+    "supervalu": ("SUPERVALU", "q", 30),
+}
+
+
+class FakeShopConfig:
+    def __init__(
+        self,
+        pages: int = 1,
+        items_per_page: int = None,
+        latency_ms: float = 0,
+        jitter_ms: float = 0,
+        error_rate: float = 0,
+        seed: int = 0,
+    ):
+        self.pages = pages
+        # Defaults to the page size of each shop
+        self.items_per_page = items_per_page
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.rng = random.Random(seed)
+        self.rng_lock = threading.Lock()
+
+    def delay(self):
+        with self.rng_lock:
+            jitter = self.rng.uniform(-self.jitter_ms, self.jitter_ms)
+        time.sleep(max(self.latency_ms + jitter, 0) / 1000)
+
+    def should_fail(self):
+        with self.rng_lock:
+            return self.rng.random() < self.error_rate
+
+
+def make_handler(config: FakeShopConfig):
+    class FakeShopHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            url = urlsplit(self.path)
+            prefix = url.path.strip("/").split("/")[0]
+            if prefix not in SHOPS:
+                self.send_error(404)
+                return
+
+            shop_name, query_param, shop_page_size = SHOPS[prefix]
+            params = parse_qs(url.query)
+            query = params.get(query_param, [""])[0]
+            page_number = int(params.get("page", ["1"])[0])
+
+            config.delay()
+            if config.should_fail():
+                self.send_error(503)
+                return
+
+            items_per_page = config.items_per_page or shop_page_size
+            products = []
+            if page_number <= config.pages:
+                # Same products for the same page of a query on every request
+                page_seed = zlib.crc32(f"{shop_name}:{query}:{page_number}".encode())
+                products = sample_products(items_per_page, seed=page_seed)
+
+            body = render_results_page(
+                shop_name, query, products, config.pages * items_per_page
+            ).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return FakeShopHandler
+
+
+def start_server(config: FakeShopConfig, host="127.0.0.1", port=0):
+    """Serve in a background thread. Returns the server and its base url."""
+    server = ThreadingHTTPServer((host, port), make_handler(config))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+def base_url_overrides(base_url: str):
+    return {
+        shop_name: f"{base_url}/{prefix}" for prefix, (shop_name, _, _) in SHOPS.items()
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--pages", type=int, default=1)
+    parser.add_argument("--items", type=int, default=None)
+    parser.add_argument("--latency-ms", type=float, default=0)
+    parser.add_argument("--jitter-ms", type=float, default=0)
+    parser.add_argument("--error-rate", type=float, default=0)
+    args = parser.parse_args()
+
+    config = FakeShopConfig(
+        pages=args.pages,
+        items_per_page=args.items,
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        error_rate=args.error_rate,
+    )
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(config))
+    print(f"Serving fake shops on http://{args.host}:{args.port}")
+    for shop_name, base_url in base_url_overrides(
+        f"http://{args.host}:{args.port}"
+    ).items():
+        print(f"  {shop_name}: {base_url}")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,191 @@
+"""
+Runs every scraper's parsing and unit normalisation over the search result
+pages saved in benchmarks/html_corpus, without a browser, and compares the
+products against the golden output saved next to each page.
+
+    python -m benchmarks.parser_corpus --repeat 50
+    python -m benchmarks.parser_corpus --update-golden
+    python -m benchmarks.parser_corpus --save-baseline
+    python -m benchmarks.parser_corpus --capture TESCO "greek yogurt"
+
+Pages are read the way the http strategy reads them (extract_records runs the
+same selectors as EXTRACT_PRODUCTS_JS does in the browser), then built into
+products by the scraper's _build_product. Reports products/sec and the memory
+allocated while parsing each page. With a saved baseline, pages that got more
+than --tolerance slower fail the run as well. Exits with 1 on any failure.
+
+Review the diff of the golden files before committing an --update-golden.
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import re
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+import django
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings")
+django.setup()
+
+from selectolax.parser import HTMLParser
+
+from shopwiz.tools.scraper_factory.http_fetcher import extract_records, get_client
+from shopwiz.tools.scraper_factory.product_record import ProductRecord
+from shopwiz.tools.scraper_factory.scraper_factory import ScraperFactory
+
+CORPUS_DIR = Path(__file__).parent / "html_corpus"
+BASELINE_PATH = CORPUS_DIR / "baseline.json"
+
+
+def parse_page(scraper, query: str, html: str):
+    """Returns the products of a page and the number of pages of the query."""
+    if scraper.http_strategy:
+        records, raw_count = scraper.http_strategy.parse(
+            200, html, scraper.product_selectors
+        )
+    else:
+        records, raw_count = (
+            extract_records(HTMLParser(html), scraper.product_selectors),
+            None,
+        )
+
+    number_of_pages = None
+    if records and raw_count is not None:
+        number_of_pages = scraper._calculate_number_of_pages(raw_count)
+
+    products = []
+    for raw in records:
+        product = scraper._build_product(query, raw)
+        if product:
+            products.append(product)
+    return products, number_of_pages
+
+
+def to_golden(products, number_of_pages):
+    return {
+        "number_of_pages": number_of_pages,
+        "products": [
+            {field: getattr(product, field) for field in ProductRecord.__slots__}
+            for product in products
+        ],
+    }
+
+
+def measure(scraper, query, html, repeat):
+    # Invalid tiles are reported with print, once per parse
+    with contextlib.redirect_stdout(io.StringIO()):
+        tracemalloc.start()
+        parse_page(scraper, query, html)
+        _, peak_bytes = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        start = time.perf_counter()
+        for _ in range(repeat):
+            products, number_of_pages = parse_page(scraper, query, html)
+        elapsed = time.perf_counter() - start
+
+    return products, number_of_pages, elapsed / repeat, peak_bytes
+
+
+def create_scrapers():
+    factory = ScraperFactory()
+    scrapers = (factory.create(scraper_name) for scraper_name in factory.scrapers)
+    return {scraper.shop_name: scraper for scraper in scrapers}
+
+
+def capture(scraper, query):
+    """Save the live search page of a query into the corpus."""
+    url = scraper._build_url(query, True, 1)
+    response = get_client().get(url, headers={"User-Agent": scraper.user_agent})
+    response.raise_for_status()
+
+    page_path = CORPUS_DIR / scraper.shop_name.lower() / f"{slugify(query)}.html"
+    page_path.parent.mkdir(parents=True, exist_ok=True)
+    page_path.write_text(response.text, encoding="utf-8")
+    print(f"Saved {url} to {page_path}, run --update-golden next")
+
+
+def slugify(query: str) -> str:
+    return re.sub(r"[^a-z0-9]+", "_", query.lower()).strip("_")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--shop", help="Only run the pages of this shop")
+    parser.add_argument("--update-golden", action="store_true")
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.25,
+        help="Allowed slowdown against the baseline, as a fraction",
+    )
+    parser.add_argument("--capture", nargs=2, metavar=("SHOP", "QUERY"))
+    args = parser.parse_args()
+
+    scrapers = create_scrapers()
+    if args.capture:
+        capture(scrapers[args.capture[0].upper()], args.capture[1])
+        return
+
+    baseline = {}
+    if BASELINE_PATH.exists() and not args.save_baseline:
+        baseline = json.loads(BASELINE_PATH.read_text())
+
+    timings = {}
+    failures = []
+    for shop_name, scraper in sorted(scrapers.items()):
+        if args.shop and shop_name != args.shop.upper():
+            continue
+
+        for page_path in sorted((CORPUS_DIR / shop_name.lower()).glob("*.html")):
+            page_id = f"{shop_name.lower()}/{page_path.stem}"
+            query = page_path.stem.replace("_", " ")
+            html = page_path.read_text(encoding="utf-8")
+
+            products, number_of_pages, seconds, peak_bytes = measure(
+                scraper, query, html, args.repeat
+            )
+            timings[page_id] = seconds
+
+            golden = to_golden(products, number_of_pages)
+            golden_path = page_path.with_suffix(".json")
+            status = "ok"
+            if args.update_golden or not golden_path.exists():
+                golden_path.write_text(json.dumps(golden, indent=2) + "\n")
+                status = "golden saved"
+            elif json.loads(golden_path.read_text()) != golden:
+                failures.append(f"{page_id}: products differ from {golden_path.name}")
+                status = "OUTPUT CHANGED"
+
+            baseline_seconds = baseline.get(page_id)
+            if baseline_seconds and seconds > baseline_seconds * (1 + args.tolerance):
+                slowdown = seconds / baseline_seconds
+                failures.append(f"{page_id}: {slowdown:.2f}x slower than baseline")
+                status = "SLOWER"
+
+            rate = len(products) / seconds if seconds else 0
+            print(
+                f"{page_id}: {len(products)} products in {seconds * 1000:.2f}ms "
+                f"({rate:,.0f}/s), peak {peak_bytes / 1024:.0f} KiB allocated, "
+                f"{status}"
+            )
+
+    if args.save_baseline:
+        BASELINE_PATH.write_text(json.dumps(timings, indent=2, sort_keys=True) + "\n")
+        print(f"Saved baseline of {len(timings)} pages to {BASELINE_PATH}")
+
+    for failure in failures:
+        print(f"FAILED {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""
+Drives the whole scrape pipeline against benchmarks/fake_shop_server.py:
+taking the lease and enqueueing, scraping every shop, saving products into the
+batch and publishing the redis notifications. Needs a local redis, but no
+access to the real shops.
+
+    python -m benchmarks.pipeline --concurrency 1 2 4 --scrapes 8 --pages 2
+
+Tasks run eagerly inside this process by default, so the reported memory is
+that of this process and its browsers. With --workers the scrapes are queued
+for running celery workers, which must use the same SCRAPER_BASE_URL_OVERRIDES
+as printed on start, and only latency and throughput are reported.
+"""
+
+import argparse
+import os
+import resource
+import statistics
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import django
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings")
+django.setup()
+
+from config import settings
+from config.celery import app
+from shopwiz.apps.core.models import BatchUpload, ScrapeRun
+from shopwiz.tools.concurrent_tasks import update_products as pipeline
+from shopwiz.tools.scraper_factory.browser_pool import descendant_rss_mb
+from .fake_shop_server import FakeShopConfig, start_server, base_url_overrides
+
+
+def percentile(sorted_values, pct):
+    index = min(
+        int(round((len(sorted_values) - 1) * pct / 100)), len(sorted_values) - 1
+    )
+    return sorted_values[index]
+
+
+def wait_for_runs(queries, timeout):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        runs = list(ScrapeRun.objects.filter(query__in=queries))
+        if len(runs) == len(queries) and all(run.finished_at for run in runs):
+            return runs
+        time.sleep(0.5)
+    raise TimeoutError(f"Scrapes didn't finish within {timeout}s")
+
+
+def run_level(concurrency, scrapes, run_id, use_workers, timeout):
+    queries = [f"bench {run_id} {concurrency} {index}" for index in range(scrapes)]
+
+    start = time.time()
+    if use_workers:
+        for query in queries:
+            pipeline.begin_updating_products(query)
+    else:
+        with ThreadPoolExecutor(max_workers=concurrency) as searches:
+            list(searches.map(pipeline.begin_updating_products, queries))
+    runs = wait_for_runs(queries, timeout)
+    elapsed = time.time() - start
+
+    latencies = sorted(
+        (run.finished_at - run.started_at).total_seconds() for run in runs
+    )
+    products = sum(
+        BatchUpload.objects.get(id=run.batch_id).products.count() for run in runs
+    )
+    return {
+        "scrapes_per_minute": len(runs) / elapsed * 60,
+        "p50": statistics.median(latencies),
+        "p95": percentile(latencies, 95),
+        "products": products,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--scrapes", type=int, default=8)
+    parser.add_argument("--pages", type=int, default=1)
+    parser.add_argument("--items", type=int, default=None)
+    parser.add_argument("--latency-ms", type=float, default=100)
+    parser.add_argument("--jitter-ms", type=float, default=50)
+    parser.add_argument("--error-rate", type=float, default=0)
+    parser.add_argument("--workers", action="store_true")
+    parser.add_argument("--timeout", type=float, default=600)
+    parser.add_argument("--keep", action="store_true", help="Keep benchmark batches")
+    args = parser.parse_args()
+
+    server, base_url = start_server(
+        FakeShopConfig(
+            pages=args.pages,
+            items_per_page=args.items,
+            latency_ms=args.latency_ms,
+            jitter_ms=args.jitter_ms,
+            error_rate=args.error_rate,
+        )
+    )
+    # Updated in place, scrapers hold on to the same dict
+    settings.SCRAPER_BASE_URL_OVERRIDES.update(base_url_overrides(base_url))
+    print(f"SCRAPER_BASE_URL_OVERRIDES = {settings.SCRAPER_BASE_URL_OVERRIDES}")
+
+    app.conf.task_always_eager = not args.workers
+    run_id = uuid.uuid4().hex[:8]
+
+    try:
+        for concurrency in args.concurrency:
+            result = run_level(
+                concurrency, args.scrapes, run_id, args.workers, args.timeout
+            )
+            memory = ""
+            if not args.workers:
+                # ru_maxrss is in KiB on Linux
+                own_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+                memory = (
+                    f", peak rss {own_mb:.0f}MB + browsers {descendant_rss_mb():.0f}MB"
+                )
+            per_minute = result["scrapes_per_minute"]
+            print(
+                f"concurrency {concurrency}: {per_minute:.1f} scrapes/min, "
+                f"p50 {result['p50']:.2f}s, p95 {result['p95']:.2f}s, "
+                f"{result['products']} products{memory}"
+            )
+    finally:
+        if not args.keep:
+            BatchUpload.objects.filter(query__startswith=f"bench {run_id}").delete()
+            ScrapeRun.objects.filter(query__startswith=f"bench {run_id}").delete()
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
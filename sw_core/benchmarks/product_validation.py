@@ -0,0 +1,100 @@
+"""
+Compares the cost of validating scraped products with SearchedProductSerialiser
+against ProductRecord, per 10k products.
+
+    python -m benchmarks.product_validation --products 10000 --repeat 5
+"""
+
+import argparse
+import os
+import statistics
+import time
+
+import django
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings")
+django.setup()
+
+from shopwiz.apps.core.models import ShopName, UnitType
+from shopwiz.apps.core.serializers import SearchedProductSerialiser
+from shopwiz.tools.scraper_factory.product_record import (
+    ProductRecord,
+    InvalidProductError,
+)
+from .shop_markup import sample_products
+
+
+def scraped_products(count: int):
+    """Products as _build_product hands them over, with every 50th invalid."""
+    products = []
+    for index, sample in enumerate(sample_products(count)):
+        products.append(
+            {
+                "query": "milk",
+                "name": sample["name"],
+                "price": 0 if index % 50 == 0 else sample["price"],
+                "price_per_unit": 1.15,
+                "unit_type": UnitType.L,
+                "unit_measurment": 0,
+                "unit_measurement": 1.991,
+                "img_src": f"https://example.com/{sample['slug']}.jpg",
+                "product_url": f"https://example.com/{sample['slug']}",
+                "shop_name": ShopName.TESCO,
+            }
+        )
+    return products
+
+
+def validate_with_serialiser(products):
+    valid = []
+    for product in products:
+        serializer = SearchedProductSerialiser(data=product)
+        if serializer.is_valid():
+            valid.append(serializer.validated_data)
+    return valid
+
+
+def validate_with_record(products):
+    valid = []
+    for product in products:
+        try:
+            valid.append(ProductRecord.from_dict(product))
+        except InvalidProductError:
+            pass
+    return valid
+
+
+def time_validation(validate, products, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        valid = validate(products)
+        timings.append(time.perf_counter() - start)
+    return valid, statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--products", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    products = scraped_products(args.products)
+    scale = 10000 / len(products)
+
+    before, before_time = time_validation(
+        validate_with_serialiser, products, args.repeat
+    )
+    after, after_time = time_validation(validate_with_record, products, args.repeat)
+    assert len(before) == len(after), "Validators disagree on valid products"
+
+    print(
+        f"{len(after)} of {len(products)} valid, per 10k products: "
+        f"serialiser {before_time * scale * 1000:.1f}ms, "
+        f"ProductRecord {after_time * scale * 1000:.1f}ms "
+        f"({before_time / after_time:.1f}x)"
+    )
+
+
+if __name__ == "__main__":
+    main()
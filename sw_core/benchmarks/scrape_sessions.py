@@ -0,0 +1,159 @@
+"""
+Throughput of one scraping worker under a burst of distinct queries, with
+every scrape of a shop in a task of its own against queued scrapes of a shop
+taken on together in one browser session, see scrape_sessions. Runs against
+benchmarks/fake_shop_server.py and needs a local redis.
+
+    python -m benchmarks.scrape_sessions --queries 12 --session-queries 1 4
+
+The whole burst is queued before the worker starts, in the order searches
+dispatch their shop tasks, and the tasks are then run one at a time as a
+worker process with a concurrency of 1 would. Reports queries scraped per
+minute, browser launches and browser context borrows per launch per cap.
+Sessions only run on the async engine.
+"""
+
+import argparse
+import os
+import time
+import uuid
+
+import django
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings")
+django.setup()
+
+from config import settings
+from config.celery import app
+from shopwiz.apps.core.models import BatchUpload
+from shopwiz.tools import scrape_sessions
+from shopwiz.tools.concurrent_tasks import update_products as pipeline
+from shopwiz.tools.scraper_factory.browser_pool import async_browser_pool, browser_pool
+from .fake_shop_server import FakeShopConfig, start_server, base_url_overrides
+
+
+def close_browsers():
+    # Every cap starts from a cold browser, as a freshly started worker would
+    if settings.SCRAPER_ENGINE == "async":
+        pipeline.stream_executor.submit(
+            pipeline.run_async, async_browser_pool.close()
+        ).result()
+    else:
+        pipeline.stream_executor.submit(browser_pool.close).result()
+
+
+def pool_stats():
+    if settings.SCRAPER_ENGINE == "async":
+        return async_browser_pool.stats()
+    return browser_pool.stats()
+
+
+def run_burst(session_queries, queries, run_id):
+    # Read by claim and enqueue on every call
+    scrape_sessions.SCRAPER_SESSION_MAX_QUERIES = session_queries
+    close_browsers()
+    stats_before = pool_stats()
+
+    tasks = []
+    for index in range(queries):
+        query = f"bench {run_id} {session_queries} {index}"
+        batch = BatchUpload.objects.create(query=query, is_complete=False)
+        job = {
+            "batch_id": batch.id,
+            "query": query,
+            "is_relevant_only": True,
+            "lease_token": None,
+            "search_text": None,
+        }
+        for scraper_name in settings.ENABLED_SCRAPERS:
+            scrape_sessions.enqueue(pipeline.shop_name_of(scraper_name), job, 0)
+            tasks.append((batch.id, query, True, scraper_name))
+
+    start = time.time()
+    summaries = [pipeline.scrape_shop.apply(args=task).get() for task in tasks]
+    elapsed = time.time() - start
+
+    stats_after = pool_stats()
+    launches = stats_after["launches"] - stats_before["launches"]
+    borrows = (stats_after["hits"] + stats_after["misses"]) - (
+        stats_before["hits"] + stats_before["misses"]
+    )
+    return {
+        "elapsed": elapsed,
+        "queries_per_minute": queries / elapsed * 60,
+        "launches": launches,
+        "borrows_per_launch": borrows / launches if launches else 0,
+        "failed": sum(1 for summary in summaries if summary["error"]),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--queries", type=int, default=12)
+    parser.add_argument("--session-queries", type=int, nargs="+", default=[1, 4])
+    parser.add_argument("--pages", type=int, default=1)
+    parser.add_argument("--latency-ms", type=float, default=300)
+    parser.add_argument("--jitter-ms", type=float, default=100)
+    parser.add_argument(
+        "--browser-only",
+        action="store_true",
+        help="Scrape every shop in the browser, even those served over http",
+    )
+    parser.add_argument(
+        "--unthrottled",
+        action="store_true",
+        help="Lift the shared request rate of the shops",
+    )
+    parser.add_argument("--keep", action="store_true", help="Keep benchmark batches")
+    args = parser.parse_args()
+
+    server, base_url = start_server(
+        FakeShopConfig(
+            pages=args.pages, latency_ms=args.latency_ms, jitter_ms=args.jitter_ms
+        )
+    )
+    # Updated in place, scrapers and the governor hold on to the same dicts
+    settings.SCRAPER_BASE_URL_OVERRIDES.update(base_url_overrides(base_url))
+    if args.unthrottled:
+        settings.SCRAPER_SHOP_REQUESTS_PER_SECOND.clear()
+    if not args.browser_only:
+        # The fake shop renders its results on the server, unlike the real ones
+        settings.SCRAPER_HTTP_SHOPS.extend(
+            scraper_class().shop_name
+            for scraper_class in pipeline.factory.scrapers.values()
+            if scraper_class.http_strategy
+        )
+
+    app.conf.task_always_eager = True
+    # Waiting tasks are retried without holding on to a worker, eager ones wait
+    # in place instead, so they check for their results often
+    pipeline.SCRAPER_SESSION_POLL_SECONDS = 0.05
+    run_id = uuid.uuid4().hex[:8]
+
+    try:
+        results = {}
+        for session_queries in args.session_queries:
+            result = run_burst(session_queries, args.queries, run_id)
+            results[session_queries] = result
+            print(
+                f"up to {session_queries} queries per session: "
+                f"{result['queries_per_minute']:.1f} queries/min "
+                f"in {result['elapsed']:.1f}s, {result['launches']} browser launches, "
+                f"{result['borrows_per_launch']:.1f} context borrows per launch, "
+                f"{result['failed']} failed shop scrapes"
+            )
+
+        baseline = results[args.session_queries[0]]["queries_per_minute"]
+        for session_queries, result in results.items():
+            print(
+                f"{session_queries} per session: "
+                f"{result['queries_per_minute'] / baseline:.2f}x throughput"
+            )
+    finally:
+        if not args.keep:
+            BatchUpload.objects.filter(query__startswith=f"bench {run_id}").delete()
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
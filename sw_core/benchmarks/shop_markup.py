@@ -0,0 +1,136 @@
+"""
+Search result pages rendered in the markup each shop serves, reduced to the
+elements the scrapers read. Used to benchmark scrapers without the real sites.
+"""
+
+import random
+from html import escape
+
+SAMPLE_PRODUCTS = [
+    # (name, price, price per unit text for Tesco/SuperValu, Aldi unit text)
+    ("Avonmore Fresh Milk 2L", 2.29, "1.15/litre", "1.15 per L"),
+    ("Low Fat Milk 1L", 1.15, "1.15/litre", "1.15 per L"),
+    ("Irish Cheddar Cheese 200g", 2.79, "13.95/kg", "13.95 per KG"),
+    ("Free Range Eggs 12 Pack", 3.99, "0.33/each", "0.33 per EACH"),
+    ("Sliced Pan 800g", 1.95, "2.44/kg", "2.44 per KG"),
+    ("Sparkling Water 6 x 330ml", 3.50, "1.77/litre", "1.77 per L"),
+    ("Red Wine 75cl", 9.99, "13.32/litre", "13.32 per L"),
+    ("Kitchen Roll 3 Pack", 3.25, "0.45/100sht", "0.45 per 100 SHT"),
+    ("Chicken Fillets 500g", 5.49, "10.98/kg", "10.98 per KG"),
+    ("Bananas Loose", 0.25, "1.99/kg", "1.99 per KG"),
+    ("Greek Style Yogurt 500g", 2.49, "0.50/100g", "0.50 per 100 G"),
+    ("Orange Juice 1L", 2.15, "2.15/litre", "2.15 per L"),
+]
+
+
+def sample_products(count: int, seed: int = 0):
+    rng = random.Random(seed)
+    products = []
+    for index in range(count):
+        name, price, unit_text, aldi_unit_text = rng.choice(SAMPLE_PRODUCTS)
+        products.append(
+            {
+                "name": f"{name} #{index}",
+                "price": price,
+                "unit_text": unit_text,
+                "aldi_unit_text": aldi_unit_text,
+                "slug": f"product-{seed}-{index}",
+            }
+        )
+    return products
+
+
+def _tesco_page(query, products, total_count):
+    tiles = "".join(
+        f"""
+        <li class="product-list--list-item">
+          <div class="product-tile">
+            <a href="/groceries/en-IE/products/{p['slug']}">
+              <div class="product-image__container">
+                <img srcset="https://digitalcontent.api.tesco.com/v2/media/{p['slug']}.jpeg?h=225&amp;w=225 225w, https://digitalcontent.api.tesco.com/v2/media/{p['slug']}.jpeg?h=540&amp;w=540 540w">
+              </div>
+            </a>
+            <div class="product-details--wrapper">
+              <h3><span>{escape(p['name'])}</span></h3>
+              <form>
+                <p>&euro;{p['price']:.2f}</p>
+                <p>&euro;{p['unit_text']}</p>
+              </form>
+            </div>
+          </div>
+        </li>"""
+        for p in products
+    )
+    listing = (
+        f"""
+      <div class="pagination__items-displayed">
+        Showing <strong>1 to {len(products)}</strong> of <strong>{total_count} items</strong>
+      </div>
+      <div class="product-list-container"><ul>{tiles}</ul></div>"""
+        if products
+        else '<p data-auto="empty-section--message">No products</p>'
+    )
+    return f"""<!DOCTYPE html>
+<html><body>
+  <h1 class="heading query">Showing results for "{escape(query)}"</h1>
+  {listing}
+</body></html>"""
+
+
+def _aldi_page(query, products, total_count):
+    tiles = "".join(
+        f"""
+        <div data-qa="search-results">
+          <a href="/en-GB/{p['slug']}/0000{index}">
+            <img src="https://d2j6dbq0eux0bg.cloudfront.net/images/{p['slug']}.jpg">
+          </a>
+          <div data-qa="search-product-title">{escape(p['name'])}</div>
+          <div class="product-tile-price">
+            <div class="h4"><span>&euro;{p['price']:.2f}</span></div>
+            <div data-qa="product-price"><span>&euro;{p['aldi_unit_text']}</span></div>
+          </div>
+        </div>"""
+        for index, p in enumerate(products)
+    )
+    return f"""<!DOCTYPE html>
+<html><body>
+  <div id="vueSearchSummary" data-totalcount="{total_count if products else 0}"></div>
+  <div id="vueSearchResults">{tiles}</div>
+</body></html>"""
+
+
+def _supervalu_page(query, products, total_count):
+    tiles = "".join(
+        f"""
+        <div class="ColListing--1fk1zey">
+          <a href="https://shop.supervalu.ie/sm/delivery/rsid/5550/product/{p['slug']}">
+            <div class="ProductCardImageWrapper--ak7z2i">
+              <div><img src="https://cdn.mercatus.com/{p['slug']}.jpg"></div>
+            </div>
+            <span class="ProductCardTitle--1ln1u3g"><div>{escape(p['name'])}</div></span>
+          </a>
+          <span class="ProductCardPrice--xq2y7a">&euro;{p['price']:.2f}</span>
+          <span class="ProductCardPriceInfo--1vvb8df">&euro;{p['unit_text']}</span>
+        </div>"""
+        for p in products
+    )
+    if not products:
+        return """<!DOCTYPE html>
+<html><body><h1 class="NoResultsTitle--3t0t5e">No results</h1></body></html>"""
+    return f"""<!DOCTYPE html>
+<html><body>
+  <h4 class="Subtitle--14zsmfa">{total_count} results for "{escape(query)}"</h4>
+  <div class="Listing--uo4pcu">{tiles}</div>
+</body></html>"""
+
+
+RENDERERS = {
+    "TESCO": _tesco_page,
+    "ALDI": _aldi_page,
+    "SUPERVALU": _supervalu_page,
+}
+
+
+def render_results_page(shop_name: str, query: str, products, total_count=None):
+    total_count = len(products) if total_count is None else total_count
+    return RENDERERS[shop_name](query, products, total_count)
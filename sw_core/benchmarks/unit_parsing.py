@@ -0,0 +1,172 @@
+"""
+Compares the compiled and memoized unit parsing in scraper util against the
+regex-per-unit implementation it replaced, for throughput and for accuracy on
+unit strings the way each shop prints them.
+
+    python -m benchmarks.unit_parsing --repeat 2000
+"""
+
+import argparse
+import os
+import re
+import time
+
+import django
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings")
+django.setup()
+
+from shopwiz.apps.core.models import ShopName, UnitType
+from shopwiz.tools.scraper_factory.shop_scrapers import util as scraper_util
+
+# (shop, price text, price per unit text, expected unit type, expected price
+# per standardised unit)
+CORPUS = [
+    (ShopName.TESCO, "€2.29", "€1.15/litre", UnitType.L, 1.15),
+    (ShopName.TESCO, "€2.79", "€13.95/kg", UnitType.KG, 13.95),
+    (ShopName.TESCO, "€3.99", "€0.33/each", UnitType.EACH, 0.33),
+    (ShopName.TESCO, "€2.49", "€0.50/100g", UnitType.KG, 5.00),
+    (ShopName.TESCO, "€1.20", "€0.24/100ml", UnitType.L, 2.40),
+    (ShopName.TESCO, "€9.99", "€13.32/75cl", UnitType.L, 17.76),
+    (ShopName.TESCO, "€24.00", "€34.29/70cl", UnitType.L, 48.99),
+    (ShopName.TESCO, "€3.25", "€0.45/100sht", UnitType.HUNDRED_SHEETS, 0.45),
+    (ShopName.TESCO, "€12.00", "€4.00/m2", UnitType.M2, 4.00),
+    (ShopName.TESCO, "€3.50", "€3.50/6x330ml", UnitType.L, 1.77),
+    (ShopName.TESCO, "€6.00", "€6.00/4 pack", UnitType.EACH, 1.50),
+    (ShopName.TESCO, "€4.50", "€1.50/metre", UnitType.M, 1.50),
+    (ShopName.ALDI, "€2.29", "€1.15 per L", UnitType.L, 1.15),
+    (ShopName.ALDI, "€2.79", "€13.95 per KG", UnitType.KG, 13.95),
+    (ShopName.ALDI, "€3.99", "€0.33 per EACH", UnitType.EACH, 0.33),
+    (ShopName.ALDI, "€2.49", "€0.50 per 100 G", UnitType.KG, 5.00),
+    (ShopName.ALDI, "€1.20", "€0.24 per 100 ML", UnitType.L, 2.40),
+    (ShopName.ALDI, "€3.25", "€0.45 per 100 SHT", UnitType.HUNDRED_SHEETS, 0.45),
+    (ShopName.ALDI, "€4.99", "€4.99 per 1-1.5 KG", UnitType.KG, 3.99),
+    (ShopName.ALDI, "€5.49", "€5.49 per 4 X 125 G", UnitType.KG, 10.98),
+    (ShopName.SUPERVALU, "€2.29", "€1.15/litre", UnitType.L, 1.15),
+    (ShopName.SUPERVALU, "€2.79", "€13.95/kg", UnitType.KG, 13.95),
+    (ShopName.SUPERVALU, "€3.99", "€0.33/each", UnitType.EACH, 0.33),
+    (ShopName.SUPERVALU, "€1.95", "€2.44/kg", UnitType.KG, 2.44),
+    (ShopName.SUPERVALU, "€2.49", "€0.50/100g", UnitType.KG, 5.00),
+    (ShopName.SUPERVALU, "€3.50", "€1.77/l", UnitType.L, 1.77),
+    (ShopName.SUPERVALU, "€5.99", "€5.99/6 pk", UnitType.EACH, 1.00),
+]
+
+# The implementation scraper util used before, kept for comparison
+LEGACY_CONVERSION_METRICS = {
+    "kg": (UnitType.KG, 1),
+    "100g": (UnitType.KG, 10),
+    "g": (UnitType.KG, 1000),
+    "ml": (UnitType.L, 1000),
+    "100ml": (UnitType.L, 10),
+    "l": (UnitType.L, 1),
+    "litre": (UnitType.L, 1),
+    "70cl": (UnitType.L, 1 / 0.7),
+    "75cl": (UnitType.L, 1 / 0.75),
+    "metre": (UnitType.M, 1),
+    "each": (UnitType.EACH, 1),
+    "100sht": (UnitType.HUNDRED_SHEETS, 1),
+    "100sheets": (UnitType.HUNDRED_SHEETS, 1),
+    "m2": (UnitType.M2, 1),
+    "m²": (UnitType.M2, 1),
+}
+
+
+def legacy_get_standard_unit_type_and_conversion(s: str):
+    s = s.lower().replace(" ", "")
+
+    for specific_unit, (
+        unit_type,
+        conversion_metric,
+    ) in LEGACY_CONVERSION_METRICS.items():
+        if re.search(r"\b" + specific_unit + r"\b", s):
+            return unit_type, conversion_metric
+
+    return UnitType.EACH, 1
+
+
+def legacy_get_unit_data(parts_list, price):
+    if parts_list and parts_list[0]:
+        cleaned_price_per_unit_str = re.sub(r"[^\d.]", "", parts_list[0])
+        cleaned_price_per_unit_float = (
+            round(float(cleaned_price_per_unit_str), 2)
+            if cleaned_price_per_unit_str
+            else 0
+        )
+        if (
+            len(parts_list) > 1
+            and parts_list[1]
+            and cleaned_price_per_unit_float > 0
+            and price > 0
+        ):
+            standardised_unit_type, conversion_metric = (
+                legacy_get_standard_unit_type_and_conversion(parts_list[1])
+            )
+            price_per_unit = round(cleaned_price_per_unit_float * conversion_metric, 2)
+            unit_measurment = round(price / price_per_unit, 3)
+            return standardised_unit_type, price_per_unit, unit_measurment
+    return UnitType.EACH, price, 1.0
+
+
+def split_unit_text(shop_name, price_per_unit_text):
+    # Same split the scrapers use
+    separator = "per" if shop_name == ShopName.ALDI else "/"
+    return price_per_unit_text.strip().split(separator)
+
+
+def prepared_corpus():
+    return [
+        (
+            split_unit_text(shop_name, unit_text),
+            float(re.search(r"(\d+\.\d+)", price_text).group(1)),
+            unit_type,
+            price_per_unit,
+        )
+        for shop_name, price_text, unit_text, unit_type, price_per_unit in CORPUS
+    ]
+
+
+def accuracy(get_unit_data, corpus):
+    correct = 0
+    for parts, price, expected_unit_type, expected_price_per_unit in corpus:
+        unit_type, price_per_unit, _ = get_unit_data(parts, price)
+        if (
+            unit_type == expected_unit_type
+            and abs(price_per_unit - expected_price_per_unit) <= 0.01
+        ):
+            correct += 1
+    return correct / len(corpus)
+
+
+def throughput(get_unit_data, corpus, repeat, clear_cache=None):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        if clear_cache:
+            clear_cache()
+        for parts, price, _, _ in corpus:
+            get_unit_data(parts, price)
+    return repeat * len(corpus) / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--repeat", type=int, default=2000)
+    args = parser.parse_args()
+
+    corpus = prepared_corpus()
+    clear_cache = scraper_util.get_standard_unit_type_and_conversion.cache_clear
+
+    results = [
+        ("legacy", legacy_get_unit_data, None),
+        ("compiled, cold cache", scraper_util.get_unit_data, clear_cache),
+        ("compiled, warm cache", scraper_util.get_unit_data, None),
+    ]
+    for label, get_unit_data, clear in results:
+        per_second = throughput(get_unit_data, corpus, args.repeat, clear)
+        print(
+            f"{label}: {per_second:,.0f} unit strings/s, "
+            f"accuracy {accuracy(get_unit_data, corpus):.0%} of {len(corpus)}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -243,18 +243,115 @@ CACHES = {
 }
 
 # Scraping config
-CACHE_SHOP_SCRAPE_EXECUTION_SECONDS = 50
+# Only one scrape of a query runs at a time. Its lease is taken to outlast its
+# shop tasks waiting on the queue for up to SCRAPE_LEASE_QUEUE_SECONDS and then
+# running into their hard time limit. Running scrapes keep it from expiring
+# sooner than SCRAPE_LEASE_TTL_SECONDS
+SCRAPE_LEASE_TTL_SECONDS = 60
+SCRAPE_LEASE_QUEUE_SECONDS = 300
 ENABLED_SCRAPERS = ["TescoScraper", "AldiScraper", "SuperValuScraper"]
 RESULTS_EXPIRY_DAYS = 10
+# Phrases searched for interchangeably, as {canonical: [variants]}. Queries
+# that canonicalize to the same key share their batches and scrapes
+QUERY_SYNONYMS_PATH = BASE_DIR / "shopwiz" / "tools" / "query_synonyms.json"
+# First time searches of up to this many words are answered from batches of
+# queries made of some of their words, while they are scraped
+PROVISIONAL_MAX_QUERY_WORDS = 6
+# Pooled browsers are relaunched after this many scrapes or once chromium
+# processes of a worker use more memory than the limit
+BROWSER_POOL_MAX_USES = 50
+BROWSER_POOL_MAX_MEMORY_MB = 1024
+# Memory is read from every process of the host, so at most this often
+BROWSER_POOL_MEMORY_CHECK_SECONDS = 10
+# "async" runs every shop and page on one event loop, "sync" falls back to
+# a thread and browser per shop
+SCRAPER_ENGINE = "async"
+# Maximum number of tabs open at once across all shops with the async engine
+SCRAPER_ASYNC_CONCURRENCY = 6
+# Shops scraped over plain http before a browser is used, only worth it for
+# shops whose server rendered pages list their products. Tesco and Aldi render
+# their results in the browser
+SCRAPER_HTTP_SHOPS = []
+# Timeout for scrapers fetching server rendered pages without a browser
+SCRAPER_HTTP_TIMEOUT_SECONDS = 10
+# Tabs crawling the remaining pages of a full scrape at once, per shop
+SCRAPER_PAGE_CONCURRENCY = {"TESCO": 4, "ALDI": 4, "SUPERVALU": 3}
+# Base url per shop name replacing the real site, used by benchmarks to point
+# scrapers at benchmarks/fake_shop_server.py
+SCRAPER_BASE_URL_OVERRIDES = {}
+# Every shop is scraped in a task of its own, which is interrupted after its
+# soft time limit and killed once the grace period is over as well
+SCRAPER_SHOP_SOFT_TIME_LIMIT_SECONDS = {"TESCO": 90, "ALDI": 90, "SUPERVALU": 120}
+SCRAPER_SHOP_TIME_LIMIT_GRACE_SECONDS = 15
+# Requests per second sent to each shop across all workers, in bursts of up to
+# SCRAPER_SHOP_BURST, see request_governor. Shops without a rate aren't limited
+SCRAPER_SHOP_REQUESTS_PER_SECOND = {"TESCO": 3, "ALDI": 3, "SUPERVALU": 2}
+SCRAPER_SHOP_BURST = {"TESCO": 8, "ALDI": 8, "SUPERVALU": 6}
+# Requests queue this long at most for their turn, the scrape of the shop fails
+# once a request would have to wait longer
+SCRAPER_RATE_LIMIT_MAX_WAIT_SECONDS = 20
+# Queued queries of a shop that one scrape task takes on at once, scraping them
+# in the same browser with a context per query. 1 scrapes each in its own task,
+# as does the sync engine, and no more than SCRAPER_ASYNC_CONCURRENCY are taken
+SCRAPER_SESSION_MAX_QUERIES = 4
+# Tasks whose query another task took on check this often for its results,
+# without holding on to a worker in between
+SCRAPER_SESSION_POLL_SECONDS = 2
+# A shop that never returned results for a query is tried again on the next
+# search once this long has passed since it failed
+SCRAPER_FAILED_SHOP_RETRY_MINUTES = 30
+# Popular queries are scraped again before their results expire, within a
+# budget of scrapes per hour spread evenly over every prewarm run
+PREWARM_INTERVAL_MINUTES = 10
+PREWARM_SCRAPES_PER_HOUR = 30
+# Searches counted towards demand, and the least a query needs to be prewarmed
+PREWARM_DEMAND_WINDOW_DAYS = 7
+PREWARM_MIN_SEARCHES = 3
+# Results are prewarmed once they are this close to going stale, or already are
+PREWARM_LOOKAHEAD_DAYS = 1
+
+# Batches are deleted once they are older than RETENTION_KEEP_DAYS and not among
+# the RETENTION_KEEP_BATCHES newest of their query
+RETENTION_INTERVAL_HOURS = 24
+RETENTION_KEEP_BATCHES = 2
+RETENTION_KEEP_DAYS = 30
+# Rows deleted per statement, with a pause in between so that no delete holds
+# its locks for long
+RETENTION_CHUNK_SIZE = 1000
+RETENTION_CHUNK_PAUSE_SECONDS = 0.1
+
+# Opt-in on PostgreSQL with `manage.py product_partitions --convert`, which turns
+# the SearchedProduct table into one partitioned by the upload date of its batch.
+# Partitions are created ahead of time and dropped whole once expired
+PRODUCT_PARTITION_INTERVAL = "month"  # or "week"
+PRODUCT_PARTITIONS_AHEAD = 2
+PRODUCT_PARTITION_KEEP_DAYS = 90
 
 
 # CELERY config
 CELERY_BROKER_URL = "redis://127.0.0.1:6379"
 CELERY_ACCEPT_CONTENT = ["json"]
 CELERY_TASK_SERIALIZER = "json"
+# Needed by the chord collecting per shop scrape tasks
+CELERY_RESULT_BACKEND = "redis://127.0.0.1:6379"
+CELERY_RESULT_EXPIRES = timedelta(hours=1)
 
 CELERY_BROKER_CONNECTION_RETRY_ON_STARTUP = True
 
+# Browser heavy scrapes and light maintenance tasks are consumed by separate
+# workers, so scraping can run at a low concurrency, e.g.
+#   celery -A config.celery worker -Q scraping -c 2
+#   celery -A config.celery worker -Q maintenance -c 8
+CELERY_TASK_DEFAULT_QUEUE = "maintenance"
+CELERY_TASK_ROUTES = {
+    "shopwiz.tools.concurrent_tasks.update_products.*": {"queue": "scraping"},
+}
+# Redis keeps a list per priority step (0, 3, 6 and 9) and serves 0 first,
+# see the SCRAPE_PRIORITY_* levels in update_products
+CELERY_BROKER_TRANSPORT_OPTIONS = {"queue_order_strategy": "priority"}
+# Prefetched messages would be run ahead of higher priority ones arriving later
+CELERY_WORKER_PREFETCH_MULTIPLIER = 1
+
 CELERY_BEAT_SCHEDULE = {
     "delete_unverified_emails_every_day": {
         "task": "shopwiz.apps.users.tasks.delete_unverified_emails",
@@ -264,6 +361,18 @@ CELERY_BEAT_SCHEDULE = {
         "task": "shopwiz.apps.users.tasks.reset_password_request_counts",
         "schedule": timedelta(days=1),
     },
+    "prewarm_popular_queries": {
+        "task": "shopwiz.apps.core.tasks.prewarm_popular_queries",
+        "schedule": timedelta(minutes=PREWARM_INTERVAL_MINUTES),
+    },
+    "purge_old_batches": {
+        "task": "shopwiz.apps.core.tasks.purge_old_batches",
+        "schedule": timedelta(hours=RETENTION_INTERVAL_HOURS),
+    },
+    "maintain_product_partitions": {
+        "task": "shopwiz.apps.core.tasks.maintain_product_partitions",
+        "schedule": timedelta(days=1),
+    },
 }
 
 AUTHENTICATION_BACKENDS = (
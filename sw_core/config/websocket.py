@@ -1,6 +1,7 @@
 import asyncio
 import json
 import re
+from urllib.parse import unquote
 
 import aioredis
 import django
@@ -8,20 +9,27 @@ import websockets
 
 django.setup()
 
+from shopwiz.tools.query_canonicalizer import canonicalize
 
-# This dictionary will store connections based on queries
+# This dictionary will store connections based on canonical queries
 CONNECTIONS = {}
+# The query each connection was opened with, events are sent back with it
+CLIENT_QUERIES = {}
 
 
 async def handler(websocket, path):
     try:
         # Parse the query parameter from the connection path
-        parsed_query = path.strip("/")  # Assuming path comes as '/somequery'
+        # Assuming path comes as '/somequery', with spaces percent-encoded
+        parsed_query = unquote(path.strip("/"))
         cleaned_query = re.sub(r"\s+", " ", parsed_query.strip()).lower()
+        # Scrapes are announced for the canonical query shared by equivalents
+        canonical_query = canonicalize(cleaned_query)
         # Register the connection with the query
-        if cleaned_query not in CONNECTIONS:
-            CONNECTIONS[cleaned_query] = []
-        CONNECTIONS[cleaned_query].append(websocket)
+        if canonical_query not in CONNECTIONS:
+            CONNECTIONS[canonical_query] = []
+        CONNECTIONS[canonical_query].append(websocket)
+        CLIENT_QUERIES[websocket] = cleaned_query
 
         # Wait for the connection to close
         await asyncio.wait_for(websocket.wait_closed(), timeout=30)
@@ -30,10 +38,11 @@ async def handler(websocket, path):
         await websocket.close(reason="Connection time limit reached.")
     finally:
         # Remove the connection after it is closed
-        if cleaned_query in CONNECTIONS:
-            CONNECTIONS[cleaned_query].remove(websocket)
-            if not CONNECTIONS[cleaned_query]:
-                del CONNECTIONS[cleaned_query]
+        CLIENT_QUERIES.pop(websocket, None)
+        if canonical_query in CONNECTIONS:
+            CONNECTIONS[canonical_query].remove(websocket)
+            if not CONNECTIONS[canonical_query]:
+                del CONNECTIONS[canonical_query]
         print(f"WEBSOCKET Connection closed for query: {cleaned_query}")
 
 
@@ -47,14 +56,20 @@ async def process_events():
             continue
         payload = json.loads(message["data"].decode())
         query = payload["query"].lower()
-        status = payload["status"]
 
         # Broadcast event to all clients connected with the specific query
         if query in CONNECTIONS:
             recipients = CONNECTIONS[query]
             print("RECEPIRENTS: ", recipients)
-            message_to_send = json.dumps({"query": query, "status": status})
-            websockets.broadcast(recipients, message_to_send)
+            # Every client gets the event for the query it searched for
+            recipients_per_query = {}
+            for recipient in recipients:
+                client_query = CLIENT_QUERIES.get(recipient, query)
+                recipients_per_query.setdefault(client_query, []).append(recipient)
+            for client_query, client_recipients in recipients_per_query.items():
+                # Progress events also carry the shop and its saved product count
+                message_to_send = json.dumps({**payload, "query": client_query})
+                websockets.broadcast(client_recipients, message_to_send)
 
 
 async def handle_or_exit(websocket, path):
@@ -0,0 +1,60 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from shopwiz.apps.core.models import BatchUpload
+from shopwiz.tools.query_canonicalizer import canonicalize, clean_query
+
+
+class Command(BaseCommand):
+    help = (
+        "Report how many distinct scraped queries would remain once equivalent "
+        "queries share a canonical query"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--days", type=float, default=30, help="Batches uploaded since then"
+        )
+        parser.add_argument(
+            "--file", help="Read queries from a log with one query per line instead"
+        )
+        parser.add_argument(
+            "--top", type=int, default=10, help="Number of merged groups to show"
+        )
+
+    def handle(self, *args, **options):
+        if options["file"]:
+            with open(options["file"], encoding="utf-8") as query_log:
+                queries = [clean_query(line) for line in query_log if line.strip()]
+        else:
+            since = timezone.now().date() - timedelta(days=options["days"])
+            queries = list(
+                BatchUpload.objects.filter(upload_date__gte=since).values_list(
+                    "query", flat=True
+                )
+            )
+
+        if not queries:
+            self.stdout.write("No queries to report on")
+            return
+
+        groups = {}
+        for query in set(queries):
+            groups.setdefault(canonicalize(query), set()).add(query)
+
+        distinct_queries = len(set(queries))
+        reduction = 1 - len(groups) / distinct_queries
+        self.stdout.write(
+            f"{len(queries)} scrapes of {distinct_queries} distinct queries, "
+            f"{len(groups)} canonical queries ({reduction:.1%} fewer)"
+        )
+
+        merged_groups = sorted(
+            (group for group in groups.items() if len(group[1]) > 1),
+            key=lambda group: len(group[1]),
+            reverse=True,
+        )
+        for canonical_query, group in merged_groups[: options["top"]]:
+            self.stdout.write(f"  {canonical_query}: {', '.join(sorted(group))}")
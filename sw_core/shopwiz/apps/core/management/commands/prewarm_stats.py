@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+
+from shopwiz.tools import prewarm
+
+
+class Command(BaseCommand):
+    help = "Report how many searches were served fresh thanks to prewarming"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--top", type=int, default=10, help="Number of ranked queries to show"
+        )
+
+    def handle(self, *args, **options):
+        hit_rate = prewarm.get_hit_rate()
+        searches = int(hit_rate.get("searches", 0))
+        self.stdout.write(
+            f"{searches} searches, {hit_rate['fresh_rate']:.1%} served fresh, "
+            f"{hit_rate['prewarmed_rate']:.1%} served fresh by a prewarm"
+        )
+        self.stdout.write(
+            f"Prewarm scrapes: {int(hit_rate.get('scrapes', 0))} started, "
+            f"{int(hit_rate.get('skipped_fresh', 0))} already fresh, "
+            f"{int(hit_rate.get('skipped_running', 0))} already running, "
+            f"{int(hit_rate.get('skipped_budget', 0))} over budget"
+        )
+
+        ranked_queries = prewarm.rank_queries()[: options["top"]]
+        if ranked_queries:
+            self.stdout.write("Next up:")
+        for query, score in ranked_queries:
+            self.stdout.write(f"  {query}: {score:.1f}")
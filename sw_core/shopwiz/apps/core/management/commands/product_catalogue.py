@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand
+
+from shopwiz.apps.core.models import SearchedProduct
+from shopwiz.tools import product_catalogue
+
+
+class Command(BaseCommand):
+    help = (
+        "Fill the product catalogue from products saved before it, while "
+        f"{product_catalogue.TABLE} still has their name and URL columns"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--backfill",
+            action="store_true",
+            help="Link products without a catalogue product to one made from them",
+        )
+
+    def handle(self, *args, **options):
+        if not product_catalogue.has_legacy_columns():
+            self.stdout.write(
+                f"{product_catalogue.TABLE} has no name and URL columns left, "
+                "every product is in the catalogue"
+            )
+            return
+
+        if options["backfill"]:
+            linked = product_catalogue.backfill_products()
+            self.stdout.write(f"Linked {linked} products to the catalogue")
+
+        unlinked = SearchedProduct.objects.filter(product__isnull=True).count()
+        if unlinked:
+            self.stdout.write(
+                f"{unlinked} products aren't in the catalogue yet, add them with "
+                "--backfill before removing the old fields of SearchedProduct"
+            )
+        else:
+            self.stdout.write(
+                "Every product is in the catalogue, the old fields of "
+                "SearchedProduct can go"
+            )
@@ -0,0 +1,53 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from shopwiz.tools import product_partitions
+
+
+class Command(BaseCommand):
+    help = (
+        "Create upcoming SearchedProduct partitions and drop expired ones, once "
+        "the table was partitioned with --convert (PostgreSQL only)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--backfill",
+            action="store_true",
+            help="Copy batch upload dates onto products saved before they had one",
+        )
+        parser.add_argument(
+            "--convert",
+            action="store_true",
+            help="Partition the products table by upload date, locks it meanwhile",
+        )
+
+    def handle(self, *args, **options):
+        if options["backfill"]:
+            updated = product_partitions.backfill_upload_dates()
+            self.stdout.write(f"Backfilled the upload date of {updated} products")
+
+        if not product_partitions.is_supported():
+            self.stdout.write(
+                f"Partitioning needs PostgreSQL, {connection.vendor} keeps "
+                f"{product_partitions.TABLE} as a single table"
+            )
+            return
+
+        if options["convert"]:
+            if product_partitions.is_partitioned():
+                raise CommandError(f"{product_partitions.TABLE} is partitioned already")
+            product_partitions.convert()
+            self.stdout.write(f"Partitioned {product_partitions.TABLE}")
+        elif not product_partitions.is_partitioned():
+            self.stdout.write(
+                f"{product_partitions.TABLE} isn't partitioned, opt in with --convert"
+            )
+            return
+
+        created, dropped = product_partitions.maintain()
+        self.stdout.write(
+            f"Created {len(created)} partitions, dropped {len(dropped)} expired ones"
+        )
+        for name, start, end in product_partitions.list_partitions():
+            self.stdout.write(f"  {name}: {start} to {end}")
@@ -0,0 +1,68 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from shopwiz.apps.core.models import ScrapeShopRun
+
+PHASES = [
+    "exec_time",
+    "fetch_time",
+    "goto_time",
+    "wait_time",
+    "throttle_time",
+    "parse_time",
+]
+
+
+def percentile(sorted_values, pct):
+    """Linear interpolation between the closest ranks, like numpy's default."""
+    if not sorted_values:
+        return 0
+    position = (len(sorted_values) - 1) * pct / 100
+    lower = int(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (
+        position - lower
+    )
+
+
+class Command(BaseCommand):
+    help = "Report p50/p95 scrape timings per shop and phase over a time window"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--hours", type=float, default=24, help="Size of the time window"
+        )
+        parser.add_argument("--shop", help="Only report this shop, e.g. TESCO")
+
+    def handle(self, *args, **options):
+        since = timezone.now() - timedelta(hours=options["hours"])
+        shop_runs = ScrapeShopRun.objects.filter(created_at__gte=since)
+        if options["shop"]:
+            shop_runs = shop_runs.filter(shop_name=options["shop"].upper())
+
+        runs_per_shop = {}
+        for shop_run in shop_runs.values(
+            "shop_name", "error_class", "pages_parsed", "bytes_received", *PHASES
+        ):
+            runs_per_shop.setdefault(shop_run["shop_name"], []).append(shop_run)
+
+        if not runs_per_shop:
+            self.stdout.write(f"No scrapes in the last {options['hours']:g} hours")
+            return
+
+        for shop_name, runs in sorted(runs_per_shop.items()):
+            errors = sum(1 for run in runs if run["error_class"])
+            pages = sum(run["pages_parsed"] for run in runs) / len(runs)
+            kib = sum(run["bytes_received"] for run in runs) / len(runs) / 1024
+            self.stdout.write(
+                f"{shop_name}: {len(runs)} scrapes, {errors} failed, "
+                f"{pages:.1f} pages and {kib:.0f} KiB per scrape"
+            )
+            for phase in PHASES:
+                values = sorted(run[phase] for run in runs)
+                self.stdout.write(
+                    f"  {phase:<11} p50 {percentile(values, 50):7.2f}s"
+                    f"  p95 {percentile(values, 95):7.2f}s"
+                )
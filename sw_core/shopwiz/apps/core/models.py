@@ -1,4 +1,4 @@
-from datetime import timedelta
+from datetime import date, timedelta
 from collections import OrderedDict
 from decimal import Decimal, ROUND_HALF_UP
 
@@ -19,7 +19,19 @@ from django.db.models import (
     Count,
 )
 
-from config.settings import RESULTS_EXPIRY_DAYS
+from config.settings import (
+    RESULTS_EXPIRY_DAYS,
+    SCRAPER_FAILED_SHOP_RETRY_MINUTES,
+    SCRAPER_SHOP_SOFT_TIME_LIMIT_SECONDS,
+    SCRAPER_SHOP_TIME_LIMIT_GRACE_SECONDS,
+)
+
+# A batch still incomplete once every shop would have been killed at its hard
+# time limit lost its worker, and is never completed
+STALLED_BATCH_SECONDS = (
+    max(SCRAPER_SHOP_SOFT_TIME_LIMIT_SECONDS.values())
+    + SCRAPER_SHOP_TIME_LIMIT_GRACE_SECONDS
+)
 
 
 class Customer(models.Model):
@@ -54,7 +66,23 @@ class UnitType(models.TextChoices):
 
 
 class SearchedProductQuerySet(models.QuerySet):
-    pass
+    def in_batch(self, batch):
+        # product_partitions imports the models
+        from shopwiz.tools import product_partitions
+
+        products = self.filter(batch=batch)
+        # Only a partitioned table has the upload date of every row in line with
+        # its batch, see product_partitions.convert, and is pruned by it
+        if product_partitions.is_partitioned():
+            products = products.filter(upload_date=batch.upload_date)
+        return products
+
+    def with_catalogue(self):
+        # Everything serializers read from the catalogue, products saved before
+        # it are left out until product_catalogue --backfill links them
+        return self.filter(product__isnull=False).select_related(
+            "product__product_url_prefix", "product__img_src_prefix"
+        )
 
 
 class SearchedProductManager(models.Manager):
@@ -62,16 +90,41 @@ class SearchedProductManager(models.Manager):
         return SearchedProductQuerySet(self.model)
 
     def get_most_recent_and_check_freshness(self, query):
-        most_recent_batch = BatchUpload.objects.filter(query=query).first()
+        most_recent_batch = BatchUpload.objects.filter(query=query).servable().first()
         if most_recent_batch:
             # Retrieve all products that were created on maximum date
-            products = self.filter(batch=most_recent_batch)
+            products = self.get_queryset().in_batch(most_recent_batch).with_catalogue()
             # Check if an update is needed (i.e., if the max date is within the expiry date)
             filter_created_date = timezone.now().date() - timedelta(
                 days=RESULTS_EXPIRY_DAYS
             )
             update_date = most_recent_batch.upload_date
             update_needed = update_date <= filter_created_date
+
+            # Shops carried forward into the batch are as old as their last
+            # good scrape, failing shops are only retried every so often
+            shop_freshness = list(QueryShopFreshness.objects.filter(query=query))
+            if shop_freshness:
+                scrape_dates = [
+                    freshness.scraped_at.date()
+                    for freshness in shop_freshness
+                    if freshness.scraped_at
+                ]
+                update_date = min(scrape_dates, default=update_date)
+                retry_failed_before = timezone.now() - timedelta(
+                    minutes=SCRAPER_FAILED_SHOP_RETRY_MINUTES
+                )
+                update_needed = any(
+                    (
+                        freshness.scraped_at is None
+                        or freshness.scraped_at.date() <= filter_created_date
+                    )
+                    and not (
+                        freshness.failed_at
+                        and freshness.failed_at > retry_failed_before
+                    )
+                    for freshness in shop_freshness
+                )
         else:
             products = self.none()
             update_date = None
@@ -174,19 +227,38 @@ class SearchedProductManager(models.Manager):
 
 
 class SearchedProduct(models.Model):
+    """
+    A product as found in a batch, with its price at the time. What doesn't
+    change from one batch to the next is kept once in the product catalogue,
+    see with_catalogue.
+    """
+
     objects = SearchedProductManager()
 
     batch = models.ForeignKey(
         "BatchUpload", on_delete=models.CASCADE, related_name="products"
     )
-    name = models.CharField(max_length=300)
+    # Null only for products saved before the catalogue, until the
+    # product_catalogue command links them
+    product = models.ForeignKey(
+        "Product", on_delete=models.CASCADE, related_name="memberships", null=True
+    )
     price = models.DecimalField(max_digits=10, decimal_places=2)
     price_per_unit = models.DecimalField(max_digits=10, decimal_places=2)
     unit_type = models.CharField(max_length=50, choices=UnitType.choices)
     unit_measurement = models.DecimalField(max_digits=10, decimal_places=3)
+    # Upload date of the batch, the partition key when the table is partitioned,
+    # see product_partitions
+    upload_date = models.DateField(default=date.today)
+    # Kept from before the catalogue for the product_catalogue command to link
+    # old products by, new products leave them empty. Remove them once it
+    # reports every product in the catalogue
+    name = models.CharField(max_length=300, null=True, blank=True)
     img_src = models.URLField(null=True)
     product_url = models.URLField(null=True)
-    shop_name = models.CharField(max_length=300, choices=ShopName.choices)
+    shop_name = models.CharField(
+        max_length=300, choices=ShopName.choices, null=True, blank=True
+    )
 
     class Meta:
         constraints = [
@@ -200,30 +272,175 @@ class SearchedProduct(models.Model):
             models.CheckConstraint(
                 check=models.Q(unit_measurement__gt=0), name="unit_measurement_gt_0"
             ),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.product.name}: {self.price} for {self.unit_measurement} {self.unit_type} ({self.price_per_unit}) {self.product.name}"
+
+
+class UrlPrefix(models.Model):
+    """Start of product and image URLs, shared by the products of a shop."""
+
+    prefix = models.CharField(max_length=200, unique=True)
+
+    def __str__(self) -> str:
+        return self.prefix
+
+
+class Product(models.Model):
+    """A product of a shop, whichever searches it was found by."""
+
+    shop_name = models.CharField(max_length=300, choices=ShopName.choices)
+    # Hash of the product URL, or of the name for products without one, see
+    # product_catalogue
+    identity = models.BigIntegerField()
+    name = models.CharField(max_length=300)
+    # URLs are split after their last slash, the prefix is stored once
+    product_url_prefix = models.ForeignKey(
+        UrlPrefix, on_delete=models.PROTECT, null=True, related_name="+"
+    )
+    product_url_path = models.CharField(max_length=200, blank=True)
+    img_src_prefix = models.ForeignKey(
+        UrlPrefix, on_delete=models.PROTECT, null=True, related_name="+"
+    )
+    img_src_path = models.CharField(max_length=200, blank=True)
+    # Last day a scrape found the product, products no batch has are only
+    # purged once they weren't found for a while, see retention
+    last_seen = models.DateField(default=date.today)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["shop_name", "identity"], name="unique_shop_product"
+            ),
             models.CheckConstraint(check=~models.Q(name=""), name="name_not_empty"),
             models.CheckConstraint(
                 check=~models.Q(shop_name=""), name="shop_name_not_empty"
             ),
         ]
 
+    @property
+    def product_url(self):
+        if self.product_url_prefix is None:
+            return None
+        return self.product_url_prefix.prefix + self.product_url_path
+
+    @property
+    def img_src(self):
+        if self.img_src_prefix is None:
+            return None
+        return self.img_src_prefix.prefix + self.img_src_path
+
     def __str__(self) -> str:
-        return f"{self.name}: {self.price} for {self.unit_measurement} {self.unit_type} ({self.price_per_unit}) {self.name}"
+        return f"{self.name} at {self.shop_name}"
+
+
+class BatchUploadQuerySet(models.QuerySet):
+    def servable(self):
+        # Batches still being scraped count as soon as one shop was saved, until
+        # they stalled and the previous complete batch is served again
+        stalled_before = timezone.now() - timedelta(seconds=STALLED_BATCH_SECONDS)
+        return self.filter(
+            models.Q(is_complete=True)
+            | models.Q(
+                products__isnull=False, scrape_run__started_at__gt=stalled_before
+            )
+        ).distinct()
 
 
 class BatchUpload(models.Model):
+    objects = BatchUploadQuerySet.as_manager()
+
     query = models.CharField(max_length=60)
     upload_date = models.DateField(auto_now_add=True)
+    # False while shops are still being scraped into this batch
+    is_complete = models.BooleanField(default=True)
 
     class Meta:
         constraints = [
             models.CheckConstraint(check=~models.Q(query=""), name="query_not_empty"),
         ]
-        ordering = ["-upload_date"]  # Orders by upload_date in descending order
+        # Orders by upload_date in descending order, newest batch of a day first
+        ordering = ["-upload_date", "-id"]
 
     def __str__(self) -> str:
         return f"Batch Upload of {self.query} on {self.upload_date}"
 
 
+class ScrapeRun(models.Model):
+    # Kept when the batch is deleted, telemetry outlives the results
+    batch = models.OneToOneField(
+        BatchUpload, on_delete=models.SET_NULL, null=True, related_name="scrape_run"
+    )
+    query = models.CharField(max_length=60)
+    # What the shops were searched for, the query is its canonical form
+    search_text = models.CharField(max_length=60, blank=True)
+    is_relevant_only = models.BooleanField()
+    # Queue priority the scrape was started with, see update_products
+    priority = models.PositiveSmallIntegerField(null=True)
+    started_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True)
+
+    class Meta:
+        ordering = ["-started_at"]
+
+    def __str__(self) -> str:
+        return f"Scrape of {self.query} at {self.started_at}"
+
+
+class ScrapeShopRun(models.Model):
+    scrape_run = models.ForeignKey(
+        ScrapeRun, on_delete=models.CASCADE, related_name="shop_runs"
+    )
+    shop_name = models.CharField(max_length=300, choices=ShopName.choices)
+    strategy = models.CharField(max_length=20)
+    created_at = models.DateTimeField(auto_now_add=True)
+    # Seconds spent per phase, summed over every page of the shop
+    exec_time = models.FloatField(default=0)
+    fetch_time = models.FloatField(default=0)
+    goto_time = models.FloatField(default=0)
+    wait_time = models.FloatField(default=0)
+    # Waiting for turns of the shared request rate of the shop
+    throttle_time = models.FloatField(default=0)
+    parse_time = models.FloatField(default=0)
+    pages_parsed = models.PositiveIntegerField(default=0)
+    product_count = models.PositiveIntegerField(default=0)
+    # Products new or changed, the others were copied from the previous batch
+    rows_written = models.PositiveIntegerField(default=0)
+    bytes_received = models.BigIntegerField(default=0)
+    blocked_requests = models.PositiveIntegerField(default=0)
+    error_class = models.CharField(max_length=100, blank=True)
+
+    class Meta:
+        indexes = [models.Index(fields=["shop_name", "created_at"])]
+
+    def __str__(self) -> str:
+        return f"{self.shop_name} scrape of {self.scrape_run.query} in {self.exec_time:.1f}s"
+
+
+class QueryShopFreshness(models.Model):
+    """When a shop was last scraped for a query, and whether that worked."""
+
+    query = models.CharField(max_length=60)
+    shop_name = models.CharField(max_length=300, choices=ShopName.choices)
+    # Batch holding the latest good products of the shop, carried forward into
+    # newer batches as long as they are fresh or the shop keeps failing
+    batch = models.ForeignKey(BatchUpload, on_delete=models.SET_NULL, null=True)
+    # Last successful scrape, the products in batch are this old
+    scraped_at = models.DateTimeField(null=True)
+    failed_at = models.DateTimeField(null=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["query", "shop_name"], name="unique_query_shop_freshness"
+            ),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.shop_name} results of {self.query} from {self.scraped_at}"
+
+
 class BasketProduct(models.Model):
     name = models.CharField(max_length=100)
     price = models.DecimalField(max_digits=100, decimal_places=2)
@@ -133,17 +133,27 @@ class SearchedProductParamsSerialiser(serializers.Serializer):
 
 @ts_interface()
 class SearchedProductSerialiser(serializers.Serializer):
-    name = serializers.CharField(required=True, allow_blank=False)
+    name = serializers.CharField(
+        source="product.name", required=True, allow_blank=False
+    )
     price = serializers.FloatField(required=True)
     price_per_unit = serializers.FloatField(required=True)
     unit_type = serializers.ChoiceField(
         required=True, allow_blank=False, choices=UnitType.choices
     )
     unit_measurement = serializers.FloatField(required=True)
-    img_src = serializers.CharField(required=True, allow_null=True)
-    product_url = serializers.CharField(required=True, allow_null=True)
+    # Read from the catalogue, the response has the same fields as before it
+    img_src = serializers.CharField(
+        source="product.img_src", required=True, allow_null=True
+    )
+    product_url = serializers.CharField(
+        source="product.product_url", required=True, allow_null=True
+    )
     shop_name = serializers.ChoiceField(
-        required=True, allow_blank=False, choices=ShopName.choices
+        source="product.shop_name",
+        required=True,
+        allow_blank=False,
+        choices=ShopName.choices,
     )
 
     def validate_price(self, value):
@@ -233,6 +243,8 @@ class SearchedProductMetadataSerialiser(serializers.Serializer):
     query = serializers.CharField(max_length=60, required=True)
     is_full_metadata = serializers.BooleanField(required=True)
     is_update_needed = serializers.BooleanField(required=True)
+    # Results of a broader query, shown until the query itself is scraped
+    is_provisional = serializers.BooleanField(default=False)
     update_date = serializers.DateField(allow_null=True)
     page = serializers.IntegerField()
     total_pages = serializers.IntegerField()
@@ -0,0 +1,78 @@
+import logging
+import math
+
+from celery import shared_task
+
+from config.settings import PREWARM_INTERVAL_MINUTES, PREWARM_SCRAPES_PER_HOUR
+from shopwiz.tools import prewarm, product_partitions, retention, scrape_metrics
+from shopwiz.tools.concurrent_tasks.update_products import (
+    begin_updating_products,
+    SCRAPE_PRIORITY_PREWARM,
+)
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task
+def prewarm_popular_queries():
+    # Share of the hourly budget for one run, spread out over the run interval
+    scrapes_per_run = math.ceil(
+        PREWARM_SCRAPES_PER_HOUR * PREWARM_INTERVAL_MINUTES / 60
+    )
+    ranked_queries = prewarm.rank_queries()[:scrapes_per_run]
+    if ranked_queries:
+        spacing = PREWARM_INTERVAL_MINUTES * 60 / len(ranked_queries)
+        for index, (query, _) in enumerate(ranked_queries):
+            prewarm_query.apply_async((query,), countdown=index * spacing)
+
+    logger.info(
+        f"Prewarming {len(ranked_queries)} queries, hit rate {prewarm.get_hit_rate()}"
+    )
+
+
+@shared_task
+def prewarm_query(query: str):
+    # Checked again, a search may have refreshed the query since it was ranked
+    if not prewarm.needs_prewarm(query):
+        scrape_metrics.incr(prewarm.METRICS_NAME, "skipped_fresh")
+        return
+    if not prewarm.take_budget():
+        scrape_metrics.incr(prewarm.METRICS_NAME, "skipped_budget")
+        return
+
+    search_text = prewarm.get_search_text(query)
+    if begin_updating_products(query, SCRAPE_PRIORITY_PREWARM, search_text):
+        scrape_metrics.incr(prewarm.METRICS_NAME, "scrapes")
+    else:
+        scrape_metrics.incr(prewarm.METRICS_NAME, "skipped_running")
+
+
+@shared_task
+def purge_old_batches():
+    report = retention.purge_old_batches()
+    for field, amount in report.items():
+        scrape_metrics.incr(retention.METRICS_NAME, field, amount)
+    scrape_metrics.incr(retention.METRICS_NAME, "runs")
+    logger.info(
+        f"Purged {report['batches']} batches, {report['rows']} product rows, "
+        f"{report['catalogue_products']} catalogue products "
+        f"and about {report['bytes'] / 2**20:.1f} MiB"
+    )
+
+
+@shared_task
+def maintain_product_partitions():
+    # Opt-in, see the product_partitions command
+    if not product_partitions.is_supported():
+        logger.info(
+            "Product partitions need PostgreSQL, "
+            f"{product_partitions.TABLE} stays a single table"
+        )
+        return
+    if not product_partitions.is_partitioned():
+        logger.info(f"{product_partitions.TABLE} isn't partitioned, nothing to do")
+        return
+    created, dropped = product_partitions.maintain()
+    logger.info(
+        f"Created product partitions {created or 'none'}, dropped {dropped or 'none'}"
+    )
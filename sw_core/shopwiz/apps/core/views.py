@@ -10,7 +10,13 @@ from rest_framework.response import Response
 from rest_framework.decorators import action
 from rest_framework.permissions import IsAuthenticated
 
-from shopwiz.tools.concurrent_tasks.update_products import begin_updating_products
+from shopwiz.tools.concurrent_tasks.update_products import (
+    begin_updating_products,
+    SCRAPE_PRIORITY_INTERACTIVE,
+)
+from shopwiz.tools import prewarm
+from shopwiz.tools.query_canonicalizer import canonicalize
+from shopwiz.tools.provisional_results import find_provisional_products
 from .serializers import (
     SearchedProductSerialiser,
     SearchedProductParamsSerialiser,
@@ -44,13 +50,15 @@ class SearchedProductViewSet(
         serializer = SearchedProductParamsSerialiser(data=request.query_params)
         serializer.is_valid(raise_exception=True)
         validated_params = serializer.validated_data
+        # Equivalent queries share their batches, the search text is scraped
+        search_text = validated_params["query"]
+        query = canonicalize(search_text)
 
         # Check if we have up to date data for this query
         recent_batch, recent_products, update_date, update_needed = (
-            SearchedProduct.objects.get_most_recent_and_check_freshness(
-                validated_params["query"]
-            )
+            SearchedProduct.objects.get_most_recent_and_check_freshness(query)
         )
+        prewarm.record_search(query, recent_batch, update_needed)
 
         # Potential scenarios
         # 1. no recent_batch -> no products -> yes update_needed
@@ -60,23 +68,30 @@ class SearchedProductViewSet(
         # 5. yes recent_batch -> no products -> no update_needed
 
         # 1. no recent_batch -> no products -> yes update_needed
+        is_provisional = False
         if not recent_batch:
-            begin_updating_products(validated_params["query"])
-            return Response(
-                {
-                    "data": [],
-                    "metadata": {
-                        "is_full_metadata": False,
-                        "first_time_search": True,
-                        "is_update_needed": True,
-                    },
-                }
-            )
+            begin_updating_products(query, SCRAPE_PRIORITY_INTERACTIVE, search_text)
+            # Until it's scraped, show what a fresh batch of a broader query has
+            provisional_batch, recent_products = find_provisional_products(query)
+            if not provisional_batch:
+                return Response(
+                    {
+                        "data": [],
+                        "metadata": {
+                            "is_full_metadata": False,
+                            "first_time_search": True,
+                            "is_update_needed": True,
+                        },
+                    }
+                )
+            update_date = provisional_batch.upload_date
+            is_provisional = True
         # 4. yes recent_batch -> no products -> yes update_needed
         # 5. yes recent_batch -> no products -> no update_needed
         if not recent_products:
+            # Nothing to show meanwhile, same as a first time search
             if update_needed:
-                begin_updating_products(validated_params["query"])
+                begin_updating_products(query, SCRAPE_PRIORITY_INTERACTIVE, search_text)
             return Response(
                 {
                     "data": [],
@@ -92,8 +107,8 @@ class SearchedProductViewSet(
         # 2. yes recent_batch -> yes products -> yes update_needed
         # 3. yes recent_batch -> yes products -> no update_needed
 
-        if update_needed:
-            begin_updating_products(validated_params["query"])
+        if update_needed and not is_provisional:
+            begin_updating_products(query, search_text=search_text)
 
         # If recent products exists, gather relevant data
         filtered_products = SearchedProductFilter(validated_params, recent_products).qs
@@ -120,6 +135,7 @@ class SearchedProductViewSet(
                 "is_full_metadata": True,
                 "query": validated_params["query"],
                 "is_update_needed": update_needed,
+                "is_provisional": is_provisional,
                 "update_date": update_date,
                 "page": page_obj.number,
                 "total_pages": paginator.num_pages,
@@ -1,10 +1,17 @@
 from typing import Dict
 import os
-from datetime import timedelta
+import math
+import time
+import queue
+import asyncio
 import argparse
+import threading
+from contextlib import ExitStack
 from concurrent.futures import ThreadPoolExecutor, as_completed
 
-from celery import shared_task
+from celery import shared_task, chord, uuid
+from celery.exceptions import SoftTimeLimitExceeded
+from celery.result import AsyncResult
 
 import django
 
@@ -12,112 +19,908 @@ import django
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings")
 django.setup()
 
-from django.core.cache import cache
+from django.db import connection
 from django.utils import timezone
-from django.db import transaction
 
 from config.settings import (
     ENABLED_SCRAPERS,
-    CACHE_SHOP_SCRAPE_EXECUTION_SECONDS,
+    RESULTS_EXPIRY_DAYS,
+    PREWARM_LOOKAHEAD_DAYS,
+    SCRAPE_LEASE_QUEUE_SECONDS,
+    SCRAPER_ENGINE,
+    SCRAPER_ASYNC_CONCURRENCY,
+    SCRAPER_SHOP_SOFT_TIME_LIMIT_SECONDS,
+    SCRAPER_SHOP_TIME_LIMIT_GRACE_SECONDS,
+    SCRAPER_SESSION_POLL_SECONDS,
+)
+from shopwiz.apps.core.models import (
+    BatchUpload,
+    ScrapeRun,
+    ScrapeShopRun,
 )
-from shopwiz.apps.core.models import SearchedProduct, BatchUpload
 from ..scraper_factory.scraper_factory import ScraperFactory
+from ..scraper_factory.browser_pool import browser_pool, async_browser_pool
 from ..scraper_factory.shop_scrapers import ShopScraper
-from .. import websocket_util
+from .. import websocket_util, single_flight, shop_freshness, scrape_sessions
+from ..product_delta import BatchDelta
 
 factory = ScraperFactory()
 
+# Long-lived threads keep their pooled browsers warm between tasks
+executor = ThreadPoolExecutor(max_workers=len(ENABLED_SCRAPERS))
 
-def begin_updating_products(query_param):
-    cache_key = f"scrape_query_{query_param}"
-    last_update = cache.get(cache_key)
+# Runs the scrape of a shop task while the task thread saves its products.
+# Scrape sessions run on threads of their own, see ScrapeSession
+stream_executor = ThreadPoolExecutor(max_workers=1)
 
-    if last_update and (
-        (timezone.now() - last_update)
-        < timedelta(seconds=CACHE_SHOP_SCRAPE_EXECUTION_SECONDS)
-    ):
-        return
-    else:
-        # TODO: Rethink
-        is_relevant_only_param = True
-        update_products.delay(query_param, is_relevant_only_param)
-        cache.set(
-            cache_key,
-            timezone.now(),
-            timeout=CACHE_SHOP_SCRAPE_EXECUTION_SECONDS,
+# Parsed chunks waiting to be saved, scrapers block once the writer falls behind
+STREAM_MAX_PENDING_CHUNKS = 32
+
+# How often async scrapes check whether their stream was abandoned
+STREAM_CANCEL_POLL_SECONDS = 0.5
+
+# Async playwright objects are bound to the loop that created them, so the
+# pooled async browser needs the same loop for every task. It runs in a thread
+# of its own, scrapes started from several threads share it
+event_loop = None
+event_loop_lock = threading.Lock()
+
+
+def run_async(coro):
+    global event_loop
+    with event_loop_lock:
+        if event_loop is None or event_loop.is_closed():
+            event_loop = asyncio.new_event_loop()
+            threading.Thread(target=event_loop.run_forever, daemon=True).start()
+    return asyncio.run_coroutine_threadsafe(coro, event_loop).result()
+
+
+# Priorities of scrape tasks on the scraping queue, lower is served first
+SCRAPE_PRIORITY_INTERACTIVE = 0  # the user is looking at an empty page
+SCRAPE_PRIORITY_REFRESH = 3  # stale results are shown meanwhile
+SCRAPE_PRIORITY_PREWARM = 6  # nobody is waiting for it
+
+# The lease of a query is renewed by its running shop tasks only, so it is taken
+# to outlast any of them waiting on the queue and then running into its hard
+# time limit
+SCRAPE_LEASE_DISPATCH_TTL_SECONDS = (
+    SCRAPE_LEASE_QUEUE_SECONDS
+    + max(SCRAPER_SHOP_SOFT_TIME_LIMIT_SECONDS.values())
+    + SCRAPER_SHOP_TIME_LIMIT_GRACE_SECONDS
+)
+
+
+def begin_updating_products(
+    query_param, priority=SCRAPE_PRIORITY_REFRESH, search_text=None
+):
+    """
+    Scrape the shops for search_text, or the query itself, into a batch of the
+    canonical query. Returns False when a scrape of the query is already running.
+    """
+    # Identical searches share the scrape that holds the query's lease
+    lease_token = single_flight.acquire(query_param, SCRAPE_LEASE_DISPATCH_TTL_SECONDS)
+    if lease_token is None:
+        return False
+
+    # TODO: Rethink
+    is_relevant_only_param = True
+    try:
+        update_products.apply_async(
+            (query_param, is_relevant_only_param, lease_token, priority, search_text),
+            priority=priority,
+        )
+    except Exception:
+        single_flight.release(query_param, lease_token)
+        raise
+    return True
+
+
+class ProductStream:
+    """
+    Hands products over from the scrapers to the task thread, which saves every
+    chunk as soon as it arrives. Chunks are put from scraper threads, or from
+    the default executor of the event loop, the queue being bounded keeps memory
+    flat on large crawls. Scrapers stop once the stream is abandoned, see
+    ShopScraper.cancel_event.
+    """
+
+    def __init__(self):
+        self._queue = queue.Queue(maxsize=STREAM_MAX_PENDING_CHUNKS)
+        self.cancelled = threading.Event()
+
+    def put_products(self, shop_name, products):
+        if products and not self.cancelled.is_set():
+            self._queue.put(("products", shop_name, products))
+
+    def shop_finished(self, shop_name, summary=None):
+        if not self.cancelled.is_set():
+            self._queue.put(("shop_finished", shop_name, summary))
+
+    async def shop_finished_async(self, shop_name, summary=None):
+        # Blocking on a full queue would stall the event loop, and every page on it
+        await asyncio.get_running_loop().run_in_executor(
+            None, self.shop_finished, shop_name, summary
         )
 
+    def close(self):
+        self._queue.put(None)
+
+    def abandon(self):
+        # Unblocks scrapers waiting on a full queue once nobody reads it anymore
+        self.cancelled.set()
+        while True:
+            try:
+                self._queue.get_nowait()
+            except queue.Empty:
+                return
+
+    def __iter__(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            yield item
+
 
 @shared_task
-def update_products(query: str, is_relevant_only: bool):
+def update_products(
+    query: str,
+    is_relevant_only: bool,
+    lease_token: str = None,
+    priority: int = SCRAPE_PRIORITY_REFRESH,
+    search_text: str = None,
+):
+    """
+    Scrape every enabled shop in a task of its own, so shops are spread across
+    workers and a slow shop doesn't hold back the others. Each shop saves into
+    the same batch, which finish_batch completes once all of them are done.
+    The shop tasks and the callbacks keep the priority of the search.
+
+    Only shops without fresh results are scraped, the products of the others
+    are carried forward into the new batch. Every scrape is queued for its
+    shop as well, so that a shop task of another search may take it on.
+    """
+    search_text = search_text or query
     print(f"Passing to cache_data query: {query}; is_relevant_only: {is_relevant_only}")
 
-    scraped_data = scrape_data(query, is_relevant_only)
-    print("data scraped")
-    products = scraped_data["products"]
+    try:
+        # Prewarms refresh shops a little before their results go stale
+        fresh_days = RESULTS_EXPIRY_DAYS
+        if priority == SCRAPE_PRIORITY_PREWARM:
+            fresh_days -= PREWARM_LOOKAHEAD_DAYS
+        scraper_per_shop = {
+            shop_name_of(scraper_name): scraper_name
+            for scraper_name in ENABLED_SCRAPERS
+        }
+        stale_shop_names = shop_freshness.shops_to_scrape(
+            query, scraper_per_shop, fresh_days
+        )
+        if not stale_shop_names:
+            # Every shop was scraped since this scrape was asked for
+            complete_batch(None, query, lease_token)
+            return
+
+        batch_instance = BatchUpload.objects.create(query=query, is_complete=False)
+        ScrapeRun.objects.create(
+            batch=batch_instance,
+            query=query,
+            is_relevant_only=is_relevant_only,
+            priority=priority,
+            search_text=search_text,
+        )
+        shop_freshness.carry_forward(
+            query,
+            batch_instance,
+            [
+                shop_name
+                for shop_name in scraper_per_shop
+                if shop_name not in stale_shop_names
+            ],
+        )
+        # Known up front, so results of the shop tasks can be looked up when
+        # one of them gets killed
+        shop_task_ids = [uuid() for _ in stale_shop_names]
+        shop_tasks = [
+            scrape_shop.s(
+                batch_instance.id,
+                query,
+                is_relevant_only,
+                scraper_per_shop[shop_name],
+                lease_token,
+                search_text,
+            ).set(
+                task_id=task_id,
+                priority=priority,
+                **shop_time_limits(scraper_per_shop[shop_name]),
+            )
+            for shop_name, task_id in zip(stale_shop_names, shop_task_ids)
+        ]
+        job = {
+            "batch_id": batch_instance.id,
+            "query": query,
+            "is_relevant_only": is_relevant_only,
+            "lease_token": lease_token,
+            "search_text": search_text,
+        }
+        for shop_name in stale_shop_names:
+            scrape_sessions.enqueue(shop_name, job, priority)
+        chord(shop_tasks)(
+            finish_batch.s(batch_instance.id, query, lease_token, stale_shop_names)
+            .set(priority=priority)
+            .on_error(
+                finish_batch_after_error.s(
+                    batch_instance.id,
+                    query,
+                    lease_token,
+                    stale_shop_names,
+                    shop_task_ids,
+                ).set(priority=priority)
+            )
+        )
+    except Exception:
+        if lease_token:
+            single_flight.release(query, lease_token)
+        raise
+
+
+def shop_name_of(scraper_name):
+    return factory.create(scraper_name).shop_name
 
-    save_results_to_db(
-        query,
-        products,
+
+def shop_time_limits(scraper_name):
+    soft_time_limit = SCRAPER_SHOP_SOFT_TIME_LIMIT_SECONDS.get(
+        shop_name_of(scraper_name)
+    )
+    return {
+        "soft_time_limit": soft_time_limit,
+        "time_limit": soft_time_limit + SCRAPER_SHOP_TIME_LIMIT_GRACE_SECONDS,
+    }
+
+
+@shared_task(bind=True)
+def scrape_shop(
+    self,
+    batch_id: int,
+    query: str,
+    is_relevant_only: bool,
+    scraper_name,
+    lease_token: str = None,
+    search_text: str = None,
+):
+    """
+    Scrape a single shop into the batch. Never raises, so that one failing shop
+    doesn't keep the chord from completing the batch for the others.
+
+    Scrapes of the shop queued by other searches are taken on as well, in the
+    same browser session, see scrape_sessions. The task returns as soon as its
+    own scrape is done. A task whose scrape was taken on by another session is
+    retried until that session publishes its summary.
+    """
+    shop_name = shop_name_of(scraper_name)
+    try:
+        other_jobs = scrape_sessions.claim(shop_name, batch_id)
+    except Exception as e:
+        return failed_shop_summary(scraper_name, query, str(e), type(e).__name__)
+    if other_jobs is None:
+        return wait_for_session(self, scraper_name, batch_id, query)
+
+    job = {
+        "batch_id": batch_id,
+        "query": query,
+        "is_relevant_only": is_relevant_only,
+        "lease_token": lease_token,
+        "search_text": search_text,
+    }
+    return scrape_jobs(self, scraper_name, [job, *other_jobs])
+
+
+def scrape_jobs(task, scraper_name, jobs):
+    """
+    Scrape the shop into the batch of every job, the first being the task's
+    own, in a single browser session. Returns the summary of the task's job as
+    soon as it is scraped, the session goes on in the background for the
+    others, see ScrapeSession.
+    """
+
+    def report_progress(shop_name, saved):
+        # Task state is informational only, a failure to store it is ignored
+        try:
+            task.update_state(
+                state="PROGRESS", meta={"shop_name": shop_name, "saved": saved}
+            )
+        except Exception as e:
+            print(f"Failed to report progress of {shop_name}: {e}")
+
+    session = None
+    try:
+        with ExitStack() as leases:
+            for job in jobs:
+                leases.enter_context(
+                    single_flight.keep_alive(job["query"], job["lease_token"])
+                )
+            if len(jobs) == 1:
+                results = scrape_into_batch(
+                    jobs[0]["query"],
+                    jobs[0]["is_relevant_only"],
+                    BatchUpload.objects.get(id=jobs[0]["batch_id"]),
+                    [scraper_name],
+                    report_progress,
+                    jobs[0]["search_text"],
+                )
+                summary = (results["summaryPerShop"] or [None])[0]
+                return summary or failed_shop_summary(
+                    scraper_name, jobs[0]["query"], "scraper failed", "ScraperFailed"
+                )
+
+            session = ScrapeSession(scraper_name, jobs, report_progress)
+            session.ingest(until_job_index=0)
+            if not session.is_finished:
+                # The leases of the other jobs go along with their scrapes
+                threading.Thread(
+                    target=finish_session,
+                    args=(session, leases.pop_all()),
+                    daemon=True,
+                ).start()
+            return session.summaries[0]
+    except SoftTimeLimitExceeded as e:
+        error, error_class = "time limit exceeded", type(e).__name__
+    except Exception as e:
+        error, error_class = str(e), type(e).__name__
+
+    if session is not None:
+        session.abandon(error, error_class)
+        return session.summaries[0]
+    return failed_shop_summary(scraper_name, jobs[0]["query"], error, error_class)
+
+
+def wait_for_session(task, scraper_name, batch_id: int, query: str):
+    """
+    Summary of the shop for the batch, published by the session that took its
+    scrape on. The task is retried until it is in rather than holding on to a
+    worker, for as long as the time limit of the session allows.
+    """
+    shop_name = shop_name_of(scraper_name)
+    time_limit = shop_time_limits(scraper_name)["time_limit"]
+    max_polls = math.ceil(time_limit / SCRAPER_SESSION_POLL_SECONDS) + 1
+    polls = task.request.retries or 0
+    while True:
+        try:
+            summary = scrape_sessions.take_result(shop_name, batch_id)
+        except Exception as e:
+            print(f"Failed to check the session scrape of {shop_name}: {e}")
+            summary = None
+        if summary is not None:
+            return summary
+        if polls >= max_polls:
+            return failed_shop_summary(
+                scraper_name,
+                query,
+                "scrape session never finished",
+                "SessionTimeout",
+            )
+        if not task.request.is_eager:
+            raise task.retry(countdown=SCRAPER_SESSION_POLL_SECONDS, max_retries=None)
+        # Eager tasks can't be queued again, so they wait in place
+        polls += 1
+        time.sleep(SCRAPER_SESSION_POLL_SECONDS)
+
+
+def failed_shop_summary(scraper_name, query: str, error: str, error_class: str):
+    print(f"{scraper_name} failed for query {query}: {error}")
+    return {
+        "shop_name": shop_name_of(scraper_name),
+        "count": 0,
+        "error": error,
+        "error_class": error_class,
+    }
+
+
+@shared_task
+def finish_batch(
+    shop_summaries,
+    batch_id: int,
+    query: str,
+    lease_token: str = None,
+    shop_names=None,
+):
+    for summary in shop_summaries:
+        print(
+            f"{summary['shop_name']} RESULTS: {summary['count']}, "
+            f"written: {summary.get('rows_written', 0)}, error: {summary['error']}"
+        )
+    record_shop_runs(batch_id, shop_summaries)
+    succeeded_shop_names = [
+        summary["shop_name"] for summary in shop_summaries if not summary["error"]
+    ]
+    settle_shops(batch_id, query, shop_names, succeeded_shop_names)
+    complete_batch(batch_id, query, lease_token)
+
+
+@shared_task
+def finish_batch_after_error(
+    request,
+    exc,
+    traceback,
+    batch_id: int,
+    query: str,
+    lease_token: str = None,
+    shop_names=None,
+    shop_task_ids=None,
+):
+    # A shop task was killed at its hard time limit, keep what the others saved
+    print(f"Scrape of {query} failed in task {request.id}: {exc}")
+    shop_summaries = stored_shop_summaries(shop_names or [], shop_task_ids or [])
+    record_shop_runs(batch_id, shop_summaries)
+    # The killed shop saved only part of its products, so it is settled as failed
+    succeeded_shop_names = [
+        summary["shop_name"] for summary in shop_summaries if not summary["error"]
+    ]
+    settle_shops(batch_id, query, shop_names, succeeded_shop_names)
+    complete_batch(batch_id, query, lease_token)
+
+
+def stored_shop_summaries(shop_names, shop_task_ids):
+    """
+    Summaries of the shop tasks of a chord, read from the result backend. Shops
+    whose task raised, which only happens when it is killed, get a failed one.
+    """
+    shop_summaries = []
+    for shop_name, task_id in zip(shop_names, shop_task_ids):
+        error, error_class = "time limit exceeded", "TimeLimitExceeded"
+        try:
+            result = AsyncResult(task_id)
+            if result.successful():
+                shop_summaries.append(result.result)
+                continue
+            if result.failed():
+                error, error_class = str(result.result), type(result.result).__name__
+        except Exception as e:
+            print(f"Failed to read the result of {shop_name} task {task_id}: {e}")
+        shop_summaries.append(
+            {
+                "shop_name": shop_name,
+                "count": 0,
+                "error": error,
+                "error_class": error_class,
+            }
+        )
+    return shop_summaries
+
+
+def settle_shops(batch_id: int, query: str, shop_names, succeeded_shop_names):
+    """Carry the last good products of failed shops into the batch."""
+    batch_instance = BatchUpload.objects.filter(id=batch_id).first()
+    if batch_instance is None or shop_names is None:
+        return
+
+    failed_shop_names = [
+        shop_name for shop_name in shop_names if shop_name not in succeeded_shop_names
+    ]
+    carried_shop_names = shop_freshness.carry_forward(
+        query, batch_instance, failed_shop_names
+    )
+    for shop_name in carried_shop_names:
+        print(f"Carried {shop_name} results of {query} forward after it failed")
+    shop_freshness.record_scrape(
+        query, batch_instance, succeeded_shop_names, failed_shop_names
     )
 
 
-def scrape_with_scraper(scraper_name, query, is_relevant_only):
+def record_shop_runs(batch_id: int, shop_summaries):
+    scrape_run = ScrapeRun.objects.filter(batch_id=batch_id).first()
+    if scrape_run is None:
+        return
+
+    shop_runs = []
+    for summary in shop_summaries:
+        phase_times = summary.get("phase_times", {})
+        network = summary.get("network", {})
+        shop_runs.append(
+            ScrapeShopRun(
+                scrape_run=scrape_run,
+                shop_name=summary["shop_name"],
+                strategy=summary.get("strategy", ""),
+                exec_time=summary.get("exec_time", 0),
+                fetch_time=phase_times.get("fetch", 0),
+                goto_time=phase_times.get("goto", 0),
+                wait_time=phase_times.get("wait", 0),
+                throttle_time=phase_times.get("throttle", 0),
+                parse_time=summary.get("parse_time", 0),
+                pages_parsed=summary.get("pages_parsed", 0),
+                product_count=summary["count"],
+                rows_written=summary.get("rows_written", 0),
+                bytes_received=network.get("bytes_received", 0),
+                blocked_requests=network.get("blocked_requests", 0),
+                error_class=summary.get("error_class") or "",
+            )
+        )
+    ScrapeShopRun.objects.bulk_create(shop_runs)
+
+
+def complete_batch(batch_id: int, query: str, lease_token: str = None):
+    if batch_id is not None:
+        BatchUpload.objects.filter(id=batch_id).update(is_complete=True)
+        ScrapeRun.objects.filter(batch_id=batch_id).update(finished_at=timezone.now())
+    if lease_token:
+        single_flight.release(query, lease_token)
+    websocket_util.notify_scrape_completion(query)
+
+
+def scrape_into_batch(
+    query: str,
+    is_relevant_only: bool,
+    batch_instance: BatchUpload,
+    scraper_names=ENABLED_SCRAPERS,
+    on_progress=None,
+    search_text: str = None,
+) -> Dict:
+    """
+    Scrape the shops for search_text, or the query itself, on a background
+    thread while this thread saves their products into the batch as they arrive.
+    The summary of each shop tells how many of its rows had to be written.
+    """
+    stream = ProductStream()
+    scrape_future = stream_executor.submit(
+        scrape_data, search_text or query, is_relevant_only, stream, scraper_names
+    )
+    scrape_future.add_done_callback(lambda _: stream.close())
+
+    try:
+        delta = ingest_stream(query, batch_instance, stream, on_progress)
+        results = scrape_future.result()
+    except Exception:
+        stream.abandon()
+        raise
+
+    for summary in results["summaryPerShop"]:
+        summary["rows_written"] = delta.written_per_shop.get(summary["shop_name"], 0)
+    return results
+
+
+def ingest_stream(
+    query: str, batch_instance: BatchUpload, stream: ProductStream, on_progress=None
+) -> BatchDelta:
+    # Products unchanged since the previous batch keep their rows
+    delta = BatchDelta(query, batch_instance)
+    for event, shop_name, products in stream:
+        ingest_event(query, delta, event, shop_name, products, on_progress)
+    return delta
+
+
+def ingest_event(
+    query: str, delta: BatchDelta, event, shop_name, products, on_progress=None
+):
+    if event == "products":
+        saved = delta.save(shop_name, products)
+        websocket_util.notify_scrape_progress(query, shop_name, saved)
+        if on_progress:
+            on_progress(shop_name, saved)
+    else:
+        websocket_util.notify_scrape_progress(
+            query,
+            shop_name,
+            delta.scraped_per_shop.get(shop_name, 0),
+            is_shop_complete=True,
+        )
+
+
+class ScrapeSession:
+    """
+    Scrapes the shop for the query of every job in one browser session, on a
+    thread of its own, while the products of each job are saved into its batch
+    as they arrive. A job is finished once its scrape is, the summaries of jobs
+    of other tasks are published for them right away. Once the task returns,
+    the rest of the session holds up none of the next tasks of the worker.
+    """
+
+    def __init__(self, scraper_name, jobs, on_progress=None):
+        self.scraper_name = scraper_name
+        self.shop_name = shop_name_of(scraper_name)
+        self.jobs = jobs
+        # The task only reports the progress of its own job
+        self.on_progress = on_progress
+        self.deltas = [
+            BatchDelta(job["query"], BatchUpload.objects.get(id=job["batch_id"]))
+            for job in jobs
+        ]
+        self.summaries = [None] * len(jobs)
+
+        self.stream = ProductStream()
+        # Jobs still scraping by then would have been killed in tasks of their
+        # own, the session is given up on with them
+        self._deadline = threading.Timer(
+            shop_time_limits(scraper_name)["soft_time_limit"], self.stream.abandon
+        )
+        self._deadline.start()
+        threading.Thread(target=self._scrape, daemon=True).start()
+        # Events are taken from the task thread first, then from finish_session
+        self._events = iter(self.stream)
+
+    def _scrape(self):
+        try:
+            scrape_session(self.scraper_name, self.jobs, self.stream)
+        except Exception as e:
+            print(f"Scrape session of {self.shop_name} failed: {e}")
+        finally:
+            self._deadline.cancel()
+            self.stream.close()
+            connection.close()
+
+    @property
+    def is_finished(self):
+        return None not in self.summaries
+
+    def ingest(self, until_job_index=None):
+        """Save products until the job is finished, or every job when None."""
+        # Chunks of a session are put on the stream under the index of their job
+        for event, job_index, payload in self._events:
+            ingest_event(
+                self.jobs[job_index]["query"],
+                self.deltas[job_index],
+                event,
+                self.shop_name,
+                payload,
+                self.on_progress if job_index == 0 else None,
+            )
+            if event == "shop_finished":
+                self.finish(job_index, payload)
+                if job_index == until_job_index:
+                    return
+
+        if self.stream.cancelled.is_set():
+            self.fail_unfinished("scrape session ran out of time", "SessionTimeout")
+        else:
+            self.fail_unfinished("scraper failed", "ScraperFailed")
+
+    def finish(self, job_index, summary):
+        query = self.jobs[job_index]["query"]
+        summary = summary or failed_shop_summary(
+            self.scraper_name, query, "scraper failed", "ScraperFailed"
+        )
+        summary["rows_written"] = self.deltas[job_index].written_per_shop.get(
+            self.shop_name, 0
+        )
+        self.summaries[job_index] = summary
+        if job_index > 0:
+            scrape_sessions.publish(
+                self.shop_name, self.jobs[job_index]["batch_id"], summary
+            )
+
+    def fail_unfinished(self, error: str, error_class: str):
+        for job_index, summary in enumerate(self.summaries):
+            if summary is None:
+                self.finish(
+                    job_index,
+                    failed_shop_summary(
+                        self.scraper_name,
+                        self.jobs[job_index]["query"],
+                        error,
+                        error_class,
+                    ),
+                )
+
+    def abandon(self, error: str, error_class: str):
+        self.stream.abandon()
+        self.fail_unfinished(error, error_class)
+
+
+def finish_session(session: ScrapeSession, leases: ExitStack):
+    """
+    Save the products of the jobs a session is still scraping after its task
+    returned, renewing their leases meanwhile. Runs on a thread of its own,
+    until the session finishes or its deadline passes.
+    """
+    try:
+        with leases:
+            session.ingest()
+    except Exception as e:
+        session.abandon(str(e), type(e).__name__)
+    finally:
+        # Django opened a connection for this thread, nothing else would close it
+        connection.close()
+
+
+def create_scraper(scraper_name, stream: ProductStream = None) -> ShopScraper:
     scraper_instance: ShopScraper = factory.create(scraper_name)
-    return scraper_instance.get_products(query, is_relevant_only)
+    if stream is not None:
+        scraper_instance.product_sink = stream.put_products
+        scraper_instance.cancel_event = stream.cancelled
+    return scraper_instance
 
 
-def scrape_data(query: str, is_relevant_only: bool) -> Dict:
+def create_session_scraper(scraper_name, job_index: int, stream: ProductStream):
+    scraper_instance: ShopScraper = factory.create(scraper_name)
+    scraper_instance.product_sink = lambda _, products: stream.put_products(
+        job_index, products
+    )
+    scraper_instance.context_slot = job_index
+    scraper_instance.cancel_event = stream.cancelled
+    return scraper_instance
+
+
+async def until_abandoned(scrape, stream: ProductStream = None):
+    """
+    Result of the scrape, or None when it was cancelled because the stream was
+    abandoned. Cancelling doesn't wait for page loads in flight, the scrapers
+    still close their pages and hand their browser contexts back to the pool.
+    """
+    scrape = asyncio.ensure_future(scrape)
+    while stream is not None and not scrape.done():
+        if stream.cancelled.is_set():
+            scrape.cancel()
+            break
+        await asyncio.wait({scrape}, timeout=STREAM_CANCEL_POLL_SECONDS)
+    await asyncio.wait({scrape})
+    try:
+        return scrape.result()
+    except asyncio.CancelledError:
+        return None
+
+
+def scrape_with_scraper(scraper_name, query, is_relevant_only, stream=None):
+    scraper_instance = create_scraper(scraper_name, stream)
+    try:
+        return scraper_instance.get_products(query, is_relevant_only)
+    finally:
+        if stream is not None:
+            stream.shop_finished(scraper_instance.shop_name)
+
+
+def scrape_data(
+    query: str,
+    is_relevant_only: bool,
+    stream: ProductStream = None,
+    scraper_names=ENABLED_SCRAPERS,
+) -> Dict:
+    """
+    Scrape the given shops, every enabled one by default. When a stream is given
+    the products are put on it as they are parsed and the returned results only
+    hold the summaries.
+    """
+    if SCRAPER_ENGINE == "async":
+        return run_async(
+            scrape_data_async(query, is_relevant_only, stream, scraper_names)
+        )
+    return scrape_data_sync(query, is_relevant_only, stream, scraper_names)
+
+
+async def scrape_with_scraper_async(
+    scraper_name, query, is_relevant_only, semaphore, stream=None
+):
+    scraper_instance = create_scraper(scraper_name, stream)
+    try:
+        return await scraper_instance.get_products_async(
+            query, is_relevant_only, semaphore
+        )
+    finally:
+        if stream is not None:
+            await stream.shop_finished_async(scraper_instance.shop_name)
+
+
+async def scrape_data_async(
+    query: str,
+    is_relevant_only: bool,
+    stream: ProductStream = None,
+    scraper_names=ENABLED_SCRAPERS,
+) -> Dict:
     results = {
         "products": [],
         "summaryPerShop": [],
     }
 
-    # Using ThreadPoolExecutor to run scrapers in parallel
-    with ThreadPoolExecutor(max_workers=len(ENABLED_SCRAPERS)) as executor:
-        # Submitting all scraper tasks to the executor
-        future_to_scraper = {
-            executor.submit(
-                scrape_with_scraper, scraper_name, query, is_relevant_only
-            ): scraper_name
-            for scraper_name in ENABLED_SCRAPERS
-        }
+    # Every shop and every page share one limit on concurrently open tabs
+    semaphore = asyncio.Semaphore(SCRAPER_ASYNC_CONCURRENCY)
+    scraper_names = list(scraper_names)
+    scrape_results = await until_abandoned(
+        asyncio.gather(
+            *(
+                scrape_with_scraper_async(
+                    scraper_name, query, is_relevant_only, semaphore, stream
+                )
+                for scraper_name in scraper_names
+            ),
+            return_exceptions=True,
+        ),
+        stream,
+    )
+    if scrape_results is None:
+        # Nobody reads the products of an abandoned scrape anymore
+        return results
 
-        for future in as_completed(future_to_scraper):
-            scraper_name = future_to_scraper[future]
-            try:
-                scrape_result = future.result()
+    for scraper_name, scrape_result in zip(scraper_names, scrape_results):
+        if isinstance(scrape_result, BaseException):
+            print(f"{scraper_name} generated an exception: {scrape_result}")
+            continue
 
-                results["products"].extend(scrape_result["products"])
-                results["summaryPerShop"].append(scrape_result["summaryPerShop"])
+        results["products"].extend(scrape_result["products"])
+        results["summaryPerShop"].append(scrape_result["summaryPerShop"])
 
-            except Exception as exc:
-                print(f"{scraper_name} generated an exception: {exc}")
+    print(f"Async browser pool stats: {async_browser_pool.stats()}")
 
     return results
 
 
-def save_results_to_db(query, products_list):
-    with transaction.atomic():
-        batch_instance = BatchUpload.objects.create(query=query)
-
-        products_to_create = []
-        for product in products_list:
-            product_instance = SearchedProduct(
-                batch=batch_instance,
-                name=product["name"],
-                price=product["price"],
-                price_per_unit=product["price_per_unit"],
-                unit_type=product["unit_type"],
-                unit_measurement=product["unit_measurement"],
-                img_src=product["img_src"],
-                product_url=product["product_url"],
-                shop_name=product["shop_name"],
+def scrape_data_sync(
+    query: str,
+    is_relevant_only: bool,
+    stream: ProductStream = None,
+    scraper_names=ENABLED_SCRAPERS,
+) -> Dict:
+    results = {
+        "products": [],
+        "summaryPerShop": [],
+    }
+
+    # Submitting all scraper tasks to the shared executor to run in parallel
+    future_to_scraper = {
+        executor.submit(
+            scrape_with_scraper, scraper_name, query, is_relevant_only, stream
+        ): scraper_name
+        for scraper_name in scraper_names
+    }
+
+    for future in as_completed(future_to_scraper):
+        scraper_name = future_to_scraper[future]
+        try:
+            scrape_result = future.result()
+
+            results["products"].extend(scrape_result["products"])
+            results["summaryPerShop"].append(scrape_result["summaryPerShop"])
+
+        except Exception as exc:
+            print(f"{scraper_name} generated an exception: {exc}")
+
+    print(f"Browser pool stats: {browser_pool.stats()}")
+
+    return results
+
+
+def scrape_session(scraper_name, jobs, stream: ProductStream):
+    """
+    Scrape the shop for the query of every job in one browser, putting the
+    products of each job on the stream under its index, followed by its
+    summary once it is done. Sessions only run on the async engine, see
+    scrape_sessions.max_queries.
+    """
+    return run_async(scrape_session_async(scraper_name, jobs, stream))
+
+
+async def scrape_session_async(scraper_name, jobs, stream: ProductStream):
+    # Every query has a context of its own, their tabs share one limit
+    semaphore = asyncio.Semaphore(SCRAPER_ASYNC_CONCURRENCY)
+
+    async def scrape_job(job_index, job):
+        scraper_instance = create_session_scraper(scraper_name, job_index, stream)
+        summary = None
+        try:
+            result = await scraper_instance.get_products_async(
+                job["search_text"] or job["query"], job["is_relevant_only"], semaphore
             )
-            products_to_create.append(product_instance)
+            summary = result["summaryPerShop"]
+            return summary
+        finally:
+            await stream.shop_finished_async(job_index, summary)
+
+    scrape_results = await until_abandoned(
+        asyncio.gather(
+            *(scrape_job(job_index, job) for job_index, job in enumerate(jobs)),
+            return_exceptions=True,
+        ),
+        stream,
+    )
+    if scrape_results is None:
+        return [None] * len(jobs)
+
+    summaries = []
+    for scrape_result in scrape_results:
+        if isinstance(scrape_result, BaseException):
+            print(f"{scraper_name} generated an exception: {scrape_result}")
+            scrape_result = None
+        summaries.append(scrape_result)
+
+    print(f"Async browser pool stats: {async_browser_pool.stats()}")
 
-        SearchedProduct.objects.bulk_create(products_to_create)
-        websocket_util.notify_scrape_completion(query)
+    return summaries
 
 
 if __name__ == "__main__":
@@ -0,0 +1,147 @@
+import logging
+from datetime import timedelta
+
+from django.db.models import Max
+from django.utils import timezone
+from django_redis import get_redis_connection
+
+from config.settings import (
+    RESULTS_EXPIRY_DAYS,
+    PREWARM_DEMAND_WINDOW_DAYS,
+    PREWARM_MIN_SEARCHES,
+    PREWARM_LOOKAHEAD_DAYS,
+    PREWARM_SCRAPES_PER_HOUR,
+)
+from shopwiz.apps.core.models import BatchUpload, ScrapeRun
+from . import scrape_metrics, shop_freshness
+from .concurrent_tasks.update_products import SCRAPE_PRIORITY_PREWARM
+
+logger = logging.getLogger(__name__)
+
+DEMAND_KEY_PREFIX = "search_demand"
+BUDGET_KEY_PREFIX = "prewarm_budget"
+METRICS_NAME = "prewarm"
+# Most searched queries of a day taken into account when ranking
+MAX_QUERIES_PER_DAY = 1000
+
+
+def _demand_key(day) -> str:
+    return f"{DEMAND_KEY_PREFIX}:{day.isoformat()}"
+
+
+def record_search(query: str, batch, update_needed: bool):
+    """
+    Count a search towards the demand of its query and whether it was served
+    fresh results, and if so whether they were scraped by a prewarm. Best
+    effort like scrape_metrics, never fails the search.
+    """
+    try:
+        key = _demand_key(timezone.now().date())
+        connection = get_redis_connection("default")
+        pipeline = connection.pipeline()
+        pipeline.zincrby(key, 1, query)
+        pipeline.expire(key, timedelta(days=PREWARM_DEMAND_WINDOW_DAYS + 1))
+        pipeline.execute()
+    except Exception as e:
+        logger.warning(f"Failed to record demand of {query}: {e}")
+
+    scrape_metrics.incr(METRICS_NAME, "searches")
+    if batch is None or update_needed:
+        return
+    scrape_metrics.incr(METRICS_NAME, "served_fresh")
+    if ScrapeRun.objects.filter(batch=batch, priority=SCRAPE_PRIORITY_PREWARM).exists():
+        scrape_metrics.incr(METRICS_NAME, "served_prewarmed")
+
+
+def get_demand(days: int = PREWARM_DEMAND_WINDOW_DAYS):
+    """Number of searches per query over the last days, today included."""
+    today = timezone.now().date()
+    connection = get_redis_connection("default")
+    demand = {}
+    for days_ago in range(days):
+        day_demand = connection.zrevrange(
+            _demand_key(today - timedelta(days=days_ago)),
+            0,
+            MAX_QUERIES_PER_DAY - 1,
+            withscores=True,
+        )
+        for query, searches in day_demand:
+            query = query.decode()
+            demand[query] = demand.get(query, 0) + searches
+    return demand
+
+
+def days_until_stale(upload_date, today=None) -> int:
+    # Same cut-off as get_most_recent_and_check_freshness, 0 once stale
+    today = today or timezone.now().date()
+    stale_from = upload_date + timedelta(days=RESULTS_EXPIRY_DAYS)
+    return max((stale_from - today).days, 0)
+
+
+def rank_queries():
+    """
+    Queries with results that are stale or about to be, most searched and
+    soonest expiring first. Returns a list of (query, score) pairs.
+    """
+    demand = {
+        query: searches
+        for query, searches in get_demand().items()
+        if searches >= PREWARM_MIN_SEARCHES
+    }
+    latest_uploads = (
+        BatchUpload.objects.filter(query__in=demand, is_complete=True)
+        .values("query")
+        .annotate(latest_upload_date=Max("upload_date"))
+        .order_by()
+    )
+
+    # Batches carry forward older results of shops that weren't scraped again
+    oldest_scrape_dates = shop_freshness.oldest_scrape_dates(demand)
+
+    today = timezone.now().date()
+    ranked = []
+    for row in latest_uploads:
+        results_date = oldest_scrape_dates.get(row["query"], row["latest_upload_date"])
+        days_left = days_until_stale(results_date, today)
+        if days_left <= PREWARM_LOOKAHEAD_DAYS:
+            ranked.append((row["query"], demand[row["query"]] / (1 + days_left)))
+    return sorted(ranked, key=lambda item: item[1], reverse=True)
+
+
+def needs_prewarm(query: str) -> bool:
+    latest_batch = BatchUpload.objects.filter(query=query, is_complete=True).first()
+    if latest_batch is None:
+        return False
+    results_date = shop_freshness.oldest_scrape_dates([query]).get(
+        query, latest_batch.upload_date
+    )
+    return days_until_stale(results_date) <= PREWARM_LOOKAHEAD_DAYS
+
+
+def get_search_text(query: str) -> str:
+    # Shops are searched with the words a user last searched the query with
+    scrape_run = ScrapeRun.objects.filter(query=query).exclude(search_text="").first()
+    return scrape_run.search_text if scrape_run else query
+
+
+def take_budget() -> bool:
+    """Count a prewarm scrape against the budget of the current hour."""
+    key = f"{BUDGET_KEY_PREFIX}:{timezone.now().strftime('%Y%m%d%H')}"
+    connection = get_redis_connection("default")
+    pipeline = connection.pipeline()
+    pipeline.incr(key)
+    pipeline.expire(key, timedelta(hours=1))
+    used, _ = pipeline.execute()
+    return used <= PREWARM_SCRAPES_PER_HOUR
+
+
+def get_hit_rate():
+    metrics = scrape_metrics.get(METRICS_NAME)
+    searches = metrics.get("searches", 0)
+    return {
+        **metrics,
+        "fresh_rate": metrics.get("served_fresh", 0) / searches if searches else 0,
+        "prewarmed_rate": (
+            metrics.get("served_prewarmed", 0) / searches if searches else 0
+        ),
+    }
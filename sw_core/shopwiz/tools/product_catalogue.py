@@ -0,0 +1,184 @@
+import hashlib
+from collections import defaultdict, namedtuple
+
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from config.settings import RETENTION_CHUNK_SIZE
+from shopwiz.apps.core.models import Product, SearchedProduct, UrlPrefix
+
+TABLE = SearchedProduct._meta.db_table
+
+# Columns products had before the catalogue, see SearchedProduct
+LEGACY_COLUMNS = ("shop_name", "name", "product_url", "img_src")
+LegacyProduct = namedtuple("LegacyProduct", ["name", "product_url", "img_src"])
+
+# Fields of a catalogue product taken from the latest scrape that found it
+UPDATED_FIELDS = [
+    "name",
+    "product_url_prefix",
+    "product_url_path",
+    "img_src_prefix",
+    "img_src_path",
+]
+
+# Stored prefixes never change, so their ids are kept for the process lifetime
+_prefix_ids = {}
+
+
+def identity_of(product) -> int:
+    """Stable identity of a scraped product within its shop, a signed 64 bit int."""
+    key = product.product_url or product.name
+    digest = hashlib.blake2b(key.encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "big", signed=True)
+
+
+def split_url(url):
+    """
+    Prefix shared by many URLs of a shop and the rest of the URL. The prefix
+    ends before the first directory with a digit in it, where product ids and
+    slugs tend to start, or else at the last slash before the query string.
+    """
+    if url is None:
+        return None, ""
+    query_start = url.find("?")
+    path_end = query_start if query_start != -1 else len(url)
+    path_start = url.find("/", url.find("://") + 3) + 1
+    if not 0 < path_start <= path_end:
+        return url[:path_end], url[path_end:]
+
+    prefix_end = path_start
+    for directory in url[path_start:path_end].split("/")[:-1]:
+        if any(character.isdigit() for character in directory):
+            break
+        prefix_end += len(directory) + 1
+    return url[:prefix_end], url[prefix_end:]
+
+
+def get_prefix_ids(prefixes):
+    missing_prefixes = {
+        prefix
+        for prefix in prefixes
+        if prefix is not None and prefix not in _prefix_ids
+    }
+    if missing_prefixes:
+        UrlPrefix.objects.bulk_create(
+            [UrlPrefix(prefix=prefix) for prefix in missing_prefixes],
+            ignore_conflicts=True,
+        )
+        _prefix_ids.update(
+            UrlPrefix.objects.filter(prefix__in=missing_prefixes).values_list(
+                "prefix", "id"
+            )
+        )
+    return _prefix_ids
+
+
+def catalogue_fields(product, prefix_ids):
+    product_url_prefix, product_url_path = split_url(product.product_url)
+    img_src_prefix, img_src_path = split_url(product.img_src)
+    return {
+        "name": product.name,
+        "product_url_prefix_id": prefix_ids.get(product_url_prefix),
+        "product_url_path": product_url_path,
+        "img_src_prefix_id": prefix_ids.get(img_src_prefix),
+        "img_src_path": img_src_path,
+    }
+
+
+def get_product_ids(shop_name: str, products):
+    """
+    Catalogue product ids of scraped products, in the same order. Products new
+    to the catalogue are added, the names and URLs of the others updated to
+    the scraped ones if they changed.
+    """
+    identities = [identity_of(product) for product in products]
+    # Marked seen before they are read, so that a purge of products no batch
+    # has leaves them alone from here on, see retention.purge_old_batches
+    today = timezone.now().date()
+    Product.objects.filter(shop_name=shop_name, identity__in=set(identities)).exclude(
+        last_seen=today
+    ).update(last_seen=today)
+    catalogue = {
+        product.identity: product
+        for product in Product.objects.filter(
+            shop_name=shop_name, identity__in=set(identities)
+        )
+    }
+    prefix_ids = get_prefix_ids(
+        split_url(url)[0]
+        for product in products
+        for url in (product.product_url, product.img_src)
+    )
+
+    new_products = {}
+    changed_products = {}
+    for identity, product in zip(identities, products):
+        fields = catalogue_fields(product, prefix_ids)
+        catalogue_product = catalogue.get(identity)
+        if catalogue_product is None:
+            new_products[identity] = Product(
+                shop_name=shop_name, identity=identity, **fields
+            )
+        elif any(
+            getattr(catalogue_product, field) != value
+            for field, value in fields.items()
+        ):
+            for field, value in fields.items():
+                setattr(catalogue_product, field, value)
+            changed_products[identity] = catalogue_product
+
+    if new_products:
+        # Another scrape of the shop may add the same products meanwhile
+        Product.objects.bulk_create(new_products.values(), ignore_conflicts=True)
+        catalogue.update(
+            (product.identity, product)
+            for product in Product.objects.filter(
+                shop_name=shop_name, identity__in=new_products
+            ).only("id", "identity")
+        )
+    if changed_products:
+        Product.objects.bulk_update(changed_products.values(), UPDATED_FIELDS)
+    return [catalogue[identity].id for identity in identities]
+
+
+def has_legacy_columns() -> bool:
+    with connection.cursor() as cursor:
+        columns = {
+            column.name
+            for column in connection.introspection.get_table_description(cursor, TABLE)
+        }
+    return set(LEGACY_COLUMNS) <= columns
+
+
+def backfill_products(chunk_size: int = RETENTION_CHUNK_SIZE) -> int:
+    """
+    Link products saved before the catalogue to catalogue products made from
+    the name and URL columns they still have, chunk_size ids at a time.
+    Returns the products linked.
+    """
+    last_id = SearchedProduct.objects.aggregate(Max("id"))["id__max"] or 0
+    linked = 0
+    for start in range(0, last_id + 1, chunk_size):
+        with transaction.atomic():
+            unlinked = SearchedProduct.objects.filter(
+                id__gte=start, id__lt=start + chunk_size, product__isnull=True
+            ).only("id", *LEGACY_COLUMNS)
+            rows_per_shop = defaultdict(list)
+            for row in unlinked:
+                rows_per_shop[row.shop_name].append(row)
+
+            for shop_name, rows in rows_per_shop.items():
+                product_ids = get_product_ids(
+                    shop_name,
+                    [
+                        LegacyProduct(row.name, row.product_url, row.img_src)
+                        for row in rows
+                    ],
+                )
+                for row, product_id in zip(rows, product_ids):
+                    row.product_id = product_id
+                SearchedProduct.objects.bulk_update(rows, ["product"])
+                linked += len(rows)
+    return linked
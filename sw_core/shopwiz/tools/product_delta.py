@@ -0,0 +1,98 @@
+from shopwiz.apps.core.models import QueryShopFreshness, SearchedProduct
+from . import product_catalogue
+
+# A previous row of the same catalogue product is reused only if it matches on
+# all of these, names and URLs are kept up to date by the catalogue itself
+COMPARED_FIELDS = ("price", "price_per_unit", "unit_type", "unit_measurement")
+
+
+def product_values(product):
+    # Rounded to the decimal places SearchedProduct stores
+    return (
+        round(float(product.price), 2),
+        round(float(product.price_per_unit), 2),
+        product.unit_type,
+        round(float(product.unit_measurement), 3),
+    )
+
+
+def previous_batch_id(query: str, shop_name: str, batch_id: int):
+    """Batch holding the latest products of the shop for the query."""
+    freshness = QueryShopFreshness.objects.filter(
+        query=query, shop_name=shop_name
+    ).first()
+    if freshness and freshness.batch_id not in (None, batch_id):
+        return freshness.batch_id
+    # Queries scraped before shops were tracked
+    return (
+        SearchedProduct.objects.filter(batch__query=query, product__shop_name=shop_name)
+        .exclude(batch_id=batch_id)
+        .order_by("-batch_id")
+        .values_list("batch_id", flat=True)
+        .first()
+    )
+
+
+class BatchDelta:
+    """
+    Saves the products of a scrape into its batch, reusing the rows of the
+    previous batch of the query for products that haven't changed since. Reused
+    rows are copied into the new batch from the database values, the previous
+    batch keeps its own rows for as long as it is kept.
+    """
+
+    def __init__(self, query: str, batch):
+        self.query = query
+        self.batch = batch
+        self.scraped_per_shop = {}
+        self.written_per_shop = {}
+        self._previous_rows_per_shop = {}
+
+    def _previous_rows(self, shop_name):
+        if shop_name not in self._previous_rows_per_shop:
+            rows = {}
+            batch_id = previous_batch_id(self.query, shop_name, self.batch.id)
+            if batch_id is not None:
+                previous_products = SearchedProduct.objects.filter(
+                    batch_id=batch_id, product__shop_name=shop_name
+                ).only("id", "product_id", *COMPARED_FIELDS)
+                for row in previous_products:
+                    rows.setdefault(row.product_id, []).append(row)
+            self._previous_rows_per_shop[shop_name] = rows
+        return self._previous_rows_per_shop[shop_name]
+
+    def save(self, shop_name: str, products):
+        product_ids = product_catalogue.get_product_ids(shop_name, products)
+        previous_rows = self._previous_rows(shop_name)
+        rows = []
+        written = 0
+        for product, product_id in zip(products, product_ids):
+            values = product_values(product)
+            candidates = previous_rows.get(product_id, [])
+            match = next(
+                (row for row in candidates if product_values(row) == values), None
+            )
+            if match is None:
+                rows.append(product.to_searched_product(self.batch, product_id))
+                written += 1
+            else:
+                # Each previous row is reused once, even if listed twice
+                candidates.remove(match)
+                rows.append(self._copy(match))
+        SearchedProduct.objects.bulk_create(rows)
+
+        self.scraped_per_shop[shop_name] = self.scraped_per_shop.get(
+            shop_name, 0
+        ) + len(products)
+        self.written_per_shop[shop_name] = (
+            self.written_per_shop.get(shop_name, 0) + written
+        )
+        return self.scraped_per_shop[shop_name]
+
+    def _copy(self, row):
+        return SearchedProduct(
+            batch=self.batch,
+            product_id=row.product_id,
+            **{field: getattr(row, field) for field in COMPARED_FIELDS},
+            upload_date=self.batch.upload_date,
+        )
@@ -0,0 +1,220 @@
+import re
+from datetime import date, timedelta
+
+from django.db import connection, transaction
+from django.db.models import F, Max, OuterRef, Subquery
+from django.utils import timezone
+
+from config.settings import (
+    PRODUCT_PARTITION_INTERVAL,
+    PRODUCT_PARTITIONS_AHEAD,
+    PRODUCT_PARTITION_KEEP_DAYS,
+    RETENTION_CHUNK_SIZE,
+)
+from shopwiz.apps.core.models import BatchUpload, Product, SearchedProduct
+from . import retention
+
+TABLE = SearchedProduct._meta.db_table
+UNPARTITIONED_TABLE = f"{TABLE}_unpartitioned"
+ID_SEQUENCE = f"{TABLE}_partitioned_id_seq"
+BOUND_PATTERN = re.compile(r"FROM \('([\d-]+)'\) TO \('([\d-]+)'\)")
+
+# Tables are never turned back, so once seen partitioned that is kept for the
+# process lifetime rather than looked up on every search
+_is_partitioned = False
+
+
+def backfill_upload_dates(chunk_size: int = RETENTION_CHUNK_SIZE) -> int:
+    """
+    Copy the upload date of their batch onto products saved before it was
+    denormalized, chunk_size ids at a time. Returns the products updated.
+    """
+    batch_upload_date = Subquery(
+        BatchUpload.objects.filter(id=OuterRef("batch_id")).values("upload_date")[:1]
+    )
+    last_id = SearchedProduct.objects.aggregate(Max("id"))["id__max"] or 0
+    updated = 0
+    for start in range(0, last_id + 1, chunk_size):
+        updated += (
+            SearchedProduct.objects.filter(id__gte=start, id__lt=start + chunk_size)
+            .exclude(upload_date=F("batch__upload_date"))
+            .update(upload_date=batch_upload_date)
+        )
+    return updated
+
+
+def is_supported() -> bool:
+    # Declarative partitioning is PostgreSQL only, other databases keep one table
+    return connection.vendor == "postgresql"
+
+
+def is_partitioned() -> bool:
+    global _is_partitioned
+    if _is_partitioned or not is_supported():
+        return _is_partitioned
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT 1 FROM pg_partitioned_table "
+            "JOIN pg_class ON pg_class.oid = partrelid WHERE relname = %s",
+            [TABLE],
+        )
+        _is_partitioned = cursor.fetchone() is not None
+    return _is_partitioned
+
+
+def interval_start(day: date, interval: str = PRODUCT_PARTITION_INTERVAL) -> date:
+    if interval == "week":
+        return day - timedelta(days=day.weekday())
+    return day.replace(day=1)
+
+
+def next_interval_start(start: date, interval: str = PRODUCT_PARTITION_INTERVAL):
+    if interval == "week":
+        return start + timedelta(weeks=1)
+    return (start + timedelta(days=32)).replace(day=1)
+
+
+def list_partitions():
+    """Name, first upload date and end upload date of every partition, by date."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT child.relname, pg_get_expr(child.relpartbound, child.oid) "
+            "FROM pg_inherits "
+            "JOIN pg_class parent ON parent.oid = inhparent "
+            "JOIN pg_class child ON child.oid = inhrelid "
+            "WHERE parent.relname = %s",
+            [TABLE],
+        )
+        rows = cursor.fetchall()
+
+    partitions = []
+    for name, bound in rows:
+        match = BOUND_PATTERN.search(bound)
+        if match:
+            partitions.append(
+                (name, date.fromisoformat(match[1]), date.fromisoformat(match[2]))
+            )
+    return sorted(partitions, key=lambda partition: partition[1])
+
+
+def create_partitions(
+    first_day: date, last_day: date, interval: str = PRODUCT_PARTITION_INTERVAL
+):
+    """
+    Create the partitions missing for upload dates from first_day through
+    last_day. Returns the names of the partitions created.
+    """
+    existing_bounds = [(start, end) for _, start, end in list_partitions()]
+    created = []
+    start = interval_start(first_day, interval)
+    with connection.cursor() as cursor:
+        while start <= last_day:
+            end = next_interval_start(start, interval)
+            # Ranges left by another interval setting are kept as they are
+            if not any(
+                start < existing_end and existing_start < end
+                for existing_start, existing_end in existing_bounds
+            ):
+                name = f"{TABLE}_p{start:%Y%m%d}"
+                cursor.execute(
+                    f'CREATE TABLE "{name}" PARTITION OF "{TABLE}" '
+                    f"FOR VALUES FROM ('{start}') TO ('{end}')"
+                )
+                created.append(name)
+            start = end
+    return created
+
+
+def create_future_partitions(
+    ahead: int = PRODUCT_PARTITIONS_AHEAD, interval: str = PRODUCT_PARTITION_INTERVAL
+):
+    today = timezone.now().date()
+    last_day = interval_start(today, interval)
+    for _ in range(ahead):
+        last_day = next_interval_start(last_day, interval)
+    return create_partitions(today, last_day, interval)
+
+
+def drop_expired_partitions(keep_days: int = PRODUCT_PARTITION_KEEP_DAYS):
+    """
+    Drop whole partitions whose upload dates are all older than keep_days, and
+    the batches they held products of. Unlike purge_old_batches no row is
+    deleted one by one, so a partition is only dropped once every batch in it
+    is one purge_old_batches would delete too.
+    """
+    expired_before = timezone.now().date() - timedelta(days=keep_days)
+    expired_batch_ids = set(retention.expired_batch_ids(keep_days=keep_days))
+    dropped = []
+    for name, start, end in list_partitions():
+        if end > expired_before:
+            continue
+        batch_ids = set(
+            BatchUpload.objects.filter(
+                upload_date__gte=start, upload_date__lt=end
+            ).values_list("id", flat=True)
+        )
+        # Latest batches of a query and those still serving a shop are kept,
+        # and with them the partition holding their products
+        if not batch_ids <= expired_batch_ids:
+            continue
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                cursor.execute(f'ALTER TABLE "{TABLE}" DETACH PARTITION "{name}"')
+                cursor.execute(f'DROP TABLE "{name}"')
+            # Scrape runs and shop freshness of the batches are kept detached,
+            # catalogue products left without a batch go with purge_old_batches
+            BatchUpload.objects.filter(id__in=batch_ids).delete()
+        dropped.append(name)
+    return dropped
+
+
+def maintain():
+    return create_future_partitions(), drop_expired_partitions()
+
+
+def convert(interval: str = PRODUCT_PARTITION_INTERVAL):
+    """
+    Turn the SearchedProduct table into one partitioned by upload_date, with
+    partitions from its oldest product through PRODUCT_PARTITIONS_AHEAD. Rows
+    are copied in a single transaction, the table is locked until it is done.
+    Partitioned tables need the partition key in their primary key, which
+    becomes (id, upload_date) with ids still unique through their sequence.
+    """
+    # Rows land in the partition of their batch
+    backfill_upload_dates()
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f'ALTER TABLE "{TABLE}" RENAME TO "{UNPARTITIONED_TABLE}"')
+        cursor.execute(
+            f'CREATE TABLE "{TABLE}" (LIKE "{UNPARTITIONED_TABLE}" '
+            "INCLUDING DEFAULTS INCLUDING CONSTRAINTS) "
+            "PARTITION BY RANGE (upload_date)"
+        )
+        cursor.execute(f'ALTER TABLE "{TABLE}" ADD PRIMARY KEY (id, upload_date)')
+        cursor.execute(f'CREATE SEQUENCE "{ID_SEQUENCE}" OWNED BY "{TABLE}".id')
+        cursor.execute(
+            f'ALTER TABLE "{TABLE}" ALTER COLUMN id '
+            f"SET DEFAULT nextval('\"{ID_SEQUENCE}\"')"
+        )
+        # Foreign keys and their indexes aren't copied by LIKE
+        for column, model in (("batch_id", BatchUpload), ("product_id", Product)):
+            cursor.execute(
+                f'CREATE INDEX "{TABLE}_partitioned_{column}" ON "{TABLE}" ({column})'
+            )
+            constraint = f"{TABLE}_partitioned_{column}_fk"
+            cursor.execute(
+                f'ALTER TABLE "{TABLE}" ADD CONSTRAINT "{constraint}" '
+                f'FOREIGN KEY ({column}) REFERENCES "{model._meta.db_table}" (id) '
+                "DEFERRABLE INITIALLY DEFERRED"
+            )
+
+        cursor.execute(f'SELECT MIN(upload_date) FROM "{UNPARTITIONED_TABLE}"')
+        oldest_day = cursor.fetchone()[0] or timezone.now().date()
+        create_partitions(oldest_day, timezone.now().date(), interval)
+        create_future_partitions(interval=interval)
+
+        cursor.execute(f'INSERT INTO "{TABLE}" SELECT * FROM "{UNPARTITIONED_TABLE}"')
+        cursor.execute(
+            f"SELECT setval('\"{ID_SEQUENCE}\"', "
+            f'(SELECT COALESCE(MAX(id), 0) + 1 FROM "{TABLE}"), false)'
+        )
+        cursor.execute(f'DROP TABLE "{UNPARTITIONED_TABLE}"')
@@ -0,0 +1,65 @@
+from datetime import timedelta
+from itertools import combinations
+
+from django.utils import timezone
+
+from config.settings import RESULTS_EXPIRY_DAYS, PROVISIONAL_MAX_QUERY_WORDS
+from shopwiz.apps.core.models import BatchUpload, SearchedProduct
+from . import scrape_metrics
+from .query_canonicalizer import canonicalize
+
+METRICS_NAME = "provisional"
+
+
+def broader_queries(query: str):
+    """
+    Canonical queries made of some of the words of a canonical query, the ones
+    with the most words first.
+    """
+    words = query.split()
+    if len(words) > PROVISIONAL_MAX_QUERY_WORDS:
+        return []
+    # Canonical words are sorted, so are the combinations of them
+    return [
+        " ".join(subset)
+        for size in range(len(words) - 1, 0, -1)
+        for subset in combinations(words, size)
+    ]
+
+
+def find_provisional_products(query: str):
+    """
+    Products of the freshest batch of a broader query that match the words it
+    lacks, shown while the query itself is scraped for the first time. Returns
+    the broader batch and its matching products, or (None, None).
+    """
+    candidates = broader_queries(query)
+    if not candidates:
+        return None, None
+
+    # Same freshness as get_most_recent_and_check_freshness
+    fresh_after = timezone.now().date() - timedelta(days=RESULTS_EXPIRY_DAYS)
+    batches = BatchUpload.objects.filter(
+        query__in=candidates, upload_date__gt=fresh_after
+    ).servable()
+    # Most specific query first, newest batch of it when there are several
+    batch = max(batches, key=lambda batch: len(batch.query.split()), default=None)
+    if batch is None:
+        scrape_metrics.incr(METRICS_NAME, "missed")
+        return None, None
+
+    missing_words = set(query.split()) - set(batch.query.split())
+    # Names are canonicalized like queries, so plurals and synonyms match too
+    products = SearchedProduct.objects.get_queryset().in_batch(batch)
+    names = products.values_list("id", "product__name")
+    matching_ids = [
+        product_id
+        for product_id, name in names
+        if missing_words <= set(canonicalize(name).split())
+    ]
+    if not matching_ids:
+        scrape_metrics.incr(METRICS_NAME, "missed")
+        return None, None
+
+    scrape_metrics.incr(METRICS_NAME, "served")
+    return batch, products.filter(id__in=matching_ids).with_catalogue()
@@ -0,0 +1,97 @@
+import json
+import os
+import re
+from functools import lru_cache
+
+from config.settings import QUERY_SYNONYMS_PATH
+
+# Words that don't change what a shop finds for a query
+STOP_WORDS = frozenset(
+    ["a", "an", "and", "the", "of", "with", "for", "in", "on", "or", "to"]
+)
+# Plurals the suffix rules below get wrong
+IRREGULAR_PLURALS = {
+    "loaves": "loaf",
+    "leaves": "leaf",
+    "halves": "half",
+    "knives": "knife",
+    "potatoes": "potato",
+    "tomatoes": "tomato",
+    "mangoes": "mango",
+    "cookies": "cookie",
+    "smoothies": "smoothie",
+    "brownies": "brownie",
+    "veggies": "veggie",
+}
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:\.[0-9]+[a-z]*)?")
+
+
+def singularize(token: str) -> str:
+    if token in IRREGULAR_PLURALS:
+        return IRREGULAR_PLURALS[token]
+    if len(token) <= 3 or not token.isalpha():
+        return token
+    if token.endswith("ies"):
+        return token[:-3] + "y"
+    if token.endswith(("ches", "shes", "sses", "xes")):
+        return token[:-2]
+    if token.endswith("s") and not token.endswith(("ss", "us", "is")):
+        return token[:-1]
+    return token
+
+
+def normalize_words(text: str) -> str:
+    cleaned_text = clean_query(text).replace("'", "")
+    return " ".join(map(singularize, TOKEN_PATTERN.findall(cleaned_text)))
+
+
+@lru_cache(maxsize=1)
+def _load_synonyms(path: str, modified_time: float):
+    """
+    Compiles the synonym table into one pattern matching any of its phrases,
+    longest first. Cached until the file changes.
+    """
+    with open(path, encoding="utf-8") as synonyms_file:
+        table = json.load(synonyms_file)
+
+    # Phrases are matched after plurals are folded, so variants needn't list them
+    replacements = {
+        normalize_words(variant): normalize_words(canonical)
+        for canonical, variants in table.items()
+        for variant in variants
+    }
+    if not replacements:
+        return None, {}
+    phrases = sorted(replacements, key=len, reverse=True)
+    pattern = re.compile(r"\b(" + "|".join(map(re.escape, phrases)) + r")\b")
+    return pattern, replacements
+
+
+def get_synonyms():
+    try:
+        modified_time = os.path.getmtime(QUERY_SYNONYMS_PATH)
+    except OSError:
+        return None, {}
+    return _load_synonyms(str(QUERY_SYNONYMS_PATH), modified_time)
+
+
+def clean_query(query: str) -> str:
+    # Same cleaning as SearchedProductParamsSerialiser.validate_query
+    return re.sub(r"\s+", " ", query.strip()).lower()
+
+
+def canonicalize(query: str) -> str:
+    """
+    Key shared by queries a shop would answer with the same products, e.g.
+    "Semi Skimmed Milks" and "milk, low fat" both become "fat low milk".
+    Words are folded to their singular, synonyms replaced, stop words dropped
+    and the remaining words put in alphabetical order.
+    """
+    words = normalize_words(query)
+    pattern, replacements = get_synonyms()
+    if pattern is not None:
+        words = pattern.sub(lambda match: replacements[match.group(1)], words)
+
+    tokens = {token for token in words.split() if token not in STOP_WORDS}
+    # A query of nothing but stop words is kept as it is
+    return " ".join(sorted(tokens)) or clean_query(query)
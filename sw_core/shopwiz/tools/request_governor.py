@@ -0,0 +1,99 @@
+import asyncio
+import logging
+import time
+
+from django_redis import get_redis_connection
+
+from config.settings import (
+    SCRAPER_SHOP_REQUESTS_PER_SECOND,
+    SCRAPER_SHOP_BURST,
+    SCRAPER_RATE_LIMIT_MAX_WAIT_SECONDS,
+)
+from . import scrape_metrics
+
+logger = logging.getLogger(__name__)
+
+BUCKET_KEY_PREFIX = "shop_requests"
+METRICS_NAME = "governor"
+
+# Token bucket refilled at ARGV[1] tokens per second up to ARGV[2]. A request
+# takes a token that may only come in the future, so tokens go negative while
+# requests queue for their turn, unless the turn is more than ARGV[3] seconds
+# away. Returns whether the turn was taken and the seconds to wait for it. The
+# redis clock is shared by every worker.
+RESERVE_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local max_wait = tonumber(ARGV[3])
+local clock = redis.call("TIME")
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local bucket = redis.call("HMGET", KEYS[1], "tokens", "updated_at")
+local tokens = tonumber(bucket[1]) or burst
+local updated_at = tonumber(bucket[2]) or now
+tokens = math.min(burst, tokens + (now - updated_at) * rate)
+local wait = 0
+if tokens < 1 then
+    wait = (1 - tokens) / rate
+end
+if wait > max_wait then
+    return {0, tostring(wait)}
+end
+redis.call("HSET", KEYS[1], "tokens", tostring(tokens - 1), "updated_at", tostring(now))
+redis.call("EXPIRE", KEYS[1], math.ceil((burst + max_wait * rate) / rate) + 60)
+return {1, tostring(wait)}
+"""
+
+
+class ShopRateLimited(Exception):
+    pass
+
+
+def _key(shop_name: str) -> str:
+    return f"{BUCKET_KEY_PREFIX}:{shop_name}"
+
+
+def reserve(shop_name: str, max_wait: float = SCRAPER_RATE_LIMIT_MAX_WAIT_SECONDS):
+    """
+    Take the next turn to send the shop a request, shared by every worker.
+    Returns the seconds to wait before sending it, or raises ShopRateLimited
+    if the turn is further away than max_wait. Shops without a rate, or a
+    failing redis, never make a request wait.
+    """
+    rate = SCRAPER_SHOP_REQUESTS_PER_SECOND.get(shop_name)
+    if not rate:
+        return 0
+
+    burst = SCRAPER_SHOP_BURST.get(shop_name, 1)
+    try:
+        connection = get_redis_connection("default")
+        taken, wait = connection.register_script(RESERVE_SCRIPT)(
+            keys=[_key(shop_name)], args=[rate, burst, max_wait]
+        )
+    except Exception as e:
+        logger.warning(f"Failed to take a request turn of {shop_name}: {e}")
+        return 0
+
+    wait = float(wait)
+    name = f"{METRICS_NAME}:{shop_name}"
+    if not taken:
+        scrape_metrics.incr(name, "rejected")
+        raise ShopRateLimited(
+            f"{shop_name} request rate exceeded, next turn in {wait:.1f}s"
+        )
+    scrape_metrics.incr(name, "requests")
+    if wait > 0:
+        scrape_metrics.incr(name, "waited")
+        scrape_metrics.incr(name, "wait_total", wait)
+    return wait
+
+
+def wait_for_turn(shop_name: str):
+    wait = reserve(shop_name)
+    if wait > 0:
+        time.sleep(wait)
+
+
+async def wait_for_turn_async(shop_name: str):
+    wait = reserve(shop_name)
+    if wait > 0:
+        await asyncio.sleep(wait)
@@ -0,0 +1,141 @@
+import time
+from datetime import timedelta
+
+from django.db import connection
+from django.db.models import Count, F, Max, Sum, Window
+from django.db.models.functions import Length, RowNumber
+from django.utils import timezone
+
+from config.settings import (
+    RETENTION_KEEP_BATCHES,
+    RETENTION_KEEP_DAYS,
+    RETENTION_CHUNK_SIZE,
+    RETENTION_CHUNK_PAUSE_SECONDS,
+)
+from shopwiz.apps.core.models import (
+    BatchUpload,
+    Product,
+    QueryShopFreshness,
+    SearchedProduct,
+)
+
+METRICS_NAME = "retention"
+# Ids, prices, units and row header of a product in a batch
+SEARCHED_PRODUCT_ROW_BYTES = 64
+# Ids and row header of a catalogue product, on top of its text columns
+CATALOGUE_ROW_OVERHEAD_BYTES = 48
+CATALOGUE_TEXT_LENGTH = (
+    Length("name")
+    + Length("shop_name")
+    + Length("product_url_path")
+    + Length("img_src_path")
+)
+# Rechecks that no batch has the products in the statement deleting them, as a
+# scrape may add them to one at any time. Table names are quoted for the
+# database in use, see delete_orphans_sql
+DELETE_ORPHANS_SQL = (
+    "DELETE FROM {catalogue} WHERE id >= %s AND id < %s AND last_seen < %s "
+    "AND NOT EXISTS (SELECT 1 FROM {memberships} "
+    "WHERE {memberships}.product_id = {catalogue}.id)"
+)
+
+
+def delete_orphans_sql() -> str:
+    quote_name = connection.ops.quote_name
+    return DELETE_ORPHANS_SQL.format(
+        catalogue=quote_name(Product._meta.db_table),
+        memberships=quote_name(SearchedProduct._meta.db_table),
+    )
+
+
+def expired_batch_ids(
+    keep_batches: int = RETENTION_KEEP_BATCHES, keep_days: int = RETENTION_KEEP_DAYS
+):
+    """
+    Complete batches that are older than keep_days and not among the
+    keep_batches newest of their query. Batches still holding the latest good
+    products of a shop are kept whatever their age.
+    """
+    kept_after = timezone.now().date() - timedelta(days=keep_days)
+    ranked_batches = BatchUpload.objects.annotate(
+        rank=Window(
+            RowNumber(),
+            partition_by=F("query"),
+            order_by=[F("upload_date").desc(), F("id").desc()],
+        )
+    )
+    # Filtered on age after ranking, other filters would apply before it
+    batch_ids = [
+        batch_id
+        for batch_id, upload_date, is_complete in ranked_batches.filter(
+            rank__gt=keep_batches
+        ).values_list("id", "upload_date", "is_complete")
+        if upload_date < kept_after and is_complete
+    ]
+    carried_batch_ids = set(
+        QueryShopFreshness.objects.filter(batch__isnull=False).values_list(
+            "batch_id", flat=True
+        )
+    )
+    return sorted(set(batch_ids) - carried_batch_ids)
+
+
+def purge_old_batches(
+    keep_batches: int = RETENTION_KEEP_BATCHES,
+    keep_days: int = RETENTION_KEEP_DAYS,
+    chunk_size: int = RETENTION_CHUNK_SIZE,
+    pause: float = RETENTION_CHUNK_PAUSE_SECONDS,
+):
+    """
+    Delete expired batches and their products, then the catalogue products no
+    batch has anymore that no scrape found for keep_days either, at most
+    chunk_size rows per statement. Returns the batches, product rows and
+    catalogue products deleted, and roughly how many bytes of product data
+    that was.
+    """
+    batch_ids = expired_batch_ids(keep_batches, keep_days)
+    report = {"batches": 0, "rows": 0, "catalogue_products": 0, "bytes": 0}
+    for start in range(0, len(batch_ids), chunk_size):
+        batch_chunk = batch_ids[start : start + chunk_size]
+        while True:
+            product_ids = list(
+                SearchedProduct.objects.filter(batch_id__in=batch_chunk).values_list(
+                    "id", flat=True
+                )[:chunk_size]
+            )
+            if not product_ids:
+                break
+            SearchedProduct.objects.filter(id__in=product_ids).delete()
+            report["rows"] += len(product_ids)
+            report["bytes"] += len(product_ids) * SEARCHED_PRODUCT_ROW_BYTES
+            time.sleep(pause)
+
+        # Scrape runs of the batches are kept, telemetry outlives the results
+        BatchUpload.objects.filter(id__in=batch_chunk).delete()
+        report["batches"] += len(batch_chunk)
+
+    # Scrapes mark the products they find as seen before reading them, see
+    # product_catalogue.get_product_ids, so none of those is deleted under them
+    seen_before = timezone.now().date() - timedelta(days=keep_days)
+    newest_catalogue_id = Product.objects.aggregate(Max("id"))["id__max"] or 0
+    for start in range(0, newest_catalogue_id + 1, chunk_size):
+        orphans = Product.objects.filter(
+            id__gte=start,
+            id__lt=start + chunk_size,
+            last_seen__lt=seen_before,
+            memberships__isnull=True,
+        ).aggregate(count=Count("id"), text_bytes=Sum(CATALOGUE_TEXT_LENGTH))
+        if not orphans["count"]:
+            continue
+        with connection.cursor() as cursor:
+            cursor.execute(
+                delete_orphans_sql(), [start, start + chunk_size, seen_before]
+            )
+            deleted = cursor.rowcount
+        report["catalogue_products"] += deleted
+        report["bytes"] += (
+            orphans["text_bytes"] * deleted // orphans["count"]
+            + deleted * CATALOGUE_ROW_OVERHEAD_BYTES
+        )
+        time.sleep(pause)
+    return report
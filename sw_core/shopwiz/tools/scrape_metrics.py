@@ -0,0 +1,40 @@
+import logging
+
+from django_redis import get_redis_connection
+
+logger = logging.getLogger(__name__)
+
+METRICS_KEY_PREFIX = "scrape_metrics"
+
+
+def _key(name: str) -> str:
+    return f"{METRICS_KEY_PREFIX}:{name}"
+
+
+def incr(name: str, field: str, amount=1):
+    """
+    Add to a counter stored in a redis hash. Metrics are best effort and must
+    never break a scrape, so redis errors are only logged.
+    """
+    try:
+        connection = get_redis_connection("default")
+        if isinstance(amount, float):
+            connection.hincrbyfloat(_key(name), field, amount)
+        else:
+            connection.hincrby(_key(name), field, amount)
+    except Exception as e:
+        logger.warning(f"Failed to record metric {name}.{field}: {e}")
+
+
+def get(name: str):
+    connection = get_redis_connection("default")
+    return {
+        field.decode(): float(value)
+        for field, value in connection.hgetall(_key(name)).items()
+    }
+
+
+def record_strategy(shop_name: str, strategy: str, success: bool, latency: float):
+    name = f"strategy:{shop_name}:{strategy}"
+    incr(name, "success" if success else "failure")
+    incr(name, "latency_total", float(latency))
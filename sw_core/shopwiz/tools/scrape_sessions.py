@@ -0,0 +1,159 @@
+import json
+import logging
+import time
+
+from django_redis import get_redis_connection
+
+from config.settings import (
+    SCRAPER_ENGINE,
+    SCRAPER_ASYNC_CONCURRENCY,
+    SCRAPER_SESSION_MAX_QUERIES,
+)
+from . import scrape_metrics
+
+logger = logging.getLogger(__name__)
+
+QUEUE_KEY_PREFIX = "scrape_session_queue"
+JOB_KEY_PREFIX = "scrape_session_job"
+RESULT_KEY_PREFIX = "scrape_session_result"
+METRICS_NAME = "scrape_sessions"
+
+# Jobs and their results outlive the longest scrape of a shop by far
+JOB_TTL_SECONDS = 3600
+
+# Queued jobs are ordered by priority first, then by the time they were queued
+PRIORITY_SPACING = 10**10
+
+# Takes the job of the calling task off the queue of its shop, along with the
+# first ARGV[2] - 1 other queued jobs of the same or a more urgent priority.
+# Returns nothing when the job wasn't queued anymore.
+CLAIM_SCRIPT = """
+local score = redis.call("ZSCORE", KEYS[1], ARGV[1])
+if not score then
+    return {}
+end
+redis.call("ZREM", KEYS[1], ARGV[1])
+local job_ids = {ARGV[1]}
+local room = tonumber(ARGV[2]) - 1
+if room > 0 then
+    local spacing = tonumber(ARGV[3])
+    local priority = math.floor(tonumber(score) / spacing)
+    local max_score = string.format("(%.0f", (priority + 1) * spacing)
+    local queued = redis.call(
+        "ZRANGEBYSCORE", KEYS[1], "-inf", max_score, "LIMIT", 0, room
+    )
+    for _, job_id in ipairs(queued) do
+        redis.call("ZREM", KEYS[1], job_id)
+        table.insert(job_ids, job_id)
+    end
+end
+return job_ids
+"""
+
+
+def _queue_key(shop_name: str) -> str:
+    return f"{QUEUE_KEY_PREFIX}:{shop_name}"
+
+
+def _job_key(job_id: str) -> str:
+    return f"{JOB_KEY_PREFIX}:{job_id}"
+
+
+def _result_key(job_id: str) -> str:
+    return f"{RESULT_KEY_PREFIX}:{job_id}"
+
+
+def job_id_of(batch_id: int, shop_name: str) -> str:
+    return f"{batch_id}:{shop_name}"
+
+
+def max_queries() -> int:
+    """
+    Queries a session takes on at most. The sync engine would scrape them one
+    after another, which the time limit of a single scrape doesn't fit, and
+    async sessions keep to a tab per query.
+    """
+    if SCRAPER_ENGINE == "sync":
+        return 1
+    return min(SCRAPER_SESSION_MAX_QUERIES, SCRAPER_ASYNC_CONCURRENCY)
+
+
+def enqueue(shop_name: str, job: dict, priority: int):
+    """
+    Queue the scrape of a shop into a batch, so that whichever scrape task of
+    the shop starts first can take it on. The job holds the arguments of the
+    scrape task of its batch.
+    """
+    if max_queries() <= 1:
+        return
+
+    job_id = job_id_of(job["batch_id"], shop_name)
+    connection = get_redis_connection("default")
+    pipeline = connection.pipeline()
+    pipeline.set(_job_key(job_id), json.dumps(job), ex=JOB_TTL_SECONDS)
+    pipeline.zadd(
+        _queue_key(shop_name), {job_id: priority * PRIORITY_SPACING + time.time()}
+    )
+    pipeline.expire(_queue_key(shop_name), JOB_TTL_SECONDS)
+    pipeline.execute()
+
+
+def claim(shop_name: str, batch_id: int):
+    """
+    Take the job of the calling task off the queue of its shop, along with
+    queued jobs of other batches up to max_queries() in all. Jobs of a less
+    urgent priority are left to their own tasks, so they never hold up this
+    one. Returns the other jobs to scrape in the same session, or None when
+    another session took the job on. Jobs never queued are scraped alone.
+    """
+    room = max_queries()
+    if room <= 1:
+        return []
+
+    job_id = job_id_of(batch_id, shop_name)
+    connection = get_redis_connection("default")
+    job_ids = [
+        claimed_id.decode()
+        for claimed_id in connection.register_script(CLAIM_SCRIPT)(
+            keys=[_queue_key(shop_name)], args=[job_id, room, PRIORITY_SPACING]
+        )
+    ]
+    if not job_ids:
+        return None if connection.exists(_job_key(job_id)) else []
+
+    # Jobs of the others stay behind, they tell their tasks to wait for results
+    connection.delete(_job_key(job_id))
+    other_jobs = [
+        json.loads(payload)
+        for payload in connection.mget([_job_key(other) for other in job_ids[1:]])
+        if payload is not None
+    ]
+
+    name = f"{METRICS_NAME}:{shop_name}"
+    scrape_metrics.incr(name, "sessions")
+    scrape_metrics.incr(name, "queries", 1 + len(other_jobs))
+    return other_jobs
+
+
+def publish(shop_name: str, batch_id: int, summary: dict):
+    """Hand the summary of a job scraped in a session over to its own task."""
+    job_id = job_id_of(batch_id, shop_name)
+    try:
+        connection = get_redis_connection("default")
+        connection.set(_result_key(job_id), json.dumps(summary), ex=JOB_TTL_SECONDS)
+    except Exception as e:
+        logger.warning(f"Failed to publish the scrape of {job_id}: {e}")
+
+
+def take_result(shop_name: str, batch_id: int):
+    """
+    The summary published for the job by the session that took it on, or None
+    while that session is still scraping.
+    """
+    job_id = job_id_of(batch_id, shop_name)
+    connection = get_redis_connection("default")
+    payload = connection.get(_result_key(job_id))
+    if payload is None:
+        return None
+    connection.delete(_job_key(job_id), _result_key(job_id))
+    return json.loads(payload)
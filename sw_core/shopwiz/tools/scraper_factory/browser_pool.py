@@ -0,0 +1,348 @@
+import asyncio
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager, asynccontextmanager
+
+from playwright.sync_api import sync_playwright, BrowserContext
+from playwright.async_api import (
+    async_playwright,
+    BrowserContext as AsyncBrowserContext,
+)
+
+from config.settings import (
+    BROWSER_POOL_MAX_USES,
+    BROWSER_POOL_MAX_MEMORY_MB,
+    BROWSER_POOL_MEMORY_CHECK_SECONDS,
+)
+from .. import scrape_metrics
+from .route_policy import RoutePolicy, RouteStats
+
+logger = logging.getLogger(__name__)
+
+METRICS_NAME = "browser_pool"
+
+
+def descendant_rss_mb() -> float:
+    """
+    Resident memory of every process spawned by this one (playwright driver and
+    chromium). Only available on Linux, returns 0 elsewhere.
+    """
+    if not os.path.isdir("/proc"):
+        return 0
+
+    children = {}
+    for pid in os.listdir("/proc"):
+        if not pid.isdigit():
+            continue
+        try:
+            with open(f"/proc/{pid}/stat") as f:
+                stat = f.read()
+        except OSError:
+            continue
+        # Process name may contain spaces, so parse fields after the closing bracket
+        ppid = int(stat.rsplit(")", 1)[1].split()[1])
+        children.setdefault(ppid, []).append(int(pid))
+
+    total_kb = 0
+    stack = list(children.get(os.getpid(), []))
+    while stack:
+        pid = stack.pop()
+        stack.extend(children.get(pid, []))
+        try:
+            with open(f"/proc/{pid}/status") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        total_kb += int(line.split()[1])
+                        break
+        except OSError:
+            continue
+
+    return total_kb / 1024
+
+
+class _BasePool:
+    def __init__(self, max_uses: int, max_memory_mb: int):
+        self.max_uses = max_uses
+        self.max_memory_mb = max_memory_mb
+        self._lock = threading.Lock()
+        self._memory_checked_at = 0
+        self._storage_states = {}
+        self._counters = {
+            "hits": 0,
+            "misses": 0,
+            "launches": 0,
+            "recycles": 0,
+            "launch_time": 0.0,
+        }
+
+    def _count(self, name: str, amount=1):
+        with self._lock:
+            self._counters[name] += amount
+
+    def _record_launch(self, launch_start: float):
+        launch_time = time.time() - launch_start
+        self._count("launches")
+        self._count("launch_time", launch_time)
+        # Summed over every worker, along with the borrows, to tell how many
+        # scrapes of a shop each launch served
+        scrape_metrics.incr(METRICS_NAME, "launches")
+        logger.info(f"Launched pooled browser in {launch_time:.2f}s: {self.stats()}")
+
+    def _record_borrow(self, is_hit: bool):
+        self._count("hits" if is_hit else "misses")
+        scrape_metrics.incr(METRICS_NAME, "borrows")
+
+    def _should_recycle(self, uses: int) -> bool:
+        if uses >= self.max_uses:
+            return True
+        # Reading memory scans /proc, too slow for every release
+        now = time.time()
+        if (
+            not self.max_memory_mb
+            or now - self._memory_checked_at < BROWSER_POOL_MEMORY_CHECK_SECONDS
+        ):
+            return False
+        self._memory_checked_at = now
+        return descendant_rss_mb() > self.max_memory_mb
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+        stats["avg_launch_time"] = (
+            stats["launch_time"] / stats["launches"] if stats["launches"] else 0
+        )
+        stats["borrows_per_launch"] = (
+            (stats["hits"] + stats["misses"]) / stats["launches"]
+            if stats["launches"]
+            else 0
+        )
+        return stats
+
+
+class BrowserPool(_BasePool):
+    """
+    Long-lived chromium browsers shared by scrapers within a worker process.
+
+    Sync playwright objects can only be used from the thread that created them,
+    so every thread owns its own browser and a reusable context per shop, or
+    per shop and slot when a session scrapes several queries of a shop.
+    Browsers are recycled after `max_uses` borrows or once the browser processes
+    grow beyond `max_memory_mb`, as of the last memory check. Cookies and local
+    storage of each shop survive recycling.
+    """
+
+    def __init__(
+        self,
+        max_uses: int = BROWSER_POOL_MAX_USES,
+        max_memory_mb: int = BROWSER_POOL_MAX_MEMORY_MB,
+    ):
+        super().__init__(max_uses, max_memory_mb)
+        self._local = threading.local()
+
+    def _ensure_browser(self):
+        browser = getattr(self._local, "browser", None)
+        if browser is not None and browser.is_connected():
+            return
+
+        if browser is not None:
+            # Browser crashed or was closed underneath us
+            self._close_local()
+
+        launch_start = time.time()
+        playwright = getattr(self._local, "playwright", None)
+        if playwright is None:
+            playwright = sync_playwright().start()
+            self._local.playwright = playwright
+        self._local.browser = playwright.chromium.launch()
+        self._local.contexts = {}
+        self._local.uses = 0
+        self._record_launch(launch_start)
+
+    @contextmanager
+    def context(
+        self,
+        shop_name: str,
+        user_agent: str,
+        route_policy: RoutePolicy = None,
+        route_stats: RouteStats = None,
+        slot: int = 0,
+    ) -> BrowserContext:
+        self._ensure_browser()
+
+        context = self._local.contexts.get((shop_name, slot))
+        self._record_borrow(context is not None)
+        if context is None:
+            context = self._local.browser.new_context(
+                user_agent=user_agent,
+                storage_state=self._storage_states.get(shop_name),
+            )
+            self._local.contexts[(shop_name, slot)] = context
+
+        self._local.uses += 1
+        route_handler = None
+        if route_policy is not None:
+            route_stats = route_stats or RouteStats()
+            route_handler = route_policy.sync_handler(route_stats)
+            context.route("**/*", route_handler)
+            context.on("response", route_stats.record_response)
+        try:
+            yield context
+        finally:
+            if route_handler is not None:
+                try:
+                    context.unroute("**/*", route_handler)
+                    context.remove_listener("response", route_stats.record_response)
+                except Exception as e:
+                    logger.warning(f"Failed to remove {shop_name} route policy: {e}")
+            self._release(shop_name, slot, context)
+
+    def _release(self, shop_name: str, slot: int, context: BrowserContext):
+        try:
+            # Leave the context clean for the next borrower
+            for page in context.pages:
+                page.close()
+            self._storage_states[shop_name] = context.storage_state()
+        except Exception as e:
+            logger.warning(f"Dropping broken {shop_name} context: {e}")
+            self._local.contexts.pop((shop_name, slot), None)
+
+        if self._should_recycle(self._local.uses):
+            self._count("recycles")
+            self._close_local()
+
+    def _close_local(self):
+        browser = getattr(self._local, "browser", None)
+        self._local.browser = None
+        self._local.contexts = {}
+        if browser is not None:
+            try:
+                browser.close()
+            except Exception as e:
+                logger.warning(f"Failed to close pooled browser: {e}")
+
+    def close(self):
+        """Close the browser and playwright driver owned by the calling thread."""
+        self._close_local()
+        playwright = getattr(self._local, "playwright", None)
+        self._local.playwright = None
+        if playwright is not None:
+            playwright.stop()
+
+
+class AsyncBrowserPool(_BasePool):
+    """
+    Async counterpart of `BrowserPool`. A single browser serves every shop and
+    page scheduled on the event loop, with one reusable context per shop and
+    slot. Recycling waits until no coroutine is borrowing a context.
+    """
+
+    def __init__(
+        self,
+        max_uses: int = BROWSER_POOL_MAX_USES,
+        max_memory_mb: int = BROWSER_POOL_MAX_MEMORY_MB,
+    ):
+        super().__init__(max_uses, max_memory_mb)
+        self._playwright = None
+        self._browser = None
+        self._contexts = {}
+        self._uses = 0
+        self._borrowers = 0
+        self._launch_lock = None
+
+    async def _ensure_browser(self):
+        if self._browser is not None and self._browser.is_connected():
+            return
+
+        if self._browser is not None:
+            await self._close_browser()
+
+        launch_start = time.time()
+        if self._playwright is None:
+            self._playwright = await async_playwright().start()
+        self._browser = await self._playwright.chromium.launch()
+        self._contexts = {}
+        self._uses = 0
+        self._record_launch(launch_start)
+
+    async def _get_context(self, shop_name: str, user_agent: str, slot: int):
+        if self._launch_lock is None:
+            self._launch_lock = asyncio.Lock()
+
+        # Serialised so concurrent borrowers never launch twice or race on a context
+        async with self._launch_lock:
+            await self._ensure_browser()
+
+            context = self._contexts.get((shop_name, slot))
+            self._record_borrow(context is not None)
+            if context is None:
+                context = await self._browser.new_context(
+                    user_agent=user_agent,
+                    storage_state=self._storage_states.get(shop_name),
+                )
+                self._contexts[(shop_name, slot)] = context
+
+            return context
+
+    @asynccontextmanager
+    async def context(
+        self,
+        shop_name: str,
+        user_agent: str,
+        route_policy: RoutePolicy = None,
+        route_stats: RouteStats = None,
+        slot: int = 0,
+    ) -> AsyncBrowserContext:
+        context = await self._get_context(shop_name, user_agent, slot)
+
+        self._uses += 1
+        self._borrowers += 1
+        route_handler = None
+        if route_policy is not None:
+            route_stats = route_stats or RouteStats()
+            route_handler = route_policy.async_handler(route_stats)
+            await context.route("**/*", route_handler)
+            context.on("response", route_stats.record_response)
+        try:
+            yield context
+        finally:
+            self._borrowers -= 1
+            if route_handler is not None:
+                try:
+                    await context.unroute("**/*", route_handler)
+                    context.remove_listener("response", route_stats.record_response)
+                except Exception as e:
+                    logger.warning(f"Failed to remove {shop_name} route policy: {e}")
+            await self._release(shop_name, slot, context)
+
+    async def _release(self, shop_name: str, slot: int, context: AsyncBrowserContext):
+        try:
+            self._storage_states[shop_name] = await context.storage_state()
+        except Exception as e:
+            logger.warning(f"Dropping broken {shop_name} context: {e}")
+            self._contexts.pop((shop_name, slot), None)
+
+        if self._borrowers == 0 and self._should_recycle(self._uses):
+            self._count("recycles")
+            await self._close_browser()
+
+    async def _close_browser(self):
+        browser = self._browser
+        self._browser = None
+        self._contexts = {}
+        if browser is not None:
+            try:
+                await browser.close()
+            except Exception as e:
+                logger.warning(f"Failed to close pooled browser: {e}")
+
+    async def close(self):
+        await self._close_browser()
+        if self._playwright is not None:
+            await self._playwright.stop()
+            self._playwright = None
+
+
+browser_pool = BrowserPool()
+async_browser_pool = AsyncBrowserPool()
@@ -0,0 +1,162 @@
+import threading
+
+import httpx
+from selectolax.parser import HTMLParser
+
+from config.settings import SCRAPER_HTTP_TIMEOUT_SECONDS
+
+# Text found on bot protection interstitials instead of results
+DEFAULT_CHALLENGE_MARKERS = (
+    "captcha-delivery",
+    "px-captcha",
+    "access denied",
+    "are you a robot",
+    "cf-challenge",
+    "_incapsula_resource",
+    "request unsuccessful",
+)
+
+CHALLENGE_STATUS_CODES = (403, 429, 503)
+
+
+class HttpFallback(Exception):
+    """The page has to be loaded in a browser instead."""
+
+
+def _client_limits():
+    return httpx.Limits(max_connections=20, max_keepalive_connections=10)
+
+
+# Keep-alive connections are pooled per worker process and shared by threads
+_client = None
+_client_lock = threading.Lock()
+_async_client = None
+
+
+def get_client() -> httpx.Client:
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = httpx.Client(
+                timeout=SCRAPER_HTTP_TIMEOUT_SECONDS,
+                limits=_client_limits(),
+                follow_redirects=True,
+            )
+    return _client
+
+
+def get_async_client() -> httpx.AsyncClient:
+    # Only ever used from the scraping event loop
+    global _async_client
+    if _async_client is None:
+        _async_client = httpx.AsyncClient(
+            timeout=SCRAPER_HTTP_TIMEOUT_SECONDS,
+            limits=_client_limits(),
+            follow_redirects=True,
+        )
+    return _async_client
+
+
+def extract_records(tree: HTMLParser, product_selectors):
+    """Same records as EXTRACT_PRODUCTS_JS, read from server rendered html."""
+    records = []
+    for tile in tree.css(product_selectors["tile"]):
+        record = {}
+        for name, (selector, attribute) in product_selectors["fields"].items():
+            field = tile.css_first(selector)
+            if field is None:
+                record[name] = None
+            elif attribute:
+                record[name] = field.attributes.get(attribute)
+            else:
+                record[name] = field.text(deep=True)
+        records.append(record)
+    return records
+
+
+class HttpFetchStrategy:
+    """
+    Describes how a shop's results can be read without a browser.
+
+    `ready_selector` must be present in the html for the listing to count as
+    server rendered. Any of `empty_selectors`, or a `(selector, text)` pair of
+    `empty_texts`, marks a page without results. The total number of items is
+    read from `count_selector` (text content, or `count_attribute` if given).
+    """
+
+    def __init__(
+        self,
+        ready_selector: str,
+        empty_selectors=(),
+        empty_texts=(),
+        count_selector: str = None,
+        count_attribute: str = None,
+        challenge_markers=DEFAULT_CHALLENGE_MARKERS,
+    ):
+        self.ready_selector = ready_selector
+        self.empty_selectors = empty_selectors
+        self.empty_texts = empty_texts
+        self.count_selector = count_selector
+        self.count_attribute = count_attribute
+        self.challenge_markers = challenge_markers
+
+    def parse(self, status_code: int, html: str, product_selectors):
+        """
+        Returns a tuple of (records, raw total count), where records is empty
+        when the shop found nothing. Raises HttpFallback when the html can't
+        be trusted.
+        """
+        if status_code in CHALLENGE_STATUS_CODES:
+            raise HttpFallback(f"challenge status {status_code}")
+        if status_code != 200:
+            raise HttpFallback(f"unexpected status {status_code}")
+
+        lowered_html = html.lower()
+        for marker in self.challenge_markers:
+            if marker in lowered_html:
+                raise HttpFallback(f"challenge page ({marker})")
+
+        tree = HTMLParser(html)
+
+        for selector in self.empty_selectors:
+            if tree.css_first(selector) is not None:
+                return [], None
+        for selector, text in self.empty_texts:
+            node = tree.css_first(selector)
+            if node is not None and text in node.text(deep=True).lower():
+                return [], None
+
+        if tree.css_first(self.ready_selector) is None:
+            raise HttpFallback("product listing missing from html")
+
+        raw_count = None
+        if self.count_selector:
+            count_node = tree.css_first(self.count_selector)
+            if count_node is not None:
+                raw_count = (
+                    count_node.attributes.get(self.count_attribute)
+                    if self.count_attribute
+                    else count_node.text(deep=True)
+                )
+
+        records = extract_records(tree, product_selectors)
+        if not records:
+            raise HttpFallback("no product tiles in html")
+
+        return records, raw_count
+
+    def fetch(self, url: str, user_agent: str, product_selectors):
+        try:
+            response = get_client().get(url, headers={"User-Agent": user_agent})
+        except httpx.HTTPError as e:
+            raise HttpFallback(f"request failed: {e}")
+        return self.parse(response.status_code, response.text, product_selectors)
+
+    async def fetch_async(self, url: str, user_agent: str, product_selectors):
+        try:
+            response = await get_async_client().get(
+                url, headers={"User-Agent": user_agent}
+            )
+        except httpx.HTTPError as e:
+            raise HttpFallback(f"request failed: {e}")
+        return self.parse(response.status_code, response.text, product_selectors)
@@ -0,0 +1,157 @@
+import math
+
+from shopwiz.apps.core.models import (
+    Product,
+    SearchedProduct,
+    ShopName,
+    UnitType,
+    UrlPrefix,
+)
+from shopwiz.tools.product_catalogue import split_url
+
+UNIT_TYPES = frozenset(UnitType.values)
+SHOP_NAMES = frozenset(ShopName.values)
+NAME_MAX_LENGTH = Product._meta.get_field("name").max_length
+URL_PREFIX_MAX_LENGTH = UrlPrefix._meta.get_field("prefix").max_length
+URL_PATH_MAX_LENGTH = Product._meta.get_field("product_url_path").max_length
+
+
+class InvalidProductError(ValueError):
+    pass
+
+
+def _required_float(product: dict, field: str) -> float:
+    try:
+        value = float(product[field])
+    except KeyError:
+        raise InvalidProductError(f"{field}: This field is required.")
+    except (TypeError, ValueError):
+        raise InvalidProductError(f"{field}: A valid number is required.")
+    if not math.isfinite(value):
+        raise InvalidProductError(f"{field}: A valid number is required.")
+    return value
+
+
+def _optional_str(product: dict, field: str):
+    value = product.get(field)
+    if value is not None and not isinstance(value, str):
+        raise InvalidProductError(f"{field}: Not a valid string.")
+    return value
+
+
+def _optional_url(product: dict, field: str):
+    # Stored split into a catalogue prefix and a path, see product_catalogue
+    url = _optional_str(product, field)
+    prefix, path = split_url(url)
+    if prefix is not None and len(prefix) > URL_PREFIX_MAX_LENGTH:
+        raise InvalidProductError(f"{field}: URL prefix is too long.")
+    if len(path) > URL_PATH_MAX_LENGTH:
+        raise InvalidProductError(f"{field}: URL path is too long.")
+    return url
+
+
+class ProductRecord:
+    """
+    A scraped product that passed validation, kept as it is from parsing through
+    to the SearchedProduct row it becomes. Enforces the rules of
+    SearchedProductSerialiser and the SearchedProduct and Product check
+    constraints without the serializer machinery, which is too slow to run for
+    every tile.
+    """
+
+    __slots__ = (
+        "name",
+        "price",
+        "price_per_unit",
+        "unit_type",
+        "unit_measurement",
+        "img_src",
+        "product_url",
+        "shop_name",
+    )
+
+    def __init__(
+        self,
+        name: str,
+        price: float,
+        price_per_unit: float,
+        unit_type: str,
+        unit_measurement: float,
+        img_src: str = None,
+        product_url: str = None,
+        shop_name: str = None,
+    ):
+        self.name = name
+        self.price = price
+        self.price_per_unit = price_per_unit
+        self.unit_type = unit_type
+        self.unit_measurement = unit_measurement
+        self.img_src = img_src
+        self.product_url = product_url
+        self.shop_name = shop_name
+
+    @classmethod
+    def from_dict(cls, product: dict) -> "ProductRecord":
+        """Raises InvalidProductError naming the first invalid field."""
+        name = product.get("name")
+        if not isinstance(name, str) or not name.strip():
+            raise InvalidProductError("name: This field may not be blank.")
+        name = name.strip()
+        if len(name) > NAME_MAX_LENGTH:
+            raise InvalidProductError(
+                f"name: Longer than {NAME_MAX_LENGTH} characters."
+            )
+
+        price = _required_float(product, "price")
+        if price <= 0:
+            raise InvalidProductError("price: Price must be greater than 0")
+
+        price_per_unit = _required_float(product, "price_per_unit")
+        if price_per_unit <= 0:
+            raise InvalidProductError(
+                "price_per_unit: Price per unit must be greater than 0"
+            )
+
+        unit_measurement = _required_float(product, "unit_measurement")
+        if unit_measurement <= 0:
+            raise InvalidProductError(
+                "unit_measurement: Unit measurement must be greater than 0"
+            )
+
+        unit_type = product.get("unit_type")
+        if unit_type not in UNIT_TYPES:
+            raise InvalidProductError(
+                f'unit_type: "{unit_type}" is not a valid choice.'
+            )
+
+        shop_name = product.get("shop_name")
+        if shop_name not in SHOP_NAMES:
+            raise InvalidProductError(
+                f'shop_name: "{shop_name}" is not a valid choice.'
+            )
+
+        return cls(
+            name=name,
+            price=price,
+            price_per_unit=price_per_unit,
+            unit_type=unit_type,
+            unit_measurement=unit_measurement,
+            img_src=_optional_url(product, "img_src"),
+            product_url=_optional_url(product, "product_url"),
+            shop_name=shop_name,
+        )
+
+    def to_searched_product(self, batch, product_id: int) -> SearchedProduct:
+        """Row of the product in the batch, see product_catalogue for product_id."""
+        return SearchedProduct(
+            batch=batch,
+            product_id=product_id,
+            price=self.price,
+            price_per_unit=self.price_per_unit,
+            unit_type=self.unit_type,
+            unit_measurement=self.unit_measurement,
+            upload_date=batch.upload_date,
+        )
+
+    def __repr__(self):
+        return f"ProductRecord({self.shop_name}: {self.name}, {self.price})"
@@ -0,0 +1,117 @@
+import re
+import threading
+from collections import Counter
+from typing import Iterable
+
+
+# Third party trackers and ads that none of the shops need to render results
+COMMON_BLOCKED_URL_PATTERNS = (
+    r"googletagmanager\.com",
+    r"google-analytics\.com",
+    r"doubleclick\.net",
+    r"googlesyndication\.com",
+    r"facebook\.(net|com)",
+    r"hotjar\.com",
+    r"omtrdc\.net",
+    r"adobedtm\.com",
+    r"optimizely\.com",
+    r"nr-data\.net",
+    r"newrelic\.com",
+    r"onetrust\.com",
+    r"cookielaw\.org",
+    r"bing\.com",
+    r"tiktok\.com",
+    r"pinterest\.com",
+)
+
+# Parsing only reads attribute strings, so nothing has to be painted
+COMMON_BLOCKED_RESOURCE_TYPES = ("image", "media", "font", "stylesheet")
+
+
+def _compile(patterns: Iterable[str]):
+    patterns = list(patterns)
+    return re.compile("|".join(f"(?:{p})" for p in patterns)) if patterns else None
+
+
+class RouteStats:
+    """Counts requests let through and blocked during a single scrape."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.allowed_requests = 0
+        self.blocked_requests = 0
+        self.blocked_by_type = Counter()
+        self.bytes_received = 0
+
+    def record(self, resource_type: str, blocked: bool):
+        with self._lock:
+            if blocked:
+                self.blocked_requests += 1
+                self.blocked_by_type[resource_type] += 1
+            else:
+                self.allowed_requests += 1
+
+    def record_response(self, response):
+        # Provisional headers are available without another round trip
+        content_length = response.headers.get("content-length")
+        if content_length and content_length.isdigit():
+            with self._lock:
+                self.bytes_received += int(content_length)
+
+    def as_dict(self):
+        with self._lock:
+            return {
+                "allowed_requests": self.allowed_requests,
+                "blocked_requests": self.blocked_requests,
+                "blocked_by_type": dict(self.blocked_by_type),
+                "bytes_received": self.bytes_received,
+            }
+
+
+class RoutePolicy:
+    """
+    Decides which requests of a scraper page are aborted. A request is blocked
+    when its resource type or url is denied, unless its url matches one of the
+    allowed patterns.
+    """
+
+    def __init__(
+        self,
+        blocked_resource_types: Iterable[str] = COMMON_BLOCKED_RESOURCE_TYPES,
+        blocked_url_patterns: Iterable[str] = COMMON_BLOCKED_URL_PATTERNS,
+        allowed_url_patterns: Iterable[str] = (),
+    ):
+        self.blocked_resource_types = frozenset(blocked_resource_types)
+        self._blocked_urls = _compile(blocked_url_patterns)
+        self._allowed_urls = _compile(allowed_url_patterns)
+
+    def is_blocked(self, resource_type: str, url: str) -> bool:
+        if self._allowed_urls and self._allowed_urls.search(url):
+            return False
+        if resource_type in self.blocked_resource_types:
+            return True
+        return bool(self._blocked_urls and self._blocked_urls.search(url))
+
+    def sync_handler(self, stats: RouteStats):
+        def handle(route):
+            request = route.request
+            blocked = self.is_blocked(request.resource_type, request.url)
+            stats.record(request.resource_type, blocked)
+            if blocked:
+                route.abort()
+            else:
+                route.continue_()
+
+        return handle
+
+    def async_handler(self, stats: RouteStats):
+        async def handle(route):
+            request = route.request
+            blocked = self.is_blocked(request.resource_type, request.url)
+            stats.record(request.resource_type, blocked)
+            if blocked:
+                await route.abort()
+            else:
+                await route.continue_()
+
+        return handle
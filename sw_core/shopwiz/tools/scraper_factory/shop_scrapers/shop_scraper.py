@@ -1,8 +1,484 @@
+import asyncio
+import time
 from abc import ABC, abstractmethod
+from collections import defaultdict
+from contextlib import contextmanager
+
+from playwright.sync_api import Page, BrowserContext
+from playwright.async_api import (
+    Page as AsyncPage,
+    BrowserContext as AsyncBrowserContext,
+)
+
+from config.settings import (
+    SCRAPER_PAGE_CONCURRENCY,
+    SCRAPER_BASE_URL_OVERRIDES,
+    SCRAPER_HTTP_SHOPS,
+)
+from shopwiz.tools import scrape_metrics, request_governor
+from shopwiz.tools.request_governor import ShopRateLimited
+from ..browser_pool import browser_pool, async_browser_pool
+from ..http_fetcher import HttpFetchStrategy, HttpFallback
+from ..route_policy import RoutePolicy
+
+# Collects the raw text and attributes of every product tile in one round trip
+EXTRACT_PRODUCTS_JS = """
+({ tile, fields }) => Array.from(document.querySelectorAll(tile), (element) => {
+    const record = {};
+    for (const [name, [selector, attribute]] of Object.entries(fields)) {
+        const field = element.querySelector(selector);
+        if (!field) {
+            record[name] = null;
+        } else {
+            record[name] = attribute ? field.getAttribute(attribute) : field.textContent;
+        }
+    }
+    return record;
+})
+"""
+
+
+class ScrapeCancelled(Exception):
+    pass
 
 
 class ShopScraper(ABC):
+    # Scheme and host search pages are requested from
+    default_base_url = ""
+    user_agent = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/109.0.0.0 Safari/537.36"
+    # Requests aborted on every page load, shops can declare their own policy
+    route_policy = RoutePolicy()
+    # Product tile selector and a (selector, attribute) pair for every raw field,
+    # where an attribute of None reads the text content
+    product_selectors = {"tile": "", "fields": {}}
+    # Shops whose listing is server rendered can be scraped without a browser,
+    # once they are in SCRAPER_HTTP_SHOPS
+    http_strategy: HttpFetchStrategy = None
+    # Called with (shop_name, products) for every parsed chunk of products
+    # instead of keeping them in self.products until the scrape ends
+    product_sink = None
+    # Scrapes of the shop for other queries in the same session borrow browser
+    # contexts of their own
+    context_slot = 0
+    # Set once the products of the scrape are no longer wanted, the scrape then
+    # stops before its next request
+    cancel_event = None
+    # How the last scrape was served and what stopped it, if anything
+    strategy = "browser"
+    error = None
 
     @abstractmethod
-    def get_products(self, query: str, is_relevant_only: bool):
+    def _wait_for_results(self, page: Page):
+        """
+        Wait until the results listing of a loaded page is rendered.
+        Returns False when the shop found nothing for the query.
+        """
+        pass
+
+    @abstractmethod
+    async def _wait_for_results_async(self, page: AsyncPage):
+        pass
+
+    @abstractmethod
+    def _get_number_of_pages(self, page: Page):
+        pass
+
+    @abstractmethod
+    async def _get_number_of_pages_async(self, page: AsyncPage):
+        pass
+
+    @abstractmethod
+    def _build_product(self, query: str, raw: dict):
         pass
+
+    @abstractmethod
+    def _calculate_number_of_pages(self, raw_count):
+        pass
+
+    @property
+    def base_url(self):
+        # Overridden to point scrapers at a local stand-in of the shop
+        return SCRAPER_BASE_URL_OVERRIDES.get(self.shop_name, self.default_base_url)
+
+    @property
+    def page_concurrency(self):
+        return SCRAPER_PAGE_CONCURRENCY.get(self.shop_name, 1)
+
+    @contextmanager
+    def _timed(self, phase: str):
+        # Time spent per phase is summed over every page, including concurrent ones
+        phase_start = time.time()
+        try:
+            yield
+        finally:
+            self.phase_times[phase] += time.time() - phase_start
+
+    def _wait_for_turn(self):
+        # Every worker shares the request rate of the shop
+        with self._timed("throttle"):
+            request_governor.wait_for_turn(self.shop_name)
+        self._check_cancelled()
+
+    async def _wait_for_turn_async(self):
+        with self._timed("throttle"):
+            await request_governor.wait_for_turn_async(self.shop_name)
+        self._check_cancelled()
+
+    def _check_cancelled(self):
+        if self.cancel_event is not None and self.cancel_event.is_set():
+            raise ScrapeCancelled(f"Scrape of {self.shop_name} was cancelled")
+
+    @staticmethod
+    async def _text_async(element, selector: str):
+        child = await element.query_selector(selector)
+        return await child.text_content() if child else None
+
+    def _parse_page(self, page: Page, query: str):
+        parse_start = time.time()
+        records = page.evaluate(EXTRACT_PRODUCTS_JS, self.product_selectors)
+
+        products = []
+        for raw in records:
+            product = self._build_product(query, raw)
+            if product:
+                products.append(product)
+        self.parse_times.append(time.time() - parse_start)
+        self._emit(products)
+
+    def _emit(self, products):
+        self.product_count += len(products)
+        if self.product_sink:
+            self.product_sink(self.shop_name, products)
+        else:
+            self.products.extend(products)
+
+    async def _emit_async(self, products):
+        # The sink blocks while the writer falls behind, which would stall every
+        # page on the event loop, so it is called from another thread
+        if self.product_sink:
+            self.product_count += len(products)
+            await asyncio.get_running_loop().run_in_executor(
+                None, self.product_sink, self.shop_name, products
+            )
+        else:
+            self._emit(products)
+
+    async def _parse_page_async(self, page: AsyncPage, query: str):
+        parse_start = time.time()
+        records = await page.evaluate(EXTRACT_PRODUCTS_JS, self.product_selectors)
+
+        products = []
+        for raw in records:
+            product = self._build_product(query, raw)
+            if product:
+                products.append(product)
+        self.parse_times.append(time.time() - parse_start)
+        return products
+
+    @property
+    def uses_http(self):
+        return self.http_strategy is not None and self.shop_name in SCRAPER_HTTP_SHOPS
+
+    def _get_products_over_http(self, query: str, is_relevant_only: bool):
+        """
+        Scrape the pages over plain http, emitting their products as they are
+        parsed. Returns the page numbers left for the browser to scrape, where
+        [1] is a whole scrape in the browser and [] means every page is done.
+        """
+        if not self.uses_http:
+            return [1]
+
+        http_start = time.time()
+        page_number = 1
+        try:
+            products, self.total_number_of_pages = self._fetch_page_over_http(
+                query, is_relevant_only, page_number
+            )
+            self._emit(products)
+            for page_number in range(2, self.total_number_of_pages + 1):
+                products, _ = self._fetch_page_over_http(
+                    query, is_relevant_only, page_number
+                )
+                self._emit(products)
+        except (HttpFallback, AssertionError) as e:
+            page_numbers = list(range(page_number, self.total_number_of_pages + 1))
+            return self._fall_back_to_browser(e, http_start, page_numbers or [1])
+
+        self.strategy = "http"
+        return []
+
+    def _fall_back_to_browser(self, error, http_start: float, page_numbers):
+        print(f"Falling back to browser for {self.shop_name}: {error}")
+        scrape_metrics.record_strategy(
+            self.shop_name, "http", False, time.time() - http_start
+        )
+        if page_numbers[0] == 1:
+            # Nothing fetched over http is kept, so it isn't timed either
+            self.parse_times = []
+            self.phase_times = defaultdict(float)
+        return page_numbers
+
+    def _fetch_page_over_http(self, query, is_relevant_only, page_number):
+        self._wait_for_turn()
+        with self._timed("fetch"):
+            records, raw_count = self.http_strategy.fetch(
+                self._build_url(query, is_relevant_only, page_number),
+                self.user_agent,
+                self.product_selectors,
+            )
+        return self._build_http_page(
+            query, is_relevant_only, page_number, records, raw_count
+        )
+
+    async def _get_products_over_http_async(
+        self, query: str, is_relevant_only: bool, semaphore: asyncio.Semaphore
+    ):
+        if not self.uses_http:
+            return [1]
+
+        async def fetch_page(page_number: int):
+            async with semaphore:
+                await self._wait_for_turn_async()
+                with self._timed("fetch"):
+                    records, raw_count = await self.http_strategy.fetch_async(
+                        self._build_url(query, is_relevant_only, page_number),
+                        self.user_agent,
+                        self.product_selectors,
+                    )
+            return self._build_http_page(
+                query, is_relevant_only, page_number, records, raw_count
+            )
+
+        http_start = time.time()
+        try:
+            products, self.total_number_of_pages = await fetch_page(1)
+        except (HttpFallback, AssertionError) as e:
+            return self._fall_back_to_browser(e, http_start, [1])
+        await self._emit_async(products)
+
+        page_numbers = range(2, self.total_number_of_pages + 1)
+        remaining_pages = await asyncio.gather(
+            *(fetch_page(page_number) for page_number in page_numbers),
+            return_exceptions=True,
+        )
+        # Pages that failed over http are left for the browser, while rate
+        # limits and cancellations end the scrape
+        fallbacks = {}
+        for page_number, page in zip(page_numbers, remaining_pages):
+            if isinstance(page, (HttpFallback, AssertionError)):
+                fallbacks[page_number] = page
+            elif isinstance(page, BaseException):
+                raise page
+        for page in remaining_pages:
+            if not isinstance(page, BaseException):
+                await self._emit_async(page[0])
+
+        if fallbacks:
+            first_error = next(iter(fallbacks.values()))
+            return self._fall_back_to_browser(first_error, http_start, list(fallbacks))
+        self.strategy = "http"
+        return []
+
+    def _build_http_page(
+        self, query, is_relevant_only, page_number, records, raw_count
+    ):
+        parse_start = time.time()
+        total_number_of_pages = 0
+        if records and not is_relevant_only and page_number == 1:
+            total_number_of_pages = self._calculate_number_of_pages(raw_count)
+
+        products = []
+        for raw in records:
+            product = self._build_product(query, raw)
+            if product:
+                products.append(product)
+        self.parse_times.append(time.time() - parse_start)
+        return products, total_number_of_pages
+
+    def get_products(self, query: str, is_relevant_only: bool):
+        self.start_time = time.time()
+        try:
+            page_numbers = self._get_products_over_http(query, is_relevant_only)
+        except (ShopRateLimited, ScrapeCancelled) as e:
+            self.error = e
+            return self._format_result()
+        if not page_numbers:
+            return self._format_result()
+
+        try:
+            with browser_pool.context(
+                self.shop_name,
+                self.user_agent,
+                self.route_policy,
+                self.route_stats,
+                self.context_slot,
+            ) as context:
+                if page_numbers[0] == 1:
+                    page: Page = context.new_page()
+                    self._wait_for_turn()
+                    with self._timed("goto"):
+                        page.goto(self._build_url(query, is_relevant_only, 1))
+
+                    with self._timed("wait"):
+                        has_results = self._wait_for_results(page)
+
+                    page_numbers = []
+                    if has_results:
+                        if not is_relevant_only:
+                            self.total_number_of_pages = self._get_number_of_pages(page)
+                        self._parse_page(page, query)
+                        page_numbers = range(2, self.total_number_of_pages + 1)
+                # Otherwise the pages before them were scraped over http
+                self._crawl_remaining_pages(context, query, page_numbers)
+
+        except (AssertionError, Exception) as e:
+            self.error = e
+            print(f"Error fetching and parsing data from {self.shop_name}: {e}")
+        finally:
+            return self._format_result()
+
+    def _crawl_remaining_pages(self, context: BrowserContext, query: str, page_numbers):
+        """
+        Load the given pages of a full scrape in up to page_concurrency tabs at
+        a time, parsing them in page order.
+        """
+        page_numbers = list(page_numbers)
+        if not page_numbers:
+            return
+
+        tabs = [
+            context.new_page()
+            for _ in range(min(self.page_concurrency, len(page_numbers)))
+        ]
+        for batch_start in range(0, len(page_numbers), len(tabs)):
+            batch = list(zip(tabs, page_numbers[batch_start : batch_start + len(tabs)]))
+
+            # Start every navigation of the batch before waiting on any of them,
+            # so the pages load in parallel
+            for tab, page_number in batch:
+                self._wait_for_turn()
+                with self._timed("goto"):
+                    tab.goto(
+                        self._build_url(query, False, page_number),
+                        wait_until="commit",
+                    )
+            for tab, _ in batch:
+                with self._timed("wait"):
+                    tab.wait_for_load_state()
+                    has_results = self._wait_for_results(tab)
+                if has_results:
+                    self._parse_page(tab, query)
+
+    async def _scrape_page_async(
+        self,
+        context: AsyncBrowserContext,
+        query: str,
+        is_relevant_only: bool,
+        page_number: int,
+    ):
+        """
+        Load and parse a single results page in a new tab.
+        Returns a tuple of (products, total_number_of_pages), where the number of
+        pages is only read from the first page of a full scrape and is 0 otherwise.
+        """
+        page: AsyncPage = await context.new_page()
+        try:
+            await self._wait_for_turn_async()
+            with self._timed("goto"):
+                await page.goto(self._build_url(query, is_relevant_only, page_number))
+
+            with self._timed("wait"):
+                has_results = await self._wait_for_results_async(page)
+            if not has_results:
+                return [], 0
+
+            total_number_of_pages = 0
+            if not is_relevant_only and page_number == 1:
+                total_number_of_pages = await self._get_number_of_pages_async(page)
+
+            products = await self._parse_page_async(page, query)
+
+            return products, total_number_of_pages
+        finally:
+            await page.close()
+
+    async def get_products_async(
+        self, query: str, is_relevant_only: bool, semaphore: asyncio.Semaphore
+    ):
+        self.start_time = time.time()
+        try:
+            page_numbers = await self._get_products_over_http_async(
+                query, is_relevant_only, semaphore
+            )
+        except (ShopRateLimited, ScrapeCancelled) as e:
+            self.error = e
+            return self._format_result()
+        if not page_numbers:
+            return self._format_result()
+
+        try:
+            async with async_browser_pool.context(
+                self.shop_name,
+                self.user_agent,
+                self.route_policy,
+                self.route_stats,
+                self.context_slot,
+            ) as context:
+
+                # Caps the tabs of this shop, semaphore caps those of all shops
+                page_semaphore = asyncio.Semaphore(self.page_concurrency)
+
+                async def scrape_page(page_number: int):
+                    async with page_semaphore, semaphore:
+                        return await self._scrape_page_async(
+                            context, query, is_relevant_only, page_number
+                        )
+
+                if page_numbers[0] == 1:
+                    products, self.total_number_of_pages = await scrape_page(1)
+                    await self._emit_async(products)
+                    page_numbers = range(2, self.total_number_of_pages + 1)
+
+                # Otherwise the pages before them were scraped over http
+                remaining_pages = [
+                    scrape_page(page_number) for page_number in page_numbers
+                ]
+                if self.product_sink:
+                    # Streamed pages are handed over as soon as they are parsed
+                    for next_page in asyncio.as_completed(remaining_pages):
+                        products, _ = await next_page
+                        await self._emit_async(products)
+                else:
+                    # Otherwise pages are fetched concurrently and merged in page order
+                    for products, _ in await asyncio.gather(*remaining_pages):
+                        await self._emit_async(products)
+
+        except (AssertionError, Exception) as e:
+            self.error = e
+            print(f"Error fetching and parsing data from {self.shop_name}: {e}")
+        finally:
+            return self._format_result()
+
+    def _format_result(self):
+        end_time = time.time()
+        elapsed_time = end_time - self.start_time
+
+        scrape_metrics.record_strategy(
+            self.shop_name, self.strategy, self.error is None, elapsed_time
+        )
+
+        return {
+            "products": self.products,
+            "summaryPerShop": {
+                "count": self.product_count,
+                "exec_time": elapsed_time,
+                "shop_name": self.shop_name,
+                "strategy": self.strategy,
+                "network": self.route_stats.as_dict(),
+                "parse_time": sum(self.parse_times),
+                "phase_times": dict(self.phase_times),
+                "pages_parsed": len(self.parse_times),
+                "error": str(self.error) if self.error else None,
+                "error_class": type(self.error).__name__ if self.error else None,
+            },
+        }
@@ -1,79 +1,70 @@
 import re
 import math
-import time
+from collections import defaultdict
 
-from playwright.sync_api import sync_playwright, Page
+from playwright.sync_api import Page
+from playwright.async_api import Page as AsyncPage
 
 from shopwiz.apps.core.models import ShopName, ShopPageCount
-from shopwiz.apps.core.serializers import SearchedProductSerialiser
+from ..product_record import ProductRecord, InvalidProductError
+from ..route_policy import RoutePolicy, RouteStats
 from .shop_scraper import ShopScraper
 from . import util as scraper_util
 
 
 class SuperValuScraper(ShopScraper):
+    default_base_url = "https://shop.supervalu.ie"
+
+    # Results are rendered client side, never block the storefront gateway api
+    route_policy = RoutePolicy(allowed_url_patterns=(r"storefrontgateway\.",))
+
+    product_selectors = {
+        "tile": '[class^="ColListing"]',
+        "fields": {
+            "name": ('span[class^="ProductCardTitle"] > div', None),
+            "price": ('span[class*="ProductCardPrice"]', None),
+            "price_per_unit": ('span[class*="ProductCardPriceInfo"]', None),
+            "image": ('[class^="ProductCardImageWrapper"] > div > img', "src"),
+            "url": ("a", "href"),
+        },
+    }
+
     def __init__(self):
         self.shop_name = ShopName.SUPERVALU
         self.start_time = 0
         self.products = []
-        self.total_number_of_items = 0
+        self.product_count = 0
         self.total_number_of_pages = 0
-        self.current_page = 1
-        self.skip_index = 0
+        self.route_stats = RouteStats()
+        self.parse_times = []
+        self.phase_times = defaultdict(float)
         self.items_per_page = ShopPageCount.SUPERVALU
 
-    def _build_url(self, query: str, is_relevant_only: bool):
+    def _build_url(self, query: str, is_relevant_only: bool, page_number: int):
         if is_relevant_only:
-            return f"https://shop.supervalu.ie/sm/delivery/rsid/5550/results?q={query}"
+            return f"{self.base_url}/sm/delivery/rsid/5550/results?q={query}"
         else:
-            return f"https://shop.supervalu.ie/sm/delivery/rsid/5550/results?q={query}&sort=price&page={self.current_page}&skip={self.skip_index}"
-
-    def get_products(self, query: str, is_relevant_only: bool):
-        self.start_time = time.time()
-        with sync_playwright() as p:
-            try:
-                browser = p.chromium.launch()
-                context = browser.new_context(
-                    user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/109.0.0.0 Safari/537.36"
-                )
-
-                page: Page = context.new_page()
-
-                while True:
-                    page.goto(self._build_url(query, is_relevant_only))
-
-                    # Check if anything was found was this search
-                    no_results_element = page.query_selector(
-                        'h1[class^="NoResultsTitle"]'
-                    )
-                    if no_results_element:
-                        break
-
-                    page.wait_for_selector('[class^="Listing"]')
-
-                    if not is_relevant_only and self.total_number_of_pages:
-                        self.total_number_of_items = self._get_number_of_pages(page)
-
-                    self._parse_page(page, query)
-
-                    self.current_page += 1
-                    self.skip_index += self.items_per_page
-                    if (
-                        is_relevant_only
-                        or self.current_page > self.total_number_of_pages
-                    ):
-                        break
-
-            except (AssertionError, Exception) as e:
-                print(f"Error fetching and parsing data from SuperValu: {e}")
-            finally:
-                browser.close()
-                return self._format_result()
+            skip_index = (page_number - 1) * self.items_per_page
+            return f"{self.base_url}/sm/delivery/rsid/5550/results?q={query}&sort=price&page={page_number}&skip={skip_index}"
 
-    def _get_number_of_pages(self, page: Page):
-        total_items_element = page.query_selector('h4[class^="Subtitle"]')
-        total_items_text = (
-            total_items_element.text_content() if total_items_element else None
-        )
+    def _wait_for_results(self, page: Page):
+        # Check if anything was found was this search
+        no_results_element = page.query_selector('h1[class^="NoResultsTitle"]')
+        if no_results_element:
+            return False
+
+        page.wait_for_selector('[class^="Listing"]')
+        return True
+
+    async def _wait_for_results_async(self, page: AsyncPage):
+        no_results_element = await page.query_selector('h1[class^="NoResultsTitle"]')
+        if no_results_element:
+            return False
+
+        await page.wait_for_selector('[class^="Listing"]')
+        return True
+
+    def _calculate_number_of_pages(self, total_items_text):
         match = re.search(r"(\d+)", total_items_text) if total_items_text else None
         total_number_of_items = int(match.group(1)) if match else 0
         assert (
@@ -82,83 +73,66 @@ class SuperValuScraper(ShopScraper):
 
         return math.ceil(total_number_of_items / self.items_per_page)
 
-    def _parse_page(self, page: Page, query: str):
-        rows = page.query_selector_all('[class^="ColListing"]')
-
-        for prod in rows:
-            product = {
-                "query": query,
-                "name": "",
-                "price": 0,
-                "price_per_unit": 0,
-                "unit_type": "",
-                "unit_measurment": 0,
-                "img_src": None,
-                "product_url": None,
-                "shop_name": self.shop_name,
-            }
-
-            # Get the product name
-            name_element = prod.query_selector('span[class^="ProductCardTitle"] > div')
-            product["name"] = (
-                name_element.text_content().strip() if name_element else ""
-            )
+    def _get_number_of_pages(self, page: Page):
+        total_items_element = page.query_selector('h4[class^="Subtitle"]')
+        total_items_text = (
+            total_items_element.text_content() if total_items_element else None
+        )
 
-            # Get the product price
-            price_element = prod.query_selector('span[class*="ProductCardPrice"]')
-            price_text = price_element.text_content() if price_element else None
-            match = re.search(r"(\d+\.\d+)", price_text) if price_text else None
-            product["price"] = round(float(match.group(1)), 2) if match else 0
+        return self._calculate_number_of_pages(total_items_text)
 
-            # Get unit_type and price_per_unit
-            price_per_unit_element = prod.query_selector(
-                'span[class*="ProductCardPriceInfo"]'
-            )
-            if price_per_unit_element:
-                price_per_unit_text = (
-                    price_per_unit_element.text_content().strip() or ""
-                )
-                parts = price_per_unit_text.split("/")
-
-                unit_type, price_per_unit, unit_measurement = (
-                    scraper_util.get_unit_data(parts, product["price"])
-                )
-
-                product["unit_type"] = unit_type
-                product["price_per_unit"] = price_per_unit
-                product["unit_measurement"] = unit_measurement
-
-            # Get the product image source
-            image_element = prod.query_selector(
-                '[class^="ProductCardImageWrapper"] > div > img'
-            )
-            product["img_src"] = (
-                image_element.get_attribute("src") if image_element else None
-            )
+    async def _get_number_of_pages_async(self, page: AsyncPage):
+        return self._calculate_number_of_pages(
+            await self._text_async(page, 'h4[class^="Subtitle"]')
+        )
 
-            # Get the link to the product
-            internal_url_path_el = prod.query_selector("a")
-            if internal_url_path_el:
-                internal_url_path = internal_url_path_el.get_attribute("href")
-                if internal_url_path:
-                    product["product_url"] = internal_url_path
-
-            # Create an instance of the serializer with the product data
-            serializer = SearchedProductSerialiser(data=product)
-            if serializer.is_valid():
-                self.products.append(serializer.validated_data)
-            else:
-                print(f"Invalid product data: {serializer.errors}")
-
-    def _format_result(self):
-        end_time = time.time()
-        elapsed_time = end_time - self.start_time
-
-        return {
-            "products": self.products,
-            "summaryPerShop": {
-                "count": len(self.products),
-                "exec_time": elapsed_time,
-                "shop_name": self.shop_name,
-            },
+    def _build_product(self, query: str, raw: dict):
+        """
+        Normalise the raw text and attributes of a product tile.
+        Returns a ProductRecord or None if the product is invalid.
+        """
+        product = {
+            "query": query,
+            "name": "",
+            "price": 0,
+            "price_per_unit": 0,
+            "unit_type": "",
+            "unit_measurment": 0,
+            "img_src": None,
+            "product_url": None,
+            "shop_name": self.shop_name,
         }
+
+        # Get the product name
+        product["name"] = raw["name"].strip() if raw["name"] else ""
+
+        # Get the product price
+        price_text = raw["price"]
+        match = re.search(r"(\d+\.\d+)", price_text) if price_text else None
+        product["price"] = round(float(match.group(1)), 2) if match else 0
+
+        # Get unit_type and price_per_unit
+        if raw["price_per_unit"] is not None:
+            price_per_unit_text = raw["price_per_unit"].strip() or ""
+            parts = price_per_unit_text.split("/")
+
+            unit_type, price_per_unit, unit_measurement = scraper_util.get_unit_data(
+                parts, product["price"]
+            )
+
+            product["unit_type"] = unit_type
+            product["price_per_unit"] = price_per_unit
+            product["unit_measurement"] = unit_measurement
+
+        # Get the product image source
+        product["img_src"] = raw["image"]
+
+        # Get the link to the product
+        if raw["url"]:
+            product["product_url"] = raw["url"]
+
+        try:
+            return ProductRecord.from_dict(product)
+        except InvalidProductError as e:
+            print(f"Invalid product data: {e}")
+            return None
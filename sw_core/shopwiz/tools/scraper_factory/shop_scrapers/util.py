@@ -1,4 +1,5 @@
 from typing import Tuple
+from functools import lru_cache
 import os
 import sys
 import django
@@ -12,37 +13,71 @@ django.setup()
 
 import shopwiz.apps.core.models as core_models
 
-# Conversion metrics for specific units to their standardized unit
-conversion_metrics = {
+# Base units and how many of them make up their standardised unit. Quantities
+# in front of a unit ("100g", "75cl", "6x330ml") are divided out when parsing.
+unit_table = {
     "kg": (core_models.UnitType.KG, 1),
-    "100g": (core_models.UnitType.KG, 10),
     "g": (core_models.UnitType.KG, 1000),
     "ml": (core_models.UnitType.L, 1000),
-    "100ml": (core_models.UnitType.L, 10),
+    "cl": (core_models.UnitType.L, 100),
     "l": (core_models.UnitType.L, 1),
     "litre": (core_models.UnitType.L, 1),
-    "70cl": (core_models.UnitType.L, 1 / 0.7),
-    "75cl": (core_models.UnitType.L, 1 / 0.75),
+    "ltr": (core_models.UnitType.L, 1),
     "metre": (core_models.UnitType.M, 1),
     "each": (core_models.UnitType.EACH, 1),
-    "100sht": (core_models.UnitType.HUNDRED_SHEETS, 1),
-    "100sheets": (core_models.UnitType.HUNDRED_SHEETS, 1),
+    "ea": (core_models.UnitType.EACH, 1),
+    "pack": (core_models.UnitType.EACH, 1),
+    "pk": (core_models.UnitType.EACH, 1),
+    "sht": (core_models.UnitType.HUNDRED_SHEETS, 100),
+    "sheets": (core_models.UnitType.HUNDRED_SHEETS, 100),
     "m2": (core_models.UnitType.M2, 1),
     "m²": (core_models.UnitType.M2, 1),
 }
 
+_NUMBER = r"\d+(?:\.\d+)?"
+_UNITS = "|".join(re.escape(unit) for unit in sorted(unit_table, key=len, reverse=True))
 
+# Compiled once for the whole table, longer units first so "litre" wins over "l".
+# Matches an optional multipack count, a quantity or range and the unit, e.g.
+# "kg", "100g", "per 100g", "6x330ml", "4 pack" or "1-1.5kg" with spaces removed.
+UNIT_PATTERN = re.compile(
+    rf"(?:^|per|/|(?<=[^a-z0-9.]))"
+    rf"(?:(?P<count>\d+)x)?"
+    rf"(?:(?P<quantity>{_NUMBER})(?:-(?P<quantity_to>{_NUMBER}))?)?"
+    rf"(?P<unit>{_UNITS})"
+    rf"(?![a-z0-9²])"
+)
+
+NON_NUMERIC_PATTERN = re.compile(r"[^\d.]")
+
+
+@lru_cache(maxsize=4096)
 def get_standard_unit_type_and_conversion(
     s: str,
 ) -> Tuple[core_models.UnitType, float]:
-    s = s.lower().replace(" ", "")
+    """
+    Returns the standardised unit type of a unit string and the factor turning
+    a price per that unit into a price per standardised unit.
+    Shops repeat the same few unit strings, so results are memoized.
+    """
+    match = UNIT_PATTERN.search(s.lower().replace(" ", ""))
+    if not match:
+        # If no specific unit matches, price per item
+        return core_models.UnitType.EACH, 1
+
+    unit_type, units_per_standard_unit = unit_table[match["unit"]]
+
+    quantity = float(match["quantity"]) if match["quantity"] else 1
+    if match["quantity_to"]:
+        # Ranges like "1-1.5kg" are priced at their midpoint
+        quantity = (quantity + float(match["quantity_to"])) / 2
+    if match["count"]:
+        quantity *= int(match["count"])
 
-    for specific_unit, (unit_type, conversion_metric) in conversion_metrics.items():
-        if re.search(r"\b" + specific_unit + r"\b", s):
-            return unit_type, conversion_metric
+    if quantity <= 0:
+        return core_models.UnitType.EACH, 1
 
-    # If no specific unit matches, return None
-    return core_models.UnitType.EACH, 1
+    return unit_type, units_per_standard_unit / quantity
 
 
 def get_unit_data(
@@ -53,7 +88,7 @@ def get_unit_data(
     default_unit_measurement = 1.0
 
     if parts_list and parts_list[0]:
-        cleaned_price_per_unit_str = re.sub(r"[^\d.]", "", parts_list[0])
+        cleaned_price_per_unit_str = NON_NUMERIC_PATTERN.sub("", parts_list[0])
         cleaned_price_per_unit_float = (
             round(float(cleaned_price_per_unit_str), 2)
             if cleaned_price_per_unit_str
@@ -73,8 +108,9 @@ def get_unit_data(
             )
             # Convert the price per unit to float and round to 2 decimal places
             price_per_unit = round(cleaned_price_per_unit_float * conversion_metric, 2)
-            unit_measurment = round(price / price_per_unit, 3)
-            return standardised_unit_type, price_per_unit, unit_measurment
+            if price_per_unit > 0:
+                unit_measurment = round(price / price_per_unit, 3)
+                return standardised_unit_type, price_per_unit, unit_measurment
     # Return default values if conditions are not met
     return default_unit_type, price, default_unit_measurement
 
@@ -93,6 +129,10 @@ if __name__ == "__main__":
         (["2.0", "each"], 2.0),
         (["30.0", "m2"], 30.0),
         (["1.0", "100g"], 3.0),
+        (["3.50", "6 x 330ml"], 3.5),
+        (["3.99", "4 pack"], 3.99),
+        (["9.0", "1-1.5kg"], 11.25),
+        (["13.32", "75cl"], 9.99),
     ]
 
     # Loop through the test cases and print the results
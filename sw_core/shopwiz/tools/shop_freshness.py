@@ -0,0 +1,105 @@
+from datetime import timedelta
+
+from django.db.models import Min
+from django.utils import timezone
+
+from config.settings import RESULTS_EXPIRY_DAYS
+from shopwiz.apps.core.models import QueryShopFreshness, SearchedProduct
+
+
+def get_freshness(query: str):
+    return {
+        freshness.shop_name: freshness
+        for freshness in QueryShopFreshness.objects.filter(query=query)
+    }
+
+
+def shops_to_scrape(query: str, shop_names, fresh_days: int = RESULTS_EXPIRY_DAYS):
+    """
+    Shops without good results for the query from within the last fresh_days,
+    including shops that failed ever since their last good scrape went stale.
+    """
+    # Same cut-off as get_most_recent_and_check_freshness
+    stale_on = timezone.now().date() - timedelta(days=fresh_days)
+    freshness_per_shop = get_freshness(query)
+    stale_shop_names = []
+    for shop_name in shop_names:
+        freshness = freshness_per_shop.get(shop_name)
+        if (
+            freshness is None
+            or freshness.scraped_at is None
+            or freshness.scraped_at.date() <= stale_on
+            or freshness.batch_id is None
+        ):
+            stale_shop_names.append(shop_name)
+    return stale_shop_names
+
+
+def carry_forward(query: str, batch, shop_names):
+    """
+    Copy the latest good products of the shops into the batch, apart from the
+    products the batch already has from them. Returns the shops that had any
+    to copy.
+    """
+    freshness_per_shop = get_freshness(query)
+    carried_shop_names = []
+    for shop_name in shop_names:
+        freshness = freshness_per_shop.get(shop_name)
+        if freshness is None or freshness.batch_id in (None, batch.id):
+            continue
+
+        # A shop failing halfway has some products in the batch already
+        saved_product_ids = set(
+            SearchedProduct.objects.filter(
+                batch=batch, product__shop_name=shop_name
+            ).values_list("product_id", flat=True)
+        )
+        # The batch they come from keeps its own rows, it may still be served
+        carried_rows = [
+            SearchedProduct(
+                batch=batch,
+                product_id=row.product_id,
+                price=row.price,
+                price_per_unit=row.price_per_unit,
+                unit_type=row.unit_type,
+                unit_measurement=row.unit_measurement,
+                upload_date=batch.upload_date,
+            )
+            for row in SearchedProduct.objects.filter(
+                batch_id=freshness.batch_id, product__shop_name=shop_name
+            )
+            if row.product_id not in saved_product_ids
+        ]
+        SearchedProduct.objects.bulk_create(carried_rows)
+        freshness.batch = batch
+        freshness.save(update_fields=["batch"])
+        carried_shop_names.append(shop_name)
+    return carried_shop_names
+
+
+def oldest_scrape_dates(queries):
+    """Oldest good shop results per query, of the queries tracked per shop."""
+    oldest_scrapes = (
+        QueryShopFreshness.objects.filter(query__in=queries, scraped_at__isnull=False)
+        .values("query")
+        .annotate(oldest_scraped_at=Min("scraped_at"))
+        .order_by()
+    )
+    return {row["query"]: row["oldest_scraped_at"].date() for row in oldest_scrapes}
+
+
+def record_scrape(query: str, batch, succeeded_shop_names, failed_shop_names):
+    now = timezone.now()
+    for shop_name in succeeded_shop_names:
+        QueryShopFreshness.objects.update_or_create(
+            query=query,
+            shop_name=shop_name,
+            defaults={"batch": batch, "scraped_at": now, "failed_at": None},
+        )
+    for shop_name in failed_shop_names:
+        freshness, created = QueryShopFreshness.objects.get_or_create(
+            query=query, shop_name=shop_name, defaults={"failed_at": now}
+        )
+        if not created:
+            freshness.failed_at = now
+            freshness.save(update_fields=["failed_at"])
@@ -0,0 +1,100 @@
+import logging
+import re
+import threading
+import uuid
+from contextlib import contextmanager
+
+from django_redis import get_redis_connection
+
+from config.settings import SCRAPE_LEASE_TTL_SECONDS
+from . import scrape_metrics
+
+logger = logging.getLogger(__name__)
+
+LEASE_KEY_PREFIX = "scrape_lease"
+METRICS_NAME = "single_flight"
+
+# Only the holder of a lease may extend or give it up. Renewing never shortens
+# a lease taken for longer
+RENEW_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    if redis.call("ttl", KEYS[1]) < tonumber(ARGV[2]) then
+        redis.call("expire", KEYS[1], ARGV[2])
+    end
+    return 1
+end
+return 0
+"""
+RELEASE_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("del", KEYS[1])
+end
+return 0
+"""
+
+
+def _key(query: str) -> str:
+    normalized_query = re.sub(r"\s+", " ", query.strip()).lower()
+    return f"{LEASE_KEY_PREFIX}:{normalized_query}"
+
+
+def acquire(query: str, ttl: int = SCRAPE_LEASE_TTL_SECONDS):
+    """
+    Take the scrape lease of a query. Returns the token needed to renew and
+    release it, or None when another scrape of the query holds the lease.
+    """
+    token = uuid.uuid4().hex
+    connection = get_redis_connection("default")
+    if connection.set(_key(query), token, nx=True, ex=ttl):
+        scrape_metrics.incr(METRICS_NAME, "acquired")
+        return token
+
+    scrape_metrics.incr(METRICS_NAME, "suppressed")
+    return None
+
+
+def renew(query: str, token: str, ttl: int = SCRAPE_LEASE_TTL_SECONDS) -> bool:
+    connection = get_redis_connection("default")
+    renewed = bool(
+        connection.register_script(RENEW_SCRIPT)(keys=[_key(query)], args=[token, ttl])
+    )
+    if not renewed:
+        scrape_metrics.incr(METRICS_NAME, "lost")
+    return renewed
+
+
+def release(query: str, token: str) -> bool:
+    connection = get_redis_connection("default")
+    released = bool(
+        connection.register_script(RELEASE_SCRIPT)(keys=[_key(query)], args=[token])
+    )
+    if released:
+        scrape_metrics.incr(METRICS_NAME, "released")
+    return released
+
+
+@contextmanager
+def keep_alive(query: str, token: str, ttl: int = SCRAPE_LEASE_TTL_SECONDS):
+    """Renew the lease in the background for as long as the block runs."""
+    if token is None:
+        yield
+        return
+
+    stopped = threading.Event()
+
+    def heartbeat():
+        while not stopped.wait(ttl / 3):
+            try:
+                if not renew(query, token, ttl):
+                    logger.warning(f"Scrape lease of {query} was lost")
+                    return
+            except Exception as e:
+                logger.warning(f"Failed to renew scrape lease of {query}: {e}")
+
+    thread = threading.Thread(target=heartbeat, daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        stopped.set()
+        thread.join()
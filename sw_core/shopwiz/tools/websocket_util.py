@@ -9,3 +9,16 @@ def notify_scrape_completion(query, status="completed", instance=None):
         "status": status,
     }
     connection.publish("scraping_queries", json.dumps(payload))
+
+
+def notify_scrape_progress(query, shop_name, count, is_shop_complete=False):
+    """Announce products of a shop that were saved before the scrape finished."""
+    connection = get_redis_connection("default")
+    payload = {
+        "query": query,
+        "status": "in_progress",
+        "shop_name": shop_name,
+        "count": count,
+        "is_shop_complete": is_shop_complete,
+    }
+    connection.publish("scraping_queries", json.dumps(payload))
@@ -60,6 +60,7 @@ export default function SearchResults() {
     searchedProducts,
     searchedProductsMetadata,
     firstTimeSearch,
+    isProvisional,
   } = useSearchedProducts();
 
   const { accessToken } = useAuthInfo();
@@ -202,9 +203,11 @@ export default function SearchResults() {
                     &apos;
                   </Title>
                   <Text size={isLargerThanSm ? "lg" : "md"} c="dimmed">
-                    {`Last update: ${formatDateRelative(
-                      searchedProductsMetadata.update_date
-                    )}`}
+                    {isProvisional
+                      ? `Showing results of a similar search while we put together results for "${query}"...`
+                      : `Last update: ${formatDateRelative(
+                          searchedProductsMetadata.update_date
+                        )}`}
                   </Text>
                 </Stack>
               )}
@@ -85,6 +85,16 @@ export function GlobalProvider({ children }: GlobalProviderProps) {
     newSocket.onmessage = (event) => {
       const responseData = JSON.parse(event.data);
 
+      if (responseData.status === "in_progress") {
+        // Show the shops saved so far while the rest are still being scraped
+        queryClient.refetchQueries({
+          queryKey: ["products", responseData.query],
+          exact: false,
+        });
+        return;
+      }
+
+      // Only the completed or failed scrape ends the loading state
       setLoadingNewProducts(false);
 
       if (responseData.query) {
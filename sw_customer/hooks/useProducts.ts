@@ -12,6 +12,10 @@ export type CustomRouter = NextRouter & {
   query: SearchedProductParams;
 };
 
+// Provisional results stand in for a first time search while it is scraped,
+// until then the products are fetched again this often
+const PROVISIONAL_REFETCH_INTERVAL = 5 * 1000;
+
 function useSearchedProducts() {
   const router = useRouter() as CustomRouter;
   const accessToken = undefined; // Define or obtain the access token as needed
@@ -29,6 +33,12 @@ function useSearchedProducts() {
     queryFn: () => searchedProductsApi.list(accessToken, originalQueryParams),
     staleTime: 5 * 60 * 1000,
     gcTime: 5 * 60 * 1000,
+    refetchInterval: (productsQuery) => {
+      const metadata = productsQuery.state.data?.metadata;
+      return metadata && "is_provisional" in metadata && metadata.is_provisional
+        ? PROVISIONAL_REFETCH_INTERVAL
+        : false;
+    },
   });
 
   const firstTimeSearch = Boolean(
@@ -49,6 +59,8 @@ function useSearchedProducts() {
   const isUpdateNeeded =
     searchedProductsMetadata && searchedProductsMetadata.is_update_needed;
 
+  const isProvisional = Boolean(searchedProductsMetadata?.is_provisional);
+
   return {
     query: query,
     queryParams: restWithoutQuery,
@@ -59,6 +71,7 @@ function useSearchedProducts() {
     searchedProductsMetadata,
     firstTimeSearch,
     isUpdateNeeded,
+    isProvisional,
   };
 }
 
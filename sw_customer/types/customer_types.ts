@@ -46,6 +46,7 @@ export interface SearchedProductMetadataSerialiser {
     query: string;
     is_full_metadata: boolean;
     is_update_needed: boolean;
+    is_provisional?: boolean;
     update_date: string | null;
     page: number;
     total_pages: number;